@@ -0,0 +1,84 @@
+"""Compare full-text customer search with the LIKE scan
+
+    python benchmarks/bench_search.py --rows 1000000
+
+Builds a throwaway database of synthetic customers, then times
+data_handler.find_customers (FTS5) against the LIKE scan behind
+data_handler.search_customers (CustomerName LIKE '%name%') for the same
+queries. Both stop after --limit rows, so they do the same amount of work.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from itertools import islice
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database_handler
+
+FIRST_NAMES = ["Maria", "Jose", "Juan", "Ana", "Mark", "Angel", "Jerome", "Kristine", "Paolo", "Liza",
+               "Ramon", "Grace", "Carlo", "Joy", "Miguel", "Andrea", "Rafael", "Bea", "Nico", "Carmela"]
+LAST_NAMES = ["Santos", "Reyes", "Cruz", "Bautista", "Ocampo", "Garcia", "Mendoza", "Torres", "Tomas",
+              "Andrada", "Castillo", "Flores", "Villanueva", "Ramos", "Aquino", "Navarro", "Salazar", "Mercado"]
+STREETS = ["Rizal Ave", "Mabini St", "Bonifacio Dr", "Luna St", "Quezon Blvd", "Roxas Blvd", "Aguinaldo Hwy"]
+CITIES = ["Manila", "Quezon City", "Makati", "Pasig", "Cebu City", "Davao City", "Iloilo City", "Baguio"]
+
+QUERIES = ["Santos", "mar", "Kristine Navarro", "Salaz", "zzznomatch"]
+
+def synthetic_customers(rows, seed=42):
+    """Yield (name, address, type, discount) tuples for a reproducible fake customer base"""
+    rng = random.Random(seed)
+    for _ in range(rows):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        address = f"{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}"
+        yield (name, address, rng.choice(["Residential", "Commercial", "Industrial"]),
+               rng.choice(["None", "Senior Citizen", "PWD", "Low-income"]))
+
+def like_search(db, query, limit):
+    """The first limit rows of the LIKE scan, read no further than needed"""
+    rows = db.iter_search(query)
+    try:
+        return list(islice(rows, limit))
+    finally:
+        rows.close()
+
+def best_of(repeat, fn, *args):
+    """Run fn repeat times and return (best seconds, result of the last run)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000, help="synthetic customers to load")
+    parser.add_argument("--limit", type=int, default=200, help="rows each search returns at most")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query (best is reported)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = database_handler.data_handler(os.path.join(tmp, "bench.db"))
+        if not db.fts_enabled:
+            print("✗ This SQLite build has no FTS5; nothing to compare")
+            return 1
+
+        started = time.perf_counter()
+        db.import_customers(synthetic_customers(args.rows))
+        print(f"Loaded {args.rows} customers in {time.perf_counter() - started:.1f}s\n")
+
+        print(f"{'query':<20}{'LIKE ms':>10}{'rows':>9}{'FTS ms':>10}{'rows':>9}{'speed-up':>10}")
+        for query in QUERIES:
+            like_time, like_rows = best_of(args.repeat, like_search, db, query, args.limit)
+            fts_time, fts_rows = best_of(args.repeat, db.find_customers, query, args.limit)
+            print(f"{query:<20}{like_time * 1000:>10.1f}{len(like_rows):>9}"
+                  f"{fts_time * 1000:>10.1f}{len(fts_rows):>9}{like_time / fts_time:>9.1f}x")
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+"""Latency statistics shared by the benchmark scripts"""
+
+def percentile(values, fraction):
+    """The value below which fraction of the sorted values fall"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
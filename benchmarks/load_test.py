@@ -0,0 +1,183 @@
+"""Load test for the HTTP billing service
+
+    python benchmarks/load_test.py --customers 100000 --connections 32 --duration 10
+    python benchmarks/load_test.py --db customer.db --mix lookup=90,preview=10
+
+Starts billing_service.py in its own process against a throwaway database (a
+copy of --db, or synthetic customers), then drives it from keep-alive
+connections with a mix of lookups, searches, bill previews and postings.
+Postings go into --period, by default the month after the latest period in
+the ledger, so each one is a new bill. Lookups favour a small set of hot
+accounts, as a payment counter would. Reports requests per second and p50/p99
+latency per request type. The --db database is never touched.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import database_handler
+from bench_search import synthetic_customers
+from latency import percentile
+from replay import copy_database, unused_period
+
+DEFAULT_MIX = "lookup=70,search=10,preview=15,post=5"
+SEARCHES = ["Santos", "mar", "Kristine Navarro", "Salaz", "Rizal"]
+
+def parse_mix(text):
+    """'lookup=70,post=5' -> [('lookup', 70), ('post', 5)]"""
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ('lookup', 'search', 'preview', 'post'):
+            raise ValueError(f"unknown request type {name!r}")
+        mix.append((name, int(weight)))
+    return mix
+
+def start_service(db_path, workers):
+    """Start the service on a free port; return (process, port)"""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "billing_service.py"), "--db", db_path,
+         "--port", "0", "--workers", str(workers)],
+        stdout=subprocess.PIPE, text=True
+    )
+    line = process.stdout.readline()
+    match = re.search(r":(\d+)\s*$", line)
+    if not match:
+        process.kill()
+        raise RuntimeError(f"billing service did not start: {line.strip()}")
+    return process, int(match.group(1))
+
+class Client:
+    """One keep-alive connection to the service"""
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                          f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        await self.reader.readexactly(length)
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+async def drive(port, accounts, mix, connections, duration, period, seed=1):
+    """Send requests from connections clients for duration seconds; return {type: [latencies]}"""
+    rng = random.Random(seed)
+    hot = accounts[:200]
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    latencies = {name: [] for name in names}
+    errors = {}
+    unposted = iter(rng.sample(accounts, len(accounts)))
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        client = Client(port)
+        try:
+            while time.perf_counter() < deadline:
+                kind = rng.choices(names, weights)[0]
+                if kind == 'lookup':
+                    args = ('GET', f"/customers/{rng.choice(hot)}")
+                elif kind == 'search':
+                    args = ('GET', f"/customers?q={rng.choice(SEARCHES).replace(' ', '+')}&limit=50")
+                elif kind == 'preview':
+                    args = ('GET', f"/customers/{rng.choice(accounts)}/bill?kwh={rng.uniform(0, 500):.1f}")
+                else:
+                    args = ('POST', f"/customers/{next(unposted, accounts[0])}/bills",
+                            {'kwh_used': round(rng.uniform(0, 500), 1), 'period': period})
+                started = time.perf_counter()
+                status = await client.request(*args)
+                latencies[kind].append(time.perf_counter() - started)
+                if status >= 400 and status != 409:
+                    errors[status] = errors.get(status, 0) + 1
+        finally:
+            client.close()
+
+    await asyncio.gather(*(worker() for _ in range(connections)))
+    return latencies, errors
+
+def report(latencies, errors, elapsed):
+    everything = sorted(latency for values in latencies.values() for latency in values)
+    print(f"{'request':<12}{'count':>10}{'req/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, values in list(latencies.items()) + [("all", everything)]:
+        values = sorted(values)
+        print(f"{name:<12}{len(values):>10,}{len(values) / elapsed:>12,.0f}"
+              f"{percentile(values, 0.50) * 1000:>10.2f}{percentile(values, 0.99) * 1000:>10.2f}")
+    if errors:
+        print(f"✗ Error responses: {errors}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure billing service throughput and latency")
+    parser.add_argument("--db", help="customer database to test a copy of (default: a synthetic one)")
+    parser.add_argument("--customers", type=int, default=100000, help="synthetic customers to create")
+    parser.add_argument("--connections", type=int, default=32, help="concurrent keep-alive connections")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--workers", type=int, default=4, help="service database worker threads")
+    parser.add_argument("--period", help="YYYY-MM to post bills into (default: after the latest posted period)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"request weights (default: {DEFAULT_MIX})")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.period and not re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", args.period):
+        parser.error("--period must be YYYY-MM")
+    if args.db and not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "load.db")
+        if args.db:
+            copy_database(args.db, db_path)
+        else:
+            print(f"  (loading {args.customers} customers...)")
+            db = database_handler.data_handler(db_path)
+            db.import_customers(synthetic_customers(args.customers))
+            db.close()
+        db = database_handler.data_handler(db_path)
+        accounts = [customer.account_number for customer in db.iter_customers()]
+        db.close()
+        if not accounts:
+            print("✗ The database has no customers")
+            return 1
+        period = args.period or unused_period(db_path)
+        print(f"  (posting bills for {period})")
+
+        process, port = start_service(db_path, args.workers)
+        try:
+            started = time.perf_counter()
+            latencies, errors = asyncio.run(drive(port, accounts, mix, args.connections, args.duration, period))
+            report(latencies, errors, time.perf_counter() - started)
+        finally:
+            process.terminate()
+            process.wait()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Replay an operation journal against a copy of the database
+
+    python benchmarks/replay.py session.jsonl --db customer.db --concurrency 8 --speedup 10
+
+Record a real session first with BILLING_JOURNAL=session.jsonl (see
+journal.py). The replayer copies the database, then runs every journaled
+action through the same workflow the GUI used (workflows.py), with the
+recorded inputs. Bills are the exception: the copy already holds the ones
+the session posted, so they are posted into unused months after the latest
+period in the ledger instead. Each of --concurrency workers acts as a
+separate clerk with its own connection. Actions start at their recorded
+offsets divided by --speedup (0 runs them back to back as fast as the
+workers allow).
+
+Reports throughput and p50/p95/p99 latency per action next to the latency
+recorded in the journal, and how late actions started when every worker was
+busy. Bills are counted as posted or already posted (a second reading for an
+account in the same period). The original database is never touched.
+"""
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import database_handler
+import journal
+from latency import percentile
+from workflows import WORKFLOWS, WorkflowError
+
+def copy_database(source, target):
+    """Copy a live database (WAL included) with SQLite's backup API"""
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+def unused_period(db_path):
+    """The month (YYYY-MM) after the latest period posted in db_path, so every bill posted into it is new"""
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        latest = connection.execute("SELECT MAX(Period) FROM posted_bill").fetchone()[0]
+    finally:
+        connection.close()
+    return next_period(latest or datetime.now().strftime('%Y-%m'))
+
+def next_period(period):
+    """The month (YYYY-MM) after period"""
+    year, month = map(int, period.split('-'))
+    return f"{year + month // 12:04d}-{month % 12 + 1:02d}"
+
+def move_periods(entries, period):
+    """Bill journaled readings in period and the months after it, one per recorded period
+
+    The copy already holds the bills the session posted, so replaying them
+    into their recorded periods would only find them posted. A bill
+    recorded without a period was for the month it was generated in.
+    """
+    periods = {}
+    for entry in entries:
+        if entry['action'] != 'generate_bill':
+            continue
+        inputs = entry['inputs']
+        recorded = inputs.get('period') or entry.get('at', '')[:7]
+        if recorded not in periods:
+            periods[recorded] = period
+            period = next_period(period)
+        entry['inputs'] = {**inputs, 'period': periods[recorded]}
+    return entries
+
+def replay(entries, db_path, concurrency=4, speedup=1.0):
+    """Run journal entries against db_path; return ({action: stats lists}, elapsed seconds)"""
+    results = {}
+    lock = threading.Lock()
+    work = queue.Queue(maxsize=concurrency * 2)
+
+    def worker():
+        db = database_handler.data_handler(db_path, check_data_version=True)
+        try:
+            while True:
+                item = work.get()
+                if item is None:
+                    break
+                entry, due = item
+                workflow = WORKFLOWS[entry['action']]
+                started = time.perf_counter()
+                outcome = 'ok'
+                error = None
+                try:
+                    result = workflow(db, **entry['inputs'])
+                    if entry['action'] == 'generate_bill' and result[2] is not None:
+                        # An account billed twice in a period gets its first bill back
+                        outcome = 'already_posted' if 'posted_at' in result[2] else 'posted'
+                except WorkflowError:
+                    # Invalid input the clerk typed; rejected again, as recorded
+                    outcome = 'rejected'
+                except Exception as e:
+                    outcome = 'error'
+                    error = f"{type(e).__name__}: {e}"
+                finished = time.perf_counter()
+                with lock:
+                    stats = results.setdefault(entry['action'], {
+                        'latency': [], 'late': [], 'recorded': [], 'ok': 0, 'posted': 0, 'already_posted': 0,
+                        'rejected': 0, 'error': 0, 'error_messages': {}})
+                    stats['latency'].append(finished - started)
+                    stats['late'].append(max(0.0, started - due))
+                    stats['recorded'].append(entry.get('ms', 0.0) / 1000)
+                    stats[outcome] += 1
+                    if error is not None:
+                        stats['error_messages'][error] = stats['error_messages'].get(error, 0) + 1
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=worker, name=f"clerk-{i}") for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    first = entries[0].get('offset', 0.0) if entries else 0.0
+    try:
+        for entry in entries:
+            due = started
+            if speedup > 0:
+                due += (entry.get('offset', 0.0) - first) / speedup
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            work.put((entry, due))
+    finally:
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+    return results, time.perf_counter() - started
+
+def summarize(results, elapsed):
+    """Per-action report rows from replay results"""
+    rows = []
+    for action, stats in sorted(results.items()):
+        latency = sorted(stats['latency'])
+        rows.append({
+            'action': action,
+            'count': len(latency),
+            'ok': stats['ok'],
+            'posted': stats['posted'],
+            'already_posted': stats['already_posted'],
+            'rejected': stats['rejected'],
+            'errors': stats['error'],
+            # The most frequent error messages with their counts
+            'error_samples': sorted(stats['error_messages'].items(), key=lambda item: -item[1])[:3],
+            'per_second': len(latency) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(latency, 0.50) * 1000,
+            'p95_ms': percentile(latency, 0.95) * 1000,
+            'p99_ms': percentile(latency, 0.99) * 1000,
+            'max_ms': latency[-1] * 1000,
+            'recorded_p50_ms': percentile(sorted(stats['recorded']), 0.50) * 1000,
+            'late_p99_ms': percentile(sorted(stats['late']), 0.99) * 1000
+        })
+    return rows
+
+def print_summary(rows, elapsed):
+    print(f"{'action':<18}{'count':>8}{'ok':>8}{'posted':>8}{'already':>9}{'rejected':>10}{'errors':>8}{'per s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'rec p50':>9}{'late p99':>10}")
+    for row in rows:
+        print(f"{row['action']:<18}{row['count']:>8,}{row['ok']:>8,}{row['posted']:>8,}{row['already_posted']:>9,}"
+              f"{row['rejected']:>10,}{row['errors']:>8,}"
+              f"{row['per_second']:>9,.1f}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+              f"{row['max_ms']:>9.2f}{row['recorded_p50_ms']:>9.2f}{row['late_p99_ms']:>10.2f}")
+    for row in rows:
+        for message, count in row['error_samples']:
+            print(f"✗ {row['action']}: {count} x {message}")
+    total = sum(row['count'] for row in rows)
+    print(f"✓ Replayed {total} actions in {elapsed:.2f}s ({total / elapsed if elapsed else 0:,.1f} actions/s)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a journal of clerk actions against a database copy")
+    parser.add_argument("journal", help="journal file written with BILLING_JOURNAL")
+    parser.add_argument("--db", default="customer.db", help="database to copy (default: customer.db)")
+    parser.add_argument("--concurrency", type=int, default=4, help="simultaneous clerks (default: 4)")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="replay this many times faster than recorded; 0 for no pauses (default: 1)")
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.speedup < 0:
+        parser.error("--speedup cannot be negative")
+    # The replay itself must not be appended to a journal
+    journal.stop()
+
+    try:
+        entries = sorted((entry for entry in journal.read_journal(args.journal) if entry.get('action') in WORKFLOWS),
+                         key=lambda entry: entry.get('offset', 0.0))
+    except OSError as e:
+        print(f"✗ Could not read journal: {e}")
+        return 1
+    if not entries:
+        print("✗ The journal has no actions to replay")
+        return 1
+    if not os.path.isfile(args.db):
+        print(f"✗ No database at {args.db}")
+        return 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, "replay.db")
+        copy_database(args.db, copy)
+        move_periods(entries, unused_period(copy))
+        print(f"Replaying {len(entries)} actions with {args.concurrency} clerks at {args.speedup:g}x...")
+        results, elapsed = replay(entries, copy, args.concurrency, args.speedup)
+
+    rows = summarize(results, elapsed)
+    print_summary(rows, elapsed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'concurrency': args.concurrency, 'speedup': args.speedup,
+                       'elapsed': elapsed, 'actions': rows}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""Benchmark suite for the billing, database and rendering hot paths
+
+    python benchmarks/run.py --sizes 10000 100000 1000000 --output results.json
+    python benchmarks/run.py --sizes 10000 --compare results.json
+
+Runs headless (no display needed) against throwaway databases and files in a
+temporary directory. Every measurement is written to a JSON file together with
+the git commit it was taken at, so runs can be compared across commits with
+--compare.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database_handler
+from billing import bill_at, compute_bill, compute_bills
+from bench_search import synthetic_customers
+
+DISCOUNTS = ["None", "Senior Citizen", "PWD", "Low-income"]
+
+class Suite:
+    """Collects timed measurements"""
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def measure(self, name, ops, fn, size=None, repeat=None):
+        """Time fn (which performs ops operations) and keep the best of repeat runs"""
+        best = None
+        for _ in range(repeat or self.repeat):
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        result = {
+            'name': name,
+            'size': size,
+            'ops': ops,
+            'seconds': best,
+            'ops_per_sec': ops / best if best else None
+        }
+        self.results.append(result)
+        label = f"{name} @ {size}" if size else name
+        print(f"  {label:<45}{best * 1000:>12.2f} ms{result['ops_per_sec'] or 0:>16,.0f} ops/s")
+        return result
+
+def quiet(fn, *args, **kwargs):
+    """Call fn with its success messages suppressed"""
+    with redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+def bench_compute(suite, count=100000):
+    rng = random.Random(1)
+    readings = [rng.uniform(0, 400) for _ in range(count)]
+    discounts = [rng.choice(DISCOUNTS) for _ in range(count)]
+
+    def scalar():
+        for kwh_used, discount in zip(readings, discounts):
+            compute_bill(kwh_used, discount)
+
+    suite.measure("compute_bill", count, scalar)
+    suite.measure("compute_bills (batch)", count, lambda: compute_bills(readings, discounts))
+
+def bench_database(suite, tmp, size, lookups=10000, writes=1000):
+    path = os.path.join(tmp, f"bench_{size}.db")
+    db = database_handler.data_handler(path)
+    print(f"  (loading {size} customers...)")
+    accounts = quiet(db.import_customers, synthetic_customers(size))
+    rng = random.Random(size)
+    sample = [rng.choice(accounts) for _ in range(lookups)]
+    write_sample = sample[:writes]
+
+    def create_accounts():
+        for i in range(writes):
+            quiet(db.create_account, f"Bench Customer {i}", "1 Rizal Ave, Manila", "Residential", "None")
+
+    def get_customers():
+        for account_number in sample:
+            db.get_customer(account_number)
+
+    def update_usage():
+        for account_number in write_sample:
+            db.update_usage(account_number, 120)
+
+    suite.measure("data_handler.create_account", writes, create_accounts, size, repeat=1)
+    suite.measure("data_handler.get_customer", lookups, get_customers, size)
+    # Lookups concentrated on a few hundred accounts, as on the bill screens
+    hot = [rng.choice(sample[:200]) for _ in range(lookups)]
+    uncached = database_handler.data_handler(path, cache_size=0)
+    suite.measure("data_handler.get_customer hot, cached", lookups,
+                  lambda: [db.get_customer(account_number) for account_number in hot], size)
+    suite.measure("data_handler.get_customer hot, uncached", lookups,
+                  lambda: [uncached.get_customer(account_number) for account_number in hot], size)
+    uncached.close()
+    suite.measure("data_handler.update_usage", writes, update_usage, size, repeat=1)
+
+    bills = compute_bills([120.0] * len(accounts), "None")
+    posted = [(account_number, bill_at(bills, i)) for i, account_number in enumerate(accounts)]
+
+    def post_bills():
+        for start in range(0, len(posted), 10000):
+            db.post_bills(posted[start:start + 10000], period="2026-01")
+
+    suite.measure("data_handler.post_bill", writes,
+                  lambda: [db.post_bill(account_number, bill_info, "2026-02")
+                           for account_number, bill_info in posted[:writes]], size, repeat=1)
+    suite.measure("data_handler.post_bills (batched)", len(posted), post_bills, size, repeat=1)
+    suite.measure("data_handler.get_revenue_summary", 1,
+                  lambda: db.get_revenue_summary(('quarter', 'type')), size)
+    suite.measure("data_handler.get_all_customers", 1, db.get_all_customers, size, repeat=1)
+    suite.measure("data_handler.search_customers", 1, lambda: db.search_customers("Santos"), size)
+    suite.measure("data_handler.find_customers", 1, lambda: db.find_customers("Santos"), size)
+    db.close()
+    os.remove(path)
+
+def sample_bill():
+    customer = {
+        'account_number': 123456,
+        'name': "Maria Santos",
+        'address': "12 Rizal Ave, Quezon City",
+        'type': "Residential",
+        'discount': "Senior Citizen"
+    }
+    return customer, compute_bill(150, "Senior Citizen")
+
+def bench_rendering(suite, tmp, txt_count=2000, pdf_count=100, print_run_count=100000, pdf_run_count=20000):
+    from bill_renderer import render_bill, write_print_run
+    import pdf_export
+    from pdf_print_run import write_print_run_pdf
+    customer, bill_info = sample_bill()
+    out_dir = os.path.join(tmp, "render")
+    os.makedirs(out_dir, exist_ok=True)
+    generated = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def render_txt():
+        for i in range(txt_count):
+            with open(os.path.join(out_dir, f"bill_{i}.txt"), 'w') as f:
+                f.write(f"Generated: {generated}\n")
+                f.write(render_bill(customer, bill_info))
+
+    def render_pdf():
+        for i in range(pdf_count):
+            pdf_export.build_bill_pdf(os.path.join(out_dir, f"bill_{i}.pdf"), customer, bill_info, generated)
+
+    def render_print_run():
+        with open(os.path.join(out_dir, "print_run.txt"), 'w', encoding='utf-8', buffering=1 << 20) as out:
+            write_print_run(out, ((customer, bill_info) for _ in range(print_run_count)), generated)
+
+    def render_pdf_print_run():
+        with open(os.path.join(out_dir, "print_run.pdf"), 'wb', buffering=1 << 20) as out:
+            write_print_run_pdf(out, ((customer, bill_info) for _ in range(pdf_run_count)), generated)
+
+    suite.measure("render TXT bill (format + write)", txt_count, render_txt)
+    suite.measure("render TXT print run (one file)", print_run_count, render_print_run)
+    suite.measure("render PDF bill", pdf_count, render_pdf, repeat=1)
+    suite.measure("render PDF print run (one file)", pdf_run_count, render_pdf_print_run, repeat=1)
+
+def scan_bills_dir(bills_dir):
+    """The directory scan show_previous_bills used before the bill table"""
+    files = sorted(
+        [f for f in os.listdir(bills_dir) if f.startswith('bill_')],
+        key=lambda x: os.path.getmtime(os.path.join(bills_dir, x)),
+        reverse=True
+    )
+    rows = []
+    for filename in files:
+        filepath = os.path.join(bills_dir, filename)
+        rows.append((filename, os.path.getsize(filepath), os.path.getmtime(filepath)))
+    return rows
+
+def bench_bill_history(suite, tmp, count):
+    bills_dir = os.path.join(tmp, "bills")
+    os.makedirs(bills_dir, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(bills_dir, f"bill_{100000 + i}_20260101_000000.txt"), 'w') as f:
+            f.write("bill")
+    db = database_handler.data_handler(os.path.join(tmp, "history.db"))
+    db.import_bill_files(bills_dir)
+
+    suite.measure("bills/ directory scan", count, lambda: scan_bills_dir(bills_dir), count)
+    suite.measure("bill table first page", 200, lambda: db.get_bills(limit=200), count)
+    db.close()
+
+    from bill_archive import BillArchive
+    customer, bill_info = sample_bill()
+    from bill_renderer import render_bill
+    data = render_bill(customer, bill_info).encode('utf-8')
+    archive = BillArchive(os.path.join(tmp, "archive"))
+    locations = []
+
+    def write_loose():
+        for i in range(count):
+            with open(os.path.join(bills_dir, f"bill_{100000 + i}_20260101_000000.txt"), 'wb') as f:
+                f.write(data)
+
+    def append_archive():
+        locations[:] = [archive.append(data, "2026-01-01 00:00:00") for _ in range(count)]
+
+    suite.measure("save TXT bill, loose file", count, write_loose, count, repeat=1)
+    suite.measure("save TXT bill, archive append", count, append_archive, count, repeat=1)
+    suite.measure("read bill from archive", count, lambda: [archive.read(location) for location in locations], count)
+    archive.close()
+
+def bench_meter_readings(suite, tmp, accounts=10000, months=12, lookups=10000):
+    db = database_handler.data_handler(os.path.join(tmp, "readings.db"))
+    numbers = quiet(db.import_customers, synthetic_customers(accounts))
+    rng = random.Random(accounts)
+    # One cumulative register reading per account and month
+    readings = []
+    for account_number in numbers:
+        register = rng.uniform(0, 5000)
+        for month in range(1, months + 1):
+            register += rng.uniform(0, 400)
+            readings.append((account_number, f"2026-{month:02d}-{rng.randint(1, 28):02d}", round(register, 1)))
+    sample = [rng.choice(numbers) for _ in range(lookups)]
+
+    suite.measure("meter readings ingest (derive kWh)", len(readings),
+                  lambda: db.ingest_readings(readings), len(readings), repeat=1)
+    suite.measure("data_handler.get_metered_usage", lookups,
+                  lambda: [db.get_metered_usage(account_number, "2026-06") for account_number in sample],
+                  len(readings))
+    suite.measure("data_handler.iter_metered_usage (all accounts)", accounts,
+                  lambda: sum(1 for _ in db.iter_metered_usage("2026-06")), len(readings))
+    db.close()
+
+def bench_export(suite, tmp, size=100000):
+    import data_export
+    db = database_handler.data_handler(os.path.join(tmp, "export.db"))
+    numbers = quiet(db.import_customers, synthetic_customers(size))
+    rng = random.Random(size)
+    db.post_bills([(account_number, compute_bill(rng.uniform(0, 800), "None")) for account_number in numbers],
+                  period="2026-09")
+    for format in ("npz", "csv"):
+        suite.measure(f"bulk export customers + ledger ({format})", size * 2,
+                      lambda: data_export.export(db, os.path.join(tmp, f"export-{format}"), format, full=True),
+                      size)
+    changed = numbers[::100]
+    for account_number in changed:
+        db.update_customer(account_number, name="Changed")
+    # Only the 1% of customers changed since the last export is read back
+    suite.measure("incremental export (1% changed)", len(changed),
+                  lambda: data_export.export(db, os.path.join(tmp, "export-npz"), "npz"), size, repeat=1)
+    db.close()
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    """Print the speed change of every measurement also present in a previous run"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r['name'], r['size']): r for r in baseline['results']}
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline_path}):")
+    for result in results:
+        old = previous.get((result['name'], result['size']))
+        if old and old['seconds'] and result['seconds']:
+            change = old['seconds'] / result['seconds']
+            label = f"{result['name']} @ {result['size']}" if result['size'] else result['name']
+            print(f"  {label:<45}{change:>8.2f}x {'faster' if change >= 1 else 'slower'}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and write JSON results")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="customer table sizes for the database benchmarks")
+    parser.add_argument("--bill-files", type=int, default=10000, help="bill files for the history scan")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (best is kept)")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="previous JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    suite = Suite(args.repeat)
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Billing:")
+        bench_compute(suite)
+        print("Database:")
+        for size in args.sizes:
+            bench_database(suite, tmp, size)
+        print("Rendering:")
+        bench_rendering(suite, tmp)
+        print("Bill history:")
+        bench_bill_history(suite, tmp, args.bill_files)
+        print("Meter readings:")
+        bench_meter_readings(suite, tmp)
+        print("Export:")
+        bench_export(suite, tmp)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sqlite': database_handler.sqlite3.sqlite_version,
+        },
+        'results': suite.results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Results written to {args.output}")
+
+    if args.compare:
+        compare(suite.results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
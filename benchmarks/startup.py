@@ -0,0 +1,83 @@
+"""Startup-time budget check
+
+    python benchmarks/startup.py --budget-ms 150
+
+Measures what launching the GUI costs before the first frame: importing main
+(via python -X importtime) and opening an existing customer database. Exits
+with status 1 if the import exceeds the budget or pulls in a module that
+should only load on demand, so it can gate CI.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Heavy modules that must only be imported when the feature is first used
+DEFERRED_MODULES = ("reportlab", "numpy")
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+def import_profile():
+    """Return {top-level module: cumulative microseconds} for a fresh `import main`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    profile = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            profile[match.group(4)] = int(match.group(2))
+    return profile
+
+def open_database_ms(repeat=5):
+    """Best time to open an already-initialized database, in milliseconds"""
+    import database_handler
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "customer.db")
+        database_handler.data_handler(path).close()
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            database_handler.data_handler(path).close()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the GUI startup-time budget")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="maximum time to import main")
+    parser.add_argument("--repeat", type=int, default=3, help="import measurements (best is used)")
+    args = parser.parse_args(argv)
+
+    runs = [import_profile() for _ in range(args.repeat)]
+    best = min(runs, key=lambda profile: profile.get("main", 0))
+    import_ms = best.get("main", 0) / 1000
+    print(f"import main:        {import_ms:7.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"open customer.db:   {open_database_ms():7.1f} ms")
+
+    heaviest = sorted(best.items(), key=lambda item: item[1], reverse=True)[1:6]
+    print("heaviest imports:   " + ", ".join(f"{name} {us / 1000:.1f} ms" for name, us in heaviest))
+
+    failures = []
+    if import_ms > args.budget_ms:
+        failures.append(f"import main took {import_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    for module in DEFERRED_MODULES:
+        if module in best:
+            failures.append(f"{module} is imported at startup but should load on first use")
+    for failure in failures:
+        print(f"✗ {failure}")
+    if not failures:
+        print("✓ Startup within budget")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Compressed, indexed bill archive
+
+Saved bills are appended, zlib-compressed, to one segment file per month
+(bills/archive/2026-10.seg) instead of being written as millions of loose
+files. The bill table is the index: every archived bill records its segment,
+byte offset and length, so finding a bill is an indexed lookup by account and
+date and reading it is one slice of a memory-mapped segment.
+
+Each record is a 12-byte header (magic, compressed length, CRC-32 of the
+bill) followed by the compressed bill. Appends open the segment with
+O_APPEND and write a record in a single call, so several processes can
+archive into the same month safely.
+
+Compaction packs a finished month into a fresh, more tightly compressed
+segment: it pulls in loose bill files saved before the archive existed and
+drops records no bill refers to any more.
+
+    python bill_archive.py --db customer.db --bills bills --compact 2026-09
+    python bill_archive.py --db customer.db --bills bills --compact all
+"""
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import zlib
+from datetime import datetime
+
+import database_handler
+
+RECORD_HEADER = struct.Struct("<4sII")
+RECORD_MAGIC = b"BIL1"
+
+# Fast compression for bills saved one at a time; compaction recompresses harder
+APPEND_LEVEL = 6
+COMPACT_LEVEL = 9
+
+SEGMENT_NAME = re.compile(r"^(\d{4}-\d{2})(?:\.p(\d+))?\.seg$")
+
+class ArchiveError(Exception):
+    """A bill could not be read back from the archive"""
+
+class BillArchive:
+    """Month segment files of compressed bills, read through memory maps"""
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        os.makedirs(archive_dir, exist_ok=True)
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def append(self, data, generated_at=None):
+        """Archive one bill (bytes) and return its (segment, offset, length)"""
+        month = (generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S"))[:7]
+        segment = f"{month}.seg"
+        record = self._record(data, APPEND_LEVEL)
+        fd = os.open(os.path.join(self.archive_dir, segment),
+                     os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            written = os.write(fd, record)
+            if written != len(record):
+                raise OSError(f"short write to {segment}")
+            # With O_APPEND the descriptor ends up right after our own record
+            offset = os.lseek(fd, 0, os.SEEK_CUR) - len(record)
+        finally:
+            os.close(fd)
+        return segment, offset, len(record)
+
+    def _record(self, data, level):
+        compressed = zlib.compress(data, level)
+        return RECORD_HEADER.pack(RECORD_MAGIC, len(compressed), zlib.crc32(data)) + compressed
+
+    def read(self, location):
+        """Return the bill stored at an archive (segment, offset, length)"""
+        segment, offset, length = location
+        with self._lock:
+            view = self._mapped(segment, offset + length)
+            record = view[offset:offset + length]
+        magic, compressed_length, crc = RECORD_HEADER.unpack_from(record)
+        if magic != RECORD_MAGIC or compressed_length != length - RECORD_HEADER.size:
+            raise ArchiveError(f"No bill record at {segment}:{offset}")
+        data = zlib.decompress(record[RECORD_HEADER.size:])
+        if zlib.crc32(data) != crc:
+            raise ArchiveError(f"Bill record at {segment}:{offset} is corrupt")
+        return data
+
+    def _mapped(self, segment, needed):
+        """A memory map of segment covering at least needed bytes, remapped if the file has grown"""
+        mapped = self._maps.get(segment)
+        if mapped is None or len(mapped) < needed:
+            if mapped is not None:
+                mapped.close()
+            with open(os.path.join(self.archive_dir, segment), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(mapped) < needed:
+                mapped.close()
+                raise ArchiveError(f"Segment {segment} is shorter than the index expects")
+            self._maps[segment] = mapped
+        return mapped
+
+    def extract(self, location, filepath):
+        """Write an archived bill out to a file and return the path"""
+        with open(filepath, 'wb') as f:
+            f.write(self.read(location))
+        return filepath
+
+    def segments(self, month=None):
+        """Names of the segment files in the archive, optionally for one month"""
+        names = []
+        for name in os.listdir(self.archive_dir):
+            match = SEGMENT_NAME.match(name)
+            if match and (month is None or match.group(1) == month):
+                names.append(name)
+        return sorted(names)
+
+    def close(self):
+        """Release every memory map"""
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps = {}
+
+    def compact(self, db, month):
+        """Pack every bill of a month into one new segment and drop the old segments and loose files
+
+        Returns (bills packed, bytes before, bytes after). The new segment is
+        written and synced first and the index updated in one transaction, so
+        a crash at any point leaves every bill readable.
+        """
+        bills = db.get_month_bills(month)
+        old_segments = self.segments(month)
+        loose = [bill for bill in bills if bill['location'] is None and os.path.isfile(bill['path'])]
+        # A month already packed into a single segment has nothing left to gain
+        packed = len(old_segments) == 1 and '.p' in old_segments[0]
+        if not bills or (packed and not loose):
+            return 0, 0, 0
+
+        generations = [int(SEGMENT_NAME.match(name).group(2) or 0) for name in old_segments]
+        segment = f"{month}.p{max(generations, default=0) + 1}.seg"
+        temp_path = os.path.join(self.archive_dir, segment + ".tmp")
+        before = sum(os.path.getsize(os.path.join(self.archive_dir, name)) for name in old_segments)
+        moves = []
+        packed_files = []
+        with open(temp_path, 'wb') as out:
+            for bill in bills:
+                if bill['location'] is not None:
+                    data = self.read(bill['location'])
+                    path = bill['path']
+                elif os.path.isfile(bill['path']):
+                    with open(bill['path'], 'rb') as f:
+                        data = f.read()
+                    before += len(data)
+                    path = os.path.basename(bill['path'])
+                    packed_files.append(bill['path'])
+                else:
+                    # A loose file that has gone missing stays as it is
+                    continue
+                record = self._record(data, COMPACT_LEVEL)
+                moves.append((bill['bill_id'], path, (segment, out.tell(), len(record))))
+                out.write(record)
+            out.flush()
+            os.fsync(out.fileno())
+        after = os.path.getsize(temp_path)
+        os.replace(temp_path, os.path.join(self.archive_dir, segment))
+
+        if not db.relocate_bills(moves):
+            os.remove(os.path.join(self.archive_dir, segment))
+            raise ArchiveError(f"Could not update the index for {month}; nothing was changed")
+
+        # Only now is nothing pointing at the old copies
+        self.close()
+        for name in old_segments:
+            os.remove(os.path.join(self.archive_dir, name))
+        for path in packed_files:
+            os.remove(path)
+        return len(moves), before, after
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact the bill archive month by month")
+    parser.add_argument("--db", default="customer.db", help="customer database (default: customer.db)")
+    parser.add_argument("--bills", default="bills", help="bills directory (default: bills)")
+    parser.add_argument("--compact", metavar="YYYY-MM", required=True,
+                        help="month to compact, or 'all' for every month before the current one")
+    args = parser.parse_args(argv)
+
+    db = database_handler.data_handler(args.db)
+    archive = BillArchive(os.path.join(args.bills, "archive"))
+    try:
+        current = datetime.now().strftime("%Y-%m")
+        if args.compact == "all":
+            months = [month for month in db.get_bill_months() if month < current]
+        else:
+            months = [args.compact]
+        for month in months:
+            if month >= current:
+                # Bills are still being appended to this month's segment
+                print(f"✗ {month} is not over yet; only past months can be compacted")
+                return 1
+            try:
+                packed, before, after = archive.compact(db, month)
+            except (OSError, ArchiveError) as e:
+                print(f"✗ Compacting {month} failed: {e}")
+                return 1
+            if packed:
+                print(f"✓ {month}: packed {packed} bills, {before / 1024:,.0f} KB → {after / 1024:,.0f} KB")
+            else:
+                print(f"  {month}: already compact")
+        return 0
+    finally:
+        archive.close()
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
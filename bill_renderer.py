@@ -0,0 +1,149 @@
+"""Plain-text bill rendering and bulk print runs
+
+render_bill produces the text bill shown in the GUI and saved as TXT. The
+layout is a template whose static parts (rules, headings, labels) are laid
+out once at import, so rendering a bill is a single %-format of its values.
+
+write_print_run streams any number of bills into one buffered file, one bill
+per page with a form feed between pages, so a whole billing cycle is one
+sequential write instead of a file per bill.
+
+    python bill_renderer.py --db customer.db --period 2026-10 --out print_run_2026-10.txt
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+from billing import vat_label
+from metrics import timed
+
+WIDTH = 60
+
+# Built once; the %-placeholders are filled in per bill from a tuple, which is
+# the cheapest formatting Python has
+_HEADER = f"""
+{'=' * WIDTH}
+{'ELECTRICITY BILL'.center(WIDTH)}
+{'=' * WIDTH}
+
+Account Number: %s
+Customer Name:  %s
+Address:        %s
+Customer Type:  %s
+Discount Type:  %s
+
+{'-' * WIDTH}
+CONSUMPTION DETAILS
+{'-' * WIDTH}
+kWh Used:       %.2f kWh
+Rate:           ₱%.2f per kWh
+
+{'-' * WIDTH}
+CHARGES BREAKDOWN
+{'-' * WIDTH}
+Base Charge:             ₱%10.2f
+Environmental Fee:       ₱%10.2f
+Subtotal:                ₱%10.2f"""
+
+_DISCOUNT = """
+Discount (%s %s%%): -₱%10.2f
+Subtotal after discount: ₱%10.2f"""
+
+_FOOTER = f"""
+%-25s₱%10.2f
+{'-' * WIDTH}
+TOTAL AMOUNT DUE:        ₱%10.2f
+{'=' * WIDTH}
+"""
+
+BILL_TEMPLATE = _HEADER + _FOOTER
+DISCOUNTED_BILL_TEMPLATE = _HEADER + _DISCOUNT + _FOOTER
+
+# Printers start a new page at a form feed
+PAGE_BREAK = "\f"
+
+@timed("render.text_bill")
+def render_bill(customer, bill_info):
+    """Format a computed bill as the plain-text bill shown on screen and saved as TXT"""
+    header = (
+        customer['account_number'],
+        customer['name'],
+        customer['address'],
+        customer['type'],
+        customer['discount'],
+        bill_info['kwh_used'],
+        bill_info['rate'],
+        bill_info['base_charge'],
+        bill_info['environmental_fee'],
+        bill_info['subtotal']
+    )
+    footer = (vat_label(bill_info) + ":", bill_info['vat'], bill_info['total_amount_due'])
+    if bill_info['discount_amount'] > 0:
+        discount = (
+            bill_info['discount_type'],
+            int(bill_info['discount_rate'] * 100),
+            bill_info['discount_amount'],
+            bill_info['subtotal_after_discount']
+        )
+        return DISCOUNTED_BILL_TEMPLATE % (header + discount + footer)
+    return BILL_TEMPLATE % (header + footer)
+
+def render_saved_bill(customer, bill_info, generated):
+    """The text of a saved TXT bill: a Generated line followed by the bill"""
+    return f"Generated: {generated}\n" + render_bill(customer, bill_info)
+
+@timed("render.text_print_run")
+def write_print_run(out, bills, generated=None, page_break=PAGE_BREAK, batch_size=1000, progress=None):
+    """Write (customer, bill_info) pairs to the text file object out, one bill per page
+
+    Bills are rendered and written in batches of batch_size, so memory stays
+    flat however many bills there are. Returns the number of bills written.
+    progress, if given, is called with the running count after every batch.
+    """
+    generated = generated or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    prefix = f"Generated: {generated}\n"
+    count = 0
+    pages = []
+    for customer, bill_info in bills:
+        if count:
+            pages.append(page_break)
+        pages.append(prefix)
+        pages.append(render_bill(customer, bill_info))
+        count += 1
+        if len(pages) >= batch_size * 3:
+            out.writelines(pages)
+            pages = []
+            if progress:
+                progress(count)
+    out.writelines(pages)
+    if progress:
+        progress(count)
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write every posted bill of a billing period to one print-run file")
+    parser.add_argument("--db", default="customer.db", help="customer database (default: customer.db)")
+    parser.add_argument("--period", help="billing period, YYYY-MM (default: the current month)")
+    parser.add_argument("--out", help="output file (default: print_run_<period>.txt)")
+    args = parser.parse_args(argv)
+
+    import database_handler
+    period = args.period or datetime.now().strftime("%Y-%m")
+    out_path = args.out or f"print_run_{period}.txt"
+    db = database_handler.data_handler(args.db)
+    try:
+        started = time.perf_counter()
+        # A 1 MB buffer turns the run into a few large sequential writes
+        with open(out_path, 'w', encoding='utf-8', buffering=1 << 20) as out:
+            count = write_print_run(out, db.iter_posted_bills(period))
+        print(f"✓ Wrote {count} bills to {out_path} in {time.perf_counter() - started:.1f}s")
+        return 0
+    except OSError as e:
+        print(f"✗ Could not write print run: {e}")
+        return 1
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
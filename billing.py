@@ -0,0 +1,85 @@
+from datetime import datetime
+
+from metrics import timed
+from tariff import ANY_TYPE, Tariff, TariffBook
+
+# Tier upper bounds (kWh, inclusive) and the flat rate applied to the whole reading
+TIER_LIMITS = (50, 100, 200)
+TIER_RATES = (5.00, 6.50, 8.00, 10.00)
+
+ENVIRONMENTAL_FEE = 50.00
+VAT_RATE = 0.12
+
+DISCOUNT_RATES = {
+    "None": 0.0,
+    "Senior Citizen": 0.05,
+    "PWD": 0.05,
+    "Low-income": 0.10
+}
+
+# The tariff used when no other applies; it reproduces the rates above exactly
+DEFAULT_TARIFF = Tariff({
+    'customer_type': ANY_TYPE,
+    'pricing': 'slab',
+    'tiers': [[limit, rate] for limit, rate in zip(TIER_LIMITS, TIER_RATES)] + [[None, TIER_RATES[-1]]],
+    'environmental_fee': ENVIRONMENTAL_FEE,
+    'vat_rate': VAT_RATE,
+    'discounts': DISCOUNT_RATES
+})
+
+@timed("billing.compute_bill")
+def compute_bill(kwh_used, discount_type="None", tariff=None):
+    """Compute bill with discount"""
+    return (tariff or DEFAULT_TARIFF).price(kwh_used, discount_type)
+
+def vat_rate_of(bill_info):
+    """The VAT rate a bill was charged, also for bills stored without one (derived from the amounts)"""
+    rate = bill_info.get('vat_rate')
+    if rate is not None:
+        return rate
+    taxable = bill_info['subtotal'] - bill_info['discount_amount']
+    return round(bill_info['vat'] / taxable, 6) if taxable else VAT_RATE
+
+def vat_label(bill_info):
+    """'VAT (12%)' with the bill's own rate"""
+    return f"VAT ({vat_rate_of(bill_info) * 100:g}%)"
+
+def discount_rates_for(discount_types, tariff=None):
+    """Map an array of discount type names to their discount rates"""
+    return (tariff or DEFAULT_TARIFF).discount_rates_for(discount_types)
+
+@timed("billing.compute_bills")
+def compute_bills(kwh_used, discount_types="None", tariff=None):
+    """Compute bills for arrays of readings, returning one array per bill field
+    
+    Every column matches what compute_bill returns for the same reading and
+    tariff; the arithmetic is done in the same order so the results are
+    bit-for-bit equal.
+    """
+    # Imported here so the GUI, which only prices single bills, starts without NumPy
+    import numpy as np
+    kwh_used = np.asarray(kwh_used, dtype=np.float64)
+    if isinstance(discount_types, str):
+        discount_types = np.full(kwh_used.shape, discount_types, dtype=object)
+    else:
+        discount_types = np.asarray(discount_types, dtype=object)
+        if discount_types.shape != kwh_used.shape:
+            raise ValueError("kwh_used and discount_types must have the same length")
+    return (tariff or DEFAULT_TARIFF).price_many(kwh_used, discount_types)
+
+def tariff_book(db=None):
+    """The tariffs stored in db (the built-in default fills any gaps), or just the default"""
+    # The database handler keeps the compiled book until its tariffs change
+    return db.get_tariff_book(DEFAULT_TARIFF) if db is not None else TariffBook([], DEFAULT_TARIFF)
+
+def period_start(period=None):
+    """The date (YYYY-MM-DD) tariffs are selected by for a billing period (YYYY-MM, default: this month)"""
+    return f"{period or datetime.now().strftime('%Y-%m')}-01"
+
+def bill_at(bills, index):
+    """Extract one row of compute_bills output as a compute_bill style dict"""
+    row = {}
+    for key, column in bills.items():
+        value = column[index]
+        row[key] = value if isinstance(value, str) else float(value)
+    return row
@@ -0,0 +1,323 @@
+"""Headless billing run
+
+Streams a meter-reading CSV (account_number,kwh_used), prices each batch with
+billing.compute_bills under the tariff in effect for each customer type during
+the billing period, and posts the whole batch of bills in a single
+transaction. The run position is checkpointed in the same transaction, so
+re-running the same command after a crash picks up where it stopped, and an
+account is never billed twice for the same period.
+
+    python billing_run.py readings.csv --db customer.db --batch-size 10000 --period 2026-10
+
+With --workers the accounts are split into that many AccountNumber ranges
+(shards) priced in parallel by a process pool, while this process stays the
+single writer that commits each priced batch with its shard's checkpoint.
+
+    python billing_run.py readings.csv --db customer.db --workers 4
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import database_handler
+from billing import bill_at, compute_bills, period_start, tariff_book
+
+def read_readings(csv_path, skip=0):
+    """Yield (position, account_number, kwh_used) for each valid row of a reading CSV"""
+    with open(csv_path, newline='') as f:
+        reader = csv.reader(f)
+        position = 0
+        for row in reader:
+            if not row or not row[0].strip().isdigit():
+                # Header or blank line
+                continue
+            position += 1
+            if position <= skip:
+                continue
+            try:
+                kwh_used = float(row[1])
+            except (IndexError, ValueError):
+                print(f"✗ Skipping invalid reading on data row {position}: {row}")
+                continue
+            if kwh_used < 0:
+                print(f"✗ Skipping negative reading on data row {position}: {row}")
+                continue
+            yield position, int(row[0]), kwh_used
+
+def batches(readings, batch_size):
+    """Group readings into lists of at most batch_size"""
+    batch = []
+    for reading in readings:
+        batch.append(reading)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def price_batch(db, batch, period=None, book=None):
+    """Price one batch, returning (posted, missing, total_amount_due)
+
+    posted is the list of (account_number, bill_info) to commit and missing
+    the account numbers that have no customer.
+    """
+    customers = db.get_customers(account_number for _, account_number, _ in batch)
+    found = [(account_number, kwh_used) for _, account_number, kwh_used in batch
+             if account_number in customers]
+    missing = [account_number for _, account_number, _ in batch if account_number not in customers]
+
+    # Price each customer type's readings together with that type's tariff
+    by_type = {}
+    for account_number, kwh_used in found:
+        by_type.setdefault(customers[account_number]['type'], []).append((account_number, kwh_used))
+    book = book or tariff_book(db)
+    on = period_start(period)
+
+    posted = []
+    total = 0.0
+    for customer_type, readings in by_type.items():
+        bills = compute_bills(
+            [kwh_used for _, kwh_used in readings],
+            [customers[account_number]['discount'] for account_number, _ in readings],
+            book.select(customer_type, on)
+        )
+        posted.extend((account_number, bill_at(bills, i)) for i, (account_number, _) in enumerate(readings))
+        total += float(bills['total_amount_due'].sum())
+    return posted, missing, total
+
+def bill_batch(db, run_id, batch, period=None, book=None):
+    """Price and post one batch, returning (billed, missing, total_amount_due)"""
+    posted, missing, total = price_batch(db, batch, period, book)
+
+    # The checkpoint covers the last row of the batch even if some accounts were missing
+    billed = db.record_billing_batch(run_id, batch[-1][0], posted, period)
+    if billed is None:
+        raise RuntimeError(f"billing run {run_id} stopped at data row {batch[0][0]}")
+    if billed < len(posted):
+        print(f"  {len(posted) - billed} accounts in this batch were already billed for the period")
+    return billed, missing, total
+
+def checkpoint_id(csv_path, run_id=None, period=None):
+    """The checkpoint name of a run: run_id (default: the CSV's absolute path) and its period
+
+    Billing the same file for another period is a new run, not a resumed one.
+    """
+    return f"{run_id or os.path.abspath(csv_path)}@{period}"
+
+def run(csv_path, db_path="customer.db", batch_size=10000, run_id=None, period=None):
+    """Bill every reading in csv_path for period (default: this month), resuming from the last checkpoint"""
+    # Fixed up front so a run crossing midnight at month end stays in one period
+    period = period or datetime.now().strftime("%Y-%m")
+    run_id = checkpoint_id(csv_path, run_id, period)
+    db = database_handler.data_handler(db_path)
+    try:
+        start_position = db.get_run_position(run_id)
+        if start_position:
+            print(f"Resuming run {run_id} after data row {start_position}")
+
+        # Tariffs are read once; the whole run is priced with the same versions
+        book = tariff_book(db)
+        billed = 0
+        missing = []
+        total = 0.0
+        read = 0
+        started = time.perf_counter()
+        for batch in batches(read_readings(csv_path, skip=start_position), batch_size):
+            batch_billed, batch_missing, batch_total = bill_batch(db, run_id, batch, period, book)
+            read += len(batch)
+            billed += batch_billed
+            missing.extend(batch_missing)
+            total += batch_total
+            print(f"  committed through data row {batch[-1][0]} ({billed} billed)")
+        elapsed = time.perf_counter() - started
+
+        if start_position and not read:
+            print(f"✓ Run {run_id} is already complete; nothing left to bill for {period}")
+            return 0
+
+        print(f"✓ Billed {billed} accounts in {elapsed:.2f}s, readings priced at ₱{total:,.2f}")
+        if missing:
+            print(f"✗ {len(missing)} readings for unknown accounts, e.g. {missing[:10]}")
+        return billed
+    finally:
+        db.close()
+
+# Each worker process of a sharded run reads with its own connection and prices
+# with the tariffs the parent read at the start of the run
+_shard_db = None
+_shard_book = None
+
+def _open_shard_reader(db_path, book):
+    global _shard_db, _shard_book
+    _shard_db = database_handler.data_handler(db_path)
+    _shard_book = book
+
+def _price_shard_batch(job):
+    """Worker entry point: price one batch of a shard
+
+    Returns (shard, last data row, readings, posted, missing, total, seconds).
+    """
+    shard, batch, period = job
+    started = time.perf_counter()
+    posted, missing, total = price_batch(_shard_db, batch, period, _shard_book)
+    return shard, batch[-1][0], len(batch), posted, missing, total, time.perf_counter() - started
+
+def load_shards(db, run_id, count, start_position=0, period=None):
+    """The shards of a sharded run: resumed from their checkpoints, or count new ones
+
+    A shard covers the account numbers from 'low' up to, not including,
+    'high' (None for the last). Its checkpoint is named run_id#low-high, so a
+    resumed run keeps the ranges it started with even if customers were added.
+    New shards are checkpointed at start_position before anything is billed.
+    """
+    prefix = f"{run_id}#"
+    shards = []
+    for shard_id, position in db.get_run_positions(prefix).items():
+        low, _, high = shard_id[len(prefix):].partition("-")
+        shards.append({'id': shard_id, 'low': int(low), 'high': int(high) if high else None, 'position': position})
+    shards.sort(key=lambda shard: shard['low'])
+    if shards:
+        print(f"Resuming sharded run {run_id} with {len(shards)} shards")
+    else:
+        lows = db.split_account_numbers(count) or [0]
+        lows[0] = 0
+        for low, high in zip(lows, lows[1:] + [None]):
+            shard_id = f"{prefix}{low}-{'' if high is None else high}"
+            if db.record_billing_batch(shard_id, start_position, [], period) is None:
+                raise RuntimeError(f"could not checkpoint shard {shard_id}")
+            shards.append({'id': shard_id, 'low': low, 'high': high, 'position': start_position})
+    for shard in shards:
+        shard.update(readings=0, billed=0, batches=0, price_seconds=0.0, write_seconds=0.0)
+    return shards
+
+def print_shards(shards, elapsed):
+    """Per-shard counts and timings, and how busy the writer was"""
+    print(f"{'shard':<7}{'accounts':<22}{'readings':>10}{'billed':>10}{'batches':>9}"
+          f"{'price s':>9}{'write s':>9}{'priced/s':>11}")
+    for number, shard in enumerate(shards, 1):
+        accounts = f"{shard['low']}-{'' if shard['high'] is None else shard['high'] - 1}"
+        rate = shard['readings'] / shard['price_seconds'] if shard['price_seconds'] else 0.0
+        print(f"{number:<7}{accounts:<22}{shard['readings']:>10,}{shard['billed']:>10,}{shard['batches']:>9,}"
+              f"{shard['price_seconds']:>9.2f}{shard['write_seconds']:>9.2f}{rate:>11,.0f}")
+    if elapsed:
+        # Adding workers stops helping once the single writer is busy all the time
+        writing = sum(shard['write_seconds'] for shard in shards)
+        print(f"  writer busy {writing / elapsed:.0%} of the run")
+
+def run_sharded(csv_path, db_path="customer.db", workers=None, batch_size=10000, run_id=None, period=None):
+    """Bill every reading in csv_path across a process pool, one shard of account numbers per batch
+
+    This process streams the CSV, routes each reading to its shard and, as
+    the single writer, commits every priced batch together with that shard's
+    checkpoint. Batches are committed in the order they were handed out, so
+    each checkpoint only moves forward and a crashed run resumes per shard.
+    """
+    period = period or datetime.now().strftime("%Y-%m")
+    run_id = checkpoint_id(csv_path, run_id, period)
+    workers = workers or os.cpu_count() or 1
+    db = database_handler.data_handler(db_path)
+    try:
+        # Rows an earlier serial run of the same file committed are not read again
+        start_position = db.get_run_position(run_id)
+        shards = load_shards(db, run_id, workers, start_position, period)
+        lows = [shard['low'] for shard in shards]
+        book = tariff_book(db)
+        buffers = [[] for _ in shards]
+        pending = deque()
+        # Bound the batches in flight so a huge file is never all in memory
+        max_pending = workers * 2
+        billed = 0
+        missing = []
+        total = 0.0
+        started = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_open_shard_reader,
+                                 initargs=(db_path, book)) as pool:
+            def commit(future):
+                nonlocal billed, total
+                index, position, readings, posted, batch_missing, batch_total, seconds = future.result()
+                shard = shards[index]
+                write_started = time.perf_counter()
+                batch_billed = db.record_billing_batch(shard['id'], position, posted, period)
+                shard['write_seconds'] += time.perf_counter() - write_started
+                if batch_billed is None:
+                    raise RuntimeError(f"billing run {shard['id']} stopped after data row {shard['position']}")
+                if batch_billed < len(posted):
+                    print(f"  {len(posted) - batch_billed} accounts in this batch were already billed for the period")
+                shard['position'] = position
+                shard['readings'] += readings
+                shard['billed'] += batch_billed
+                shard['batches'] += 1
+                shard['price_seconds'] += seconds
+                billed += batch_billed
+                missing.extend(batch_missing)
+                total += batch_total
+                print(f"  shard {index + 1} committed through data row {position} ({billed} billed)")
+
+            def submit(index):
+                pending.append(pool.submit(_price_shard_batch, (index, buffers[index], period)))
+                buffers[index] = []
+                while len(pending) > max_pending:
+                    commit(pending.popleft())
+
+            for position, account_number, kwh_used in read_readings(csv_path, skip=start_position):
+                index = bisect_right(lows, account_number) - 1
+                if position <= shards[index]['position']:
+                    # Committed before the run was interrupted
+                    continue
+                buffers[index].append((position, account_number, kwh_used))
+                if len(buffers[index]) >= batch_size:
+                    submit(index)
+            for index, buffer in enumerate(buffers):
+                if buffer:
+                    submit(index)
+            while pending:
+                commit(pending.popleft())
+        elapsed = time.perf_counter() - started
+
+        resumed = any(shard['position'] for shard in shards)
+        if resumed and not any(shard['readings'] for shard in shards):
+            print(f"✓ Run {run_id} is already complete; nothing left to bill for {period}")
+            return 0
+        print_shards(shards, elapsed)
+        print(f"✓ Billed {billed} accounts in {elapsed:.2f}s with {workers} workers, "
+              f"readings priced at ₱{total:,.2f}")
+        if missing:
+            print(f"✗ {len(missing)} readings for unknown accounts, e.g. {missing[:10]}")
+        return billed
+    finally:
+        db.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a headless billing cycle from a meter-reading CSV")
+    parser.add_argument("readings", help="CSV file with account_number,kwh_used rows")
+    parser.add_argument("--db", default="customer.db", help="customer database (default: customer.db)")
+    parser.add_argument("--batch-size", type=int, default=10000, help="readings per transaction")
+    parser.add_argument("--run-id", help="checkpoint name (default: absolute path of the CSV); the period is added to it")
+    parser.add_argument("--period", help="billing period, YYYY-MM (default: the current month)")
+    parser.add_argument("--workers", type=int,
+                        help="price shards of accounts in this many processes (default: a serial run)")
+    args = parser.parse_args(argv)
+
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        if args.workers:
+            run_sharded(args.readings, args.db, args.workers, args.batch_size, args.run_id, args.period)
+        else:
+            run(args.readings, args.db, args.batch_size, args.run_id, args.period)
+    except (OSError, RuntimeError) as e:
+        print(f"✗ Billing run failed: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
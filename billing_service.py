@@ -0,0 +1,266 @@
+"""Local HTTP/JSON billing service
+
+For payment counters and field tablets that cannot run the Tk GUI. A small
+asyncio HTTP/1.1 server (standard library only) exposing:
+
+    GET  /customers/<account>                  customer record
+    GET  /customers?q=<text>&limit=<n>         search by name or address
+    GET  /customers/<account>/bill?kwh=<kWh>   bill preview, nothing is saved
+    POST /customers/<account>/bills            post a bill: {"kwh_used": 150, "period": "2026-10"}
+    GET  /health
+    GET  /metrics                              operation metrics, Prometheus text (?format=json for JSON)
+
+The event loop only parses requests and writes responses; every SQLite call
+runs on a fixed pool of worker threads, with at most a few queued calls per
+worker so a burst waits in the loop instead of piling up behind the
+database. Concurrent lookups of the same account share one query.
+
+Posting returns 201 with the bill, or 409 with the bill already posted for
+that account and period. Errors are {"error": "..."} with a 4xx/5xx status.
+
+    python billing_service.py --db customer.db --host 127.0.0.1 --port 8080 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import database_handler
+import metrics
+import workflows
+
+MAX_BODY = 64 * 1024
+PERIOD = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+class HTTPError(Exception):
+    """A request that gets an error response"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def customer_json(customer):
+    """A customer record as a JSON-ready dict"""
+    return dict(customer._asdict())
+
+def price_bill(db, account_number, kwh_used, period=None):
+    """The customer and their bill for kwh_used; 404 for an unknown account"""
+    customer, bill_info = workflows.price_bill(db, account_number, kwh_used, period)
+    if not customer:
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"Account number {account_number} not found")
+    return customer, bill_info
+
+def post_bill(db, account_number, kwh_used, period=None):
+    """Price and post a bill, returning (posted, customer, bill); an existing bill is returned as is"""
+    _, customer, bill_info = workflows.generate_bill(db, account_number, kwh_used, period)
+    if not customer:
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"Account number {account_number} not found")
+    return 'posted_at' not in bill_info, customer, bill_info
+
+class BillingService:
+    """Routes HTTP requests to data_handler calls on a bounded thread pool"""
+    def __init__(self, db, workers=4, queue_per_worker=4):
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="billing-db")
+        self._slots = asyncio.Semaphore(workers * queue_per_worker)
+        self._lookups = {}
+        self.routes = [
+            ('GET', re.compile(r"^/health$"), self.health),
+            ('GET', re.compile(r"^/metrics$"), self.metrics),
+            ('GET', re.compile(r"^/customers$"), self.search),
+            ('GET', re.compile(r"^/customers/(\d+)$"), self.lookup),
+            ('GET', re.compile(r"^/customers/(\d+)/bill$"), self.preview),
+            ('POST', re.compile(r"^/customers/(\d+)/bills$"), self.post),
+        ]
+
+    async def run(self, fn, *args):
+        """Run a blocking database call on the pool, waiting for a free slot first"""
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def get_customer(self, account_number):
+        """Look up a customer, sharing the query with any lookup of the same account in flight"""
+        future = self._lookups.get(account_number)
+        if future is None:
+            future = asyncio.ensure_future(self.run(self.db.get_customer, account_number))
+            self._lookups[account_number] = future
+            future.add_done_callback(lambda _: self._lookups.pop(account_number, None))
+        # shield: one caller disconnecting must not cancel the query for the others
+        return await asyncio.shield(future)
+
+    async def health(self, query, body):
+        return HTTPStatus.OK, {'status': "ok"}
+
+    async def metrics(self, query, body):
+        # Recorded only when the service runs with BILLING_METRICS set
+        if query.get('format', [""])[0] == "json":
+            return HTTPStatus.OK, {'enabled': metrics.ENABLED, 'operations': metrics.REGISTRY.snapshot()}
+        return HTTPStatus.OK, metrics.REGISTRY.to_prometheus()
+
+    async def lookup(self, query, body, account_number):
+        customer = await self.get_customer(int(account_number))
+        if not customer:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Account number {account_number} not found")
+        return HTTPStatus.OK, customer_json(customer)
+
+    async def search(self, query, body):
+        text = query.get('q', [""])[0].strip()
+        if not text:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Give the search text as ?q=")
+        # SQLite reads a negative LIMIT as no limit at all
+        limit = max(1, min(_number(query.get('limit', ["50"])[0], "limit", int), 500))
+        customers = await self.run(self.db.find_customers, text, limit)
+        return HTTPStatus.OK, {'customers': [customer_json(customer) for customer in customers]}
+
+    async def preview(self, query, body, account_number):
+        kwh_used = _kwh(query.get('kwh', [None])[0], "kwh")
+        period = _period(query.get('period', [None])[0])
+        customer, bill_info = await self.run(price_bill, self.db, int(account_number), kwh_used, period)
+        return HTTPStatus.OK, {'customer': customer_json(customer), 'bill': bill_info}
+
+    async def post(self, query, body, account_number):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "The request body is not valid JSON") from None
+        if not isinstance(request, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "The request body must be a JSON object")
+        kwh_used = _kwh(request.get('kwh_used'), "kwh_used")
+        period = _period(request.get('period'))
+        posted, customer, bill_info = await self.run(post_bill, self.db, int(account_number), kwh_used, period)
+        return (HTTPStatus.CREATED if posted else HTTPStatus.CONFLICT,
+                {'posted': posted, 'customer': customer_json(customer), 'bill': bill_info})
+
+    async def dispatch(self, method, target, body):
+        """Return (status, JSON-ready body or text) for one request"""
+        url = urlsplit(target)
+        allowed = []
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(url.path)
+            if not match:
+                continue
+            if route_method != method:
+                allowed.append(route_method)
+                continue
+            return await handler(parse_qs(url.query), body, *match.groups())
+        if allowed:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Use {' or '.join(allowed)} for {url.path}")
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No such resource: {url.path}")
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until the client closes it (HTTP/1.1 keep-alive)"""
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                    if not request_line:
+                        break
+                    method, target, version = request_line.decode('latin-1').split()
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b"\r\n", b"\n", b""):
+                            break
+                        name, _, value = line.decode('latin-1').partition(":")
+                        headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get('content-length', 0))
+                    if length > MAX_BODY:
+                        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+                    body = await reader.readexactly(length) if length else b""
+                except (ValueError, asyncio.IncompleteReadError):
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST, {'error': "Malformed request"}, False)
+                    break
+                except HTTPError as e:
+                    await self.respond(writer, e.status, {'error': str(e)}, False)
+                    break
+
+                keep_alive = (version == "HTTP/1.1" and headers.get('connection', "").lower() != "close")
+                try:
+                    status, payload = await self.dispatch(method.upper(), target, body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        # Text payloads (the Prometheus metrics) are sent as they are, everything else as JSON
+        if isinstance(payload, str):
+            data = payload.encode('utf-8')
+            content_type = "text/plain; version=0.0.4"
+        else:
+            data = json.dumps(payload).encode('utf-8')
+            content_type = "application/json"
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data
+        )
+        await writer.drain()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+def _number(value, name, kind=float):
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be a number") from None
+
+def _kwh(value, name):
+    kwh_used = _number(value, name)
+    if not 0 <= kwh_used < float("inf"):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be a finite, non-negative number")
+    return kwh_used
+
+def _period(value):
+    if value is not None and not (isinstance(value, str) and PERIOD.match(value)):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "period must be YYYY-MM")
+    return value
+
+async def serve(db_path="customer.db", host="127.0.0.1", port=8080, workers=4):
+    # Other processes (the GUI, billing runs) write to the same file
+    db = database_handler.data_handler(db_path, check_data_version=True)
+    service = BillingService(db, workers)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    try:
+        for sock in server.sockets:
+            address = sock.getsockname()
+            print(f"✓ Billing service listening on http://{address[0]}:{address[1]}", flush=True)
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+        db.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve customer lookup, bill preview and posting over HTTP/JSON")
+    parser.add_argument("--db", default="customer.db", help="customer database (default: customer.db)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080, 0 picks one)")
+    parser.add_argument("--workers", type=int, default=4, help="database worker threads")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"✗ Could not start the billing service: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
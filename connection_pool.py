@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+class ConnectionPool:
+    """SQLite connections for one database file: a reader per thread and one serialized writer
+
+    The database runs in WAL mode, so readers never block the writer or each
+    other, and several processes can share the file. Within a process all
+    writes go through a single connection guarded by a lock; across processes
+    BEGIN IMMEDIATE takes SQLite's write lock up front, waiting out the busy
+    timeout and then retrying with backoff instead of failing with
+    "database is locked".
+    """
+    def __init__(self, data_file, busy_timeout=5.0, retries=5, retry_delay=0.05):
+        self.data_file = data_file
+        self.busy_timeout = busy_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._local = threading.local()
+        # (thread, connection) for every reader handed out
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._writer = self._connect()
+        # An in-memory database exists only on its own connection, so everything shares it
+        self._shared = data_file == ":memory:"
+        # Polled for data_version; its own lock, so a check never waits for a write
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+
+    def _connect(self):
+        # Autocommit mode: transactions are opened explicitly by writer()
+        con = sqlite3.connect(self.data_file, timeout=self.busy_timeout,
+                              isolation_level=None, check_same_thread=False)
+        con.execute("PRAGMA journal_mode = WAL")
+        # Safe with WAL and avoids an fsync on every commit
+        con.execute("PRAGMA synchronous = NORMAL")
+        return con
+
+    def reader(self):
+        """The calling thread's read connection"""
+        if self._shared:
+            return self._writer
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._connect()
+            self._local.con = con
+            thread = threading.current_thread()
+            with self._readers_lock:
+                # Threads that have finished never use theirs again
+                for owner, old in self._readers:
+                    if not owner.is_alive():
+                        old.close()
+                self._readers = [(owner, old) for owner, old in self._readers if owner.is_alive()]
+                self._readers.append((thread, con))
+        return con
+
+    @contextmanager
+    def writer(self):
+        """Run the block as one write transaction and yield its cursor
+
+        Commits when the block finishes and rolls back if it raises. Nested
+        use on the same thread joins the outer transaction.
+        """
+        with self._write_lock:
+            if self._writer.in_transaction:
+                yield self._writer.cursor()
+                return
+            self._begin()
+            try:
+                yield self._writer.cursor()
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+
+    def _begin(self):
+        """Take the database write lock, retrying while another process holds it"""
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            try:
+                self._writer.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                message = str(e).lower()
+                if attempt == self.retries or ("locked" not in message and "busy" not in message):
+                    raise
+                time.sleep(delay)
+                delay *= 2
+
+    def data_version(self):
+        """A number that changes whenever anyone else, this pool's writer included, commits to the database"""
+        if self._shared:
+            return 0
+        # Asked on a connection of its own that never writes, so every commit
+        # moves it and a check does not queue behind a write in progress
+        with self._watcher_lock:
+            if self._watcher is None:
+                self._watcher = self._connect()
+            return self._watcher.execute("PRAGMA data_version").fetchone()[0]
+
+    def interrupt(self):
+        """Abort whatever statement is running on any of the pool's connections"""
+        self._writer.interrupt()
+        with self._readers_lock:
+            for _, con in self._readers:
+                con.interrupt()
+
+    def close(self):
+        """Close every connection in the pool"""
+        with self._readers_lock:
+            for _, con in self._readers:
+                con.close()
+            self._readers = []
+        self._local = threading.local()
+        with self._watcher_lock:
+            if self._watcher is not None:
+                self._watcher.close()
+                self._watcher = None
+        self._writer.close()
@@ -0,0 +1,241 @@
+"""Columnar bulk export of customers and the billing ledger
+
+    python data_export.py --db customer.db --out exports
+    python data_export.py --db customer.db --out exports --format csv --full
+
+Streams the customer table and the posted_bill ledger, --chunk-size rows at
+a time, into a new directory under --out, so memory stays flat at any table
+size. Formats:
+
+    parquet   one .parquet file per table, a row group per chunk (needs pyarrow)
+    arrow     one Arrow IPC .arrow file per table, a record batch per chunk (needs pyarrow)
+    npz       one NumPy .npz file per chunk, an array per column
+    csv       one .csv file per table
+
+The default is parquet when pyarrow is installed, otherwise npz, otherwise
+csv. The first export to an --out directory is full. Later ones are
+incremental: they hold only the customers added, changed or deleted (in
+customer_deleted) and the bills posted since the last export to that
+directory. Every export directory ends with a manifest.json; one without it
+did not finish and is exported again next time.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import database_handler
+from database_handler import CUSTOMER_COLUMNS, LEDGER_COLUMNS
+
+FORMATS = ("parquet", "arrow", "npz", "csv")
+
+# Column types; every other exported column is text
+INTEGER_COLUMNS = {'AccountNumber', 'PostedBillId'}
+REAL_COLUMNS = {'Usage', 'AllTimeUsage', 'KwhUsed', 'Rate', 'BaseCharge', 'EnvironmentalFee', 'Subtotal',
+                'DiscountRate', 'DiscountAmount', 'Vat', 'TotalAmountDue'}
+
+def available_format():
+    """The best format the installed libraries can write"""
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        pass
+    try:
+        import numpy  # noqa: F401
+        return "npz"
+    except ImportError:
+        return "csv"
+
+class ArrowTableWriter:
+    """One Parquet or Arrow IPC file per table, appended a chunk at a time"""
+    def __init__(self, directory, table, columns, kind="parquet"):
+        import pyarrow as pa
+        self.pa = pa
+        self.schema = pa.schema([(name, pa.int64() if name in INTEGER_COLUMNS else
+                                  pa.float64() if name in REAL_COLUMNS else pa.string())
+                                 for name in columns])
+        self.files = [f"{table}.{kind}"]
+        path = os.path.join(directory, self.files[0])
+        if kind == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, rows):
+        arrays = [self.pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self._writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+class NpzTableWriter:
+    """A NumPy .npz file per chunk, holding one array per column"""
+    def __init__(self, directory, table, columns):
+        import numpy as np
+        self.np = np
+        self.directory = directory
+        self.table = table
+        self.columns = columns
+        self.files = []
+
+    def write(self, rows):
+        np = self.np
+        arrays = {}
+        for name, values in zip(self.columns, zip(*rows)):
+            if name in INTEGER_COLUMNS:
+                arrays[name] = np.array(values, dtype=np.int64)
+            elif name in REAL_COLUMNS:
+                # NULL becomes NaN
+                arrays[name] = np.array(values, dtype=np.float64)
+            else:
+                arrays[name] = np.array(["" if value is None else value for value in values], dtype=str)
+        filename = f"{self.table}-{len(self.files):05d}.npz"
+        np.savez(os.path.join(self.directory, filename), **arrays)
+        self.files.append(filename)
+
+    def close(self):
+        pass
+
+class CsvTableWriter:
+    """One CSV file per table with a header row"""
+    def __init__(self, directory, table, columns):
+        self.files = [f"{table}.csv"]
+        self._file = open(os.path.join(directory, self.files[0]), 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+def table_writer(format, directory, table, columns):
+    if format in ("parquet", "arrow"):
+        return ArrowTableWriter(directory, table, columns, format)
+    if format == "npz":
+        return NpzTableWriter(directory, table, columns)
+    return CsvTableWriter(directory, table, columns)
+
+def export_dir(out_dir, kind):
+    """A new, empty directory for one export under out_dir"""
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(out_dir, f"{stamp}-{kind}")
+    suffix = 1
+    while os.path.exists(path):
+        suffix += 1
+        path = os.path.join(out_dir, f"{stamp}-{kind}-{suffix}")
+    os.makedirs(path)
+    return path
+
+def export(db, out_dir, format=None, chunk_size=10000, name=None, full=False, progress=None):
+    """Export customers and the ledger to a new directory under out_dir and return its manifest
+
+    Incremental unless full is set or out_dir (or the export target name)
+    has never completed an export. Returns None if the export could not be
+    registered or its watermark saved; the files are then exported again
+    next time.
+    """
+    format = format or available_format()
+    name = name or os.path.abspath(out_dir)
+    watermark = None if full else db.get_export_watermark(name)
+    # Log customer changes for this target before reading the marks, so a change
+    # made while the export runs is picked up next time
+    if not db.open_export_watermark(name):
+        return None
+    customer_seq, posted_bill_id = db.get_export_marks()
+
+    if watermark is None:
+        kind = "full"
+        tables = [
+            ("customer", CUSTOMER_COLUMNS, db.iter_customer_chunks(chunk_size=chunk_size)),
+            ("posted_bill", LEDGER_COLUMNS, db.iter_ledger_chunks(0, posted_bill_id, chunk_size))
+        ]
+    else:
+        kind = "incremental"
+        since_seq, since_bill = watermark
+        tables = [
+            ("customer", CUSTOMER_COLUMNS, db.iter_customer_chunks(since_seq, customer_seq, chunk_size)),
+            ("customer_deleted", "AccountNumber",
+             db.iter_deleted_customer_chunks(since_seq, customer_seq, chunk_size)),
+            ("posted_bill", LEDGER_COLUMNS, db.iter_ledger_chunks(since_bill, posted_bill_id, chunk_size))
+        ]
+
+    directory = export_dir(out_dir, kind)
+    manifest = {
+        'kind': kind,
+        'format': format,
+        'exported_at': datetime.now().isoformat(timespec='seconds'),
+        'since': {'customer_seq': watermark[0], 'posted_bill_id': watermark[1]} if watermark else None,
+        'through': {'customer_seq': customer_seq, 'posted_bill_id': posted_bill_id},
+        'tables': {}
+    }
+    for table, columns, chunks in tables:
+        columns = columns.split(", ")
+        writer = table_writer(format, directory, table, columns)
+        rows = 0
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+                rows += len(chunk)
+                if progress:
+                    progress(table, rows)
+        finally:
+            writer.close()
+        manifest['tables'][table] = {'rows': rows, 'columns': columns, 'files': writer.files}
+
+    with open(os.path.join(directory, "manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    if not db.set_export_watermark(name, customer_seq, posted_bill_id):
+        return None
+    manifest['directory'] = directory
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export customers and posted bills to columnar files")
+    parser.add_argument("--db", default="customer.db", help="customer database (default: customer.db)")
+    parser.add_argument("--out", default="exports", help="directory to export into (default: exports)")
+    parser.add_argument("--format", choices=FORMATS,
+                        help="file format (default: parquet with pyarrow installed, else npz, else csv)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="rows read and written at a time")
+    parser.add_argument("--full", action="store_true", help="export everything, not just changes")
+    parser.add_argument("--name", help="export watermark name (default: absolute path of --out)")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    if args.format in ("parquet", "arrow") and available_format() != "parquet":
+        parser.error(f"--format {args.format} needs pyarrow installed")
+
+    db = database_handler.data_handler(args.db)
+    try:
+        started = time.perf_counter()
+
+        def report(table, rows):
+            if rows % 100000 < args.chunk_size:
+                print(f"  {table}: {rows} rows")
+
+        try:
+            manifest = export(db, args.out, args.format, args.chunk_size, args.name, args.full, report)
+        except OSError as e:
+            print(f"✗ Export failed: {e}")
+            return 1
+        if manifest is None:
+            print("✗ Export failed")
+            return 1
+        tables = manifest['tables']
+        deleted = tables.get('customer_deleted', {}).get('rows', 0)
+        print(f"✓ {manifest['kind'].capitalize()} {manifest['format']} export of {tables['customer']['rows']} customers"
+              f"{f' ({deleted} deleted)' if deleted else ''} and {tables['posted_bill']['rows']} posted bills "
+              f"to {manifest['directory']} in {time.perf_counter() - started:.2f}s")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,117 @@
+import csv
+import json
+import os
+import re
 import sqlite3
-from random import randint
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime
 
+import metrics
+from connection_pool import ConnectionPool
+from tariff import TariffBook
+
+# Columns the customer list may be sorted by; each one is indexed so the sort
+# and keyset paging run in SQL. Usage columns are left out on purpose: indexing
+# them would slow down every billing write.
+SORTABLE_COLUMNS = ('AccountNumber', 'CustomerName', 'Type', 'Discount')
+
+CUSTOMER_COLUMNS = "AccountNumber, CustomerName, Address, Type, Discount, Usage, AllTimeUsage"
+
+POSTED_BILL_COLUMNS = ("KwhUsed, Rate, BaseCharge, EnvironmentalFee, Subtotal, DiscountType, DiscountRate, "
+                       "DiscountAmount, Vat, TotalAmountDue, Period, PostedAt")
+
+# The whole ledger row, as exported
+LEDGER_COLUMNS = "PostedBillId, AccountNumber, CustomerType, " + POSTED_BILL_COLUMNS
+
+class Customer(namedtuple('Customer', 'account_number name address type discount usage all_time_usage')):
+    """One customer row, as a compact tuple
+    
+    Fields are read as attributes (customer.name) or, like the dicts this
+    module used to return, by key (customer['name']).
+    """
+    __slots__ = ()
+    
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self._fields else default
+    
+    def keys(self):
+        return self._fields
+
+# Ways the revenue report can be grouped, as SQL over the revenue_summary table
+REPORT_GROUPS = {
+    'month': "Period",
+    'quarter': "substr(Period, 1, 4) || '-Q' || ((CAST(substr(Period, 6, 2) AS INT) + 2) / 3)",
+    'year': "substr(Period, 1, 4)",
+    'type': "CustomerType",
+    'discount': "DiscountType"
+}
+
+# Consumption since the first reading, as of the last reading before a date
+_TOTAL_BEFORE = """
+    SELECT Total FROM meter_reading 
+    WHERE AccountNumber = ? AND ReadingDate < ? 
+    ORDER BY ReadingDate DESC LIMIT 1
+"""
+
+def _period_bounds(period=None):
+    """First day of a YYYY-MM period (default: this month) and of the month after it"""
+    period = period or datetime.now().strftime("%Y-%m")
+    year, month = int(period[:4]), int(period[5:7])
+    following = f"{year + 1}-01" if month == 12 else f"{year}-{month + 1:02d}"
+    return f"{period}-01", f"{following}-01"
+
+# Bump whenever _create_schema changes so existing databases pick up the change
+SCHEMA_VERSION = 9
+
+# Every query method is timed when metrics are on; cache bookkeeping is not a query
+@metrics.instrumented("data_handler", exclude=("invalidate", "clear_cache", "cache_stats", "interrupt", "close"))
 class data_handler:
-    def __init__(self, data_file):
-        self.con = sqlite3.connect(data_file)
-        self.cur = self.con.cursor()
+    def __init__(self, data_file, busy_timeout=5.0, cache_size=1024, check_data_version=False):
+        # WAL database with a reader connection per thread and one serialized writer,
+        # so a data_handler can be shared between threads and several processes
+        self.pool = ConnectionPool(data_file, busy_timeout)
         
+        # Bounded LRU of customer records read by get_customer; cache_size=0 turns it off.
+        # Writes through this handler invalidate it. When other handlers or processes
+        # write to the same file, either turn it off or set check_data_version so the
+        # whole cache is dropped after any commit, this handler's own included. The
+        # check runs on a connection of its own, so lookups never wait for a write.
+        self.cache_size = cache_size
+        self.check_data_version = check_data_version
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_generation = 0
+        self._data_version = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        # Compiled tariffs, shared by every bill priced through this handler until
+        # save_tariffs (or, with check_data_version, any commit) may have changed them
+        self._tariff_book = None
+        self._tariff_data_version = None
+        
+        # Schema setup runs once per schema version, not on every start
+        cur = self.pool.reader().execute("PRAGMA user_version")
+        if cur.fetchone()[0] < SCHEMA_VERSION:
+            with self.pool.writer() as cur:
+                self._create_schema(cur)
+        else:
+            cur = self.pool.reader().execute("SELECT 1 FROM sqlite_master WHERE name = 'customer_fts'")
+            self.fts_enabled = cur.fetchone() is not None
+    
+    def _create_schema(self, cur):
+        """Create or upgrade every table, index and trigger, then stamp the schema version"""
         # Create customer table if it doesn't exist
-        self.cur.execute("""
+        cur.execute("""
             CREATE TABLE IF NOT EXISTS customer(
                 AccountNumber INTEGER PRIMARY KEY NOT NULL, 
                 CustomerName TEXT NOT NULL, 
@@ -18,86 +122,695 @@ class data_handler:
                 AllTimeUsage INT DEFAULT 0
             )
         """)
-        self.con.commit()
+        
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_customer_name ON customer(CustomerName)")
+        # Not redundant with the composites below: every index ends in the rowid, so
+        # these keep each Type or Discount value in account order, which a Type or
+        # Discount sort and a filtered account-number list read pages in
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_customer_type ON customer(Type)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_customer_discount ON customer(Discount)")
+        # Every filter the customer list offers, followed by every sort, so a keyset
+        # page is read in index order instead of sorting the whole filtered set.
+        # The rowid (AccountNumber) ends every index and breaks ties
+        for name, columns in (
+            ('type_name', "Type, CustomerName"),
+            ('type_discount', "Type, Discount"),
+            ('discount_name', "Discount, CustomerName"),
+            ('discount_type', "Discount, Type"),
+            ('type_discount_name', "Type, Discount, CustomerName")
+        ):
+            cur.execute(f"CREATE INDEX IF NOT EXISTS idx_customer_{name} ON customer({columns})")
+        
+        self.fts_enabled = self._create_search_index(cur)
+        
+        # Single-row sequence that hands out account numbers; it starts above every
+        # existing (randomly assigned) account so old and new numbers never collide
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS account_sequence(
+                Id INTEGER PRIMARY KEY CHECK (Id = 1), 
+                NextAccount INT NOT NULL
+            )
+        """)
+        cur.execute("""
+            INSERT OR IGNORE INTO account_sequence (Id, NextAccount)
+            SELECT 1, MAX(COALESCE(MAX(AccountNumber) + 1, 100000), 100000) FROM customer
+        """)
+        
+        # Checkpoints for headless billing runs so a crashed run can resume
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS billing_run(
+                RunId TEXT PRIMARY KEY NOT NULL, 
+                Position INT DEFAULT 0, 
+                Billed INT DEFAULT 0, 
+                UpdatedAt TEXT
+            )
+        """)
+        
+        # One-time steps that have been done on this database, such as importing
+        # the bill files saved before the bill history existed
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS app_state(
+                Key TEXT PRIMARY KEY NOT NULL, 
+                Value TEXT
+            )
+        """)
+        
+        # One row per saved bill file, so bill history never has to scan bills/
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS bill(
+                BillId INTEGER PRIMARY KEY NOT NULL, 
+                AccountNumber INT NOT NULL, 
+                GeneratedAt TEXT NOT NULL, 
+                KwhUsed REAL, 
+                Subtotal REAL, 
+                DiscountAmount REAL, 
+                Vat REAL, 
+                TotalAmountDue REAL, 
+                Format TEXT NOT NULL, 
+                Path TEXT NOT NULL, 
+                FileSize INT, 
+                Segment TEXT, 
+                Offset INT, 
+                Length INT
+            )
+        """)
+        # Bills stored in the archive (see bill_archive.py) record the segment file
+        # and byte range holding them; Path is then just the bill's file name
+        self._add_columns(cur, 'bill', {'Segment': 'TEXT', 'Offset': 'INT', 'Length': 'INT'})
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_bill_generated ON bill(GeneratedAt)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_bill_account ON bill(AccountNumber, GeneratedAt)")
+        
+        # The billing ledger: at most one posted bill per account and billing period
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS posted_bill(
+                PostedBillId INTEGER PRIMARY KEY NOT NULL, 
+                AccountNumber INT NOT NULL, 
+                Period TEXT NOT NULL, 
+                PostedAt TEXT NOT NULL, 
+                KwhUsed REAL NOT NULL, 
+                Rate REAL, 
+                BaseCharge REAL, 
+                EnvironmentalFee REAL, 
+                Subtotal REAL, 
+                DiscountType TEXT, 
+                DiscountRate REAL, 
+                DiscountAmount REAL, 
+                Vat REAL, 
+                TotalAmountDue REAL, 
+                CustomerType TEXT, 
+                UNIQUE (AccountNumber, Period)
+            )
+        """)
+        if self._add_columns(cur, 'posted_bill', {'CustomerType': 'TEXT'}):
+            # Ledgers created before the revenue reports
+            cur.execute("""
+                UPDATE posted_bill 
+                SET CustomerType = (SELECT Type FROM customer WHERE AccountNumber = posted_bill.AccountNumber)
+            """)
+        
+        # Posting a bill charges its usage to the customer in the same statement,
+        # so a bill that is skipped as already posted never adds usage twice.
+        # Usage and AllTimeUsage are a copy of the ledger kept for cheap lookups
+        # and list pages; reconcile_usage checks them against it. Metered usage
+        # (meter_reading) is what was measured, not what was billed.
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS posted_bill_usage AFTER INSERT ON posted_bill BEGIN
+                UPDATE customer 
+                SET Usage = new.KwhUsed, AllTimeUsage = AllTimeUsage + new.KwhUsed
+                WHERE AccountNumber = new.AccountNumber;
+            END
+        """)
+        
+        # Tariff versions per customer type; see tariff.py for the definition format
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS tariff(
+                CustomerType TEXT NOT NULL, 
+                EffectiveFrom TEXT NOT NULL, 
+                Definition TEXT NOT NULL, 
+                PRIMARY KEY (CustomerType, EffectiveFrom)
+            )
+        """)
+        
+        # Revenue and consumption totals per month, customer type and discount,
+        # kept current by a trigger so reports never scan the ledger
+        cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'revenue_summary'")
+        summary_exists = cur.fetchone() is not None
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS revenue_summary(
+                Period TEXT NOT NULL, 
+                CustomerType TEXT NOT NULL, 
+                DiscountType TEXT NOT NULL, 
+                Bills INT NOT NULL, 
+                KwhUsed REAL NOT NULL, 
+                Subtotal REAL NOT NULL, 
+                DiscountAmount REAL NOT NULL, 
+                Vat REAL NOT NULL, 
+                TotalAmountDue REAL NOT NULL, 
+                PRIMARY KEY (Period, CustomerType, DiscountType)
+            ) WITHOUT ROWID
+        """)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS posted_bill_summary AFTER INSERT ON posted_bill BEGIN
+                INSERT INTO revenue_summary (Period, CustomerType, DiscountType, Bills, KwhUsed, 
+                                             Subtotal, DiscountAmount, Vat, TotalAmountDue)
+                VALUES (new.Period, COALESCE(new.CustomerType, ''), COALESCE(new.DiscountType, 'None'), 1, 
+                        new.KwhUsed, COALESCE(new.Subtotal, 0), COALESCE(new.DiscountAmount, 0), 
+                        COALESCE(new.Vat, 0), COALESCE(new.TotalAmountDue, 0))
+                ON CONFLICT (Period, CustomerType, DiscountType) DO UPDATE SET 
+                    Bills = Bills + 1, 
+                    KwhUsed = KwhUsed + excluded.KwhUsed, 
+                    Subtotal = Subtotal + excluded.Subtotal, 
+                    DiscountAmount = DiscountAmount + excluded.DiscountAmount, 
+                    Vat = Vat + excluded.Vat, 
+                    TotalAmountDue = TotalAmountDue + excluded.TotalAmountDue;
+            END
+        """)
+        if not summary_exists:
+            # Summarize bills posted before the summary table existed
+            self._rebuild_revenue_summary(cur)
+        
+        # Meter register readings over time. Kwh (consumption since the previous
+        # reading) and Total (consumption since the first reading) are derived in
+        # SQL on ingest, so usage over any period is two primary-key seeks
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS meter_reading(
+                AccountNumber INT NOT NULL, 
+                ReadingDate TEXT NOT NULL, 
+                Reading REAL NOT NULL, 
+                Kwh REAL, 
+                Total REAL, 
+                PRIMARY KEY (AccountNumber, ReadingDate)
+            ) WITHOUT ROWID
+        """)
+        
+        # Bulk exports (see data_export.py) remember how far they got, per export
+        # target. Once any target exists, every customer insert, update and delete
+        # moves the account to the end of customer_change, so an incremental
+        # export reads only the accounts changed since its watermark. The ledger
+        # is append-only and is exported by PostedBillId instead.
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS export_watermark(
+                Name TEXT PRIMARY KEY NOT NULL, 
+                CustomerSeq INT, 
+                PostedBillId INT, 
+                ExportedAt TEXT
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS customer_change(
+                Seq INTEGER PRIMARY KEY AUTOINCREMENT, 
+                AccountNumber INT NOT NULL UNIQUE, 
+                Deleted INT NOT NULL DEFAULT 0
+            )
+        """)
+        for event, row, deleted in (("INSERT", "new", 0), ("UPDATE", "new", 0), ("DELETE", "old", 1)):
+            # Delete-then-insert rather than OR REPLACE: a trigger takes on the conflict
+            # clause of the statement that fired it, which could turn REPLACE into IGNORE
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS customer_change_{event.lower()} AFTER {event} ON customer 
+                WHEN EXISTS (SELECT 1 FROM export_watermark) BEGIN
+                    DELETE FROM customer_change WHERE AccountNumber = {row}.AccountNumber;
+                    INSERT INTO customer_change (AccountNumber, Deleted) VALUES ({row}.AccountNumber, {deleted});
+                END
+            """)
+        cur.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    
+    def _add_columns(self, cur, table, columns):
+        """Add any of columns ({name: type}) missing from a table created by an older version"""
+        cur.execute(f"PRAGMA table_info({table})")
+        existing = {column[1] for column in cur.fetchall()}
+        missing = [name for name in columns if name not in existing]
+        for name in missing:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {columns[name]}")
+        return bool(missing)
+    
+    def _create_search_index(self, cur):
+        """Create the full-text index over names and addresses, if SQLite has FTS5"""
+        cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'customer_fts'")
+        exists = cur.fetchone() is not None
+        try:
+            # External-content table: the index stores only tokens, rows stay in customer
+            cur.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS customer_fts USING fts5(
+                    CustomerName, Address, 
+                    content='customer', content_rowid='AccountNumber', prefix='2 3'
+                )
+            """)
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search unavailable, falling back to LIKE: {e}")
+            return False
+        
+        # Keep the index in sync; usage updates do not touch these columns
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS customer_fts_insert AFTER INSERT ON customer BEGIN
+                INSERT INTO customer_fts (rowid, CustomerName, Address)
+                VALUES (new.AccountNumber, new.CustomerName, new.Address);
+            END
+        """)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS customer_fts_delete AFTER DELETE ON customer BEGIN
+                INSERT INTO customer_fts (customer_fts, rowid, CustomerName, Address)
+                VALUES ('delete', old.AccountNumber, old.CustomerName, old.Address);
+            END
+        """)
+        cur.execute("""
+            CREATE TRIGGER IF NOT EXISTS customer_fts_update AFTER UPDATE OF CustomerName, Address ON customer BEGIN
+                INSERT INTO customer_fts (customer_fts, rowid, CustomerName, Address)
+                VALUES ('delete', old.AccountNumber, old.CustomerName, old.Address);
+                INSERT INTO customer_fts (rowid, CustomerName, Address)
+                VALUES (new.AccountNumber, new.CustomerName, new.Address);
+            END
+        """)
+        if not exists:
+            # Index customers created before the search index existed
+            cur.execute("INSERT INTO customer_fts (customer_fts) VALUES ('rebuild')")
+        return True
+    
+    def _allocate_accounts(self, cur, count):
+        """Reserve count consecutive account numbers and return the first one
+        
+        Must run inside a write transaction (BEGIN IMMEDIATE) so the reservation
+        is serialized against other processes importing at the same time.
+        """
+        cur.execute("UPDATE account_sequence SET NextAccount = NextAccount + ? WHERE Id = 1", (count,))
+        cur.execute("SELECT NextAccount FROM account_sequence WHERE Id = 1")
+        return cur.fetchone()[0] - count
     
     def create_account(self, name, address, type, discount):
         """Create a new customer account with a unique account number"""
-        # Generate unique account number
-        while True:
-            account_number = randint(100000, 999999)
-            # Check if account number already exists
-            self.cur.execute("SELECT AccountNumber FROM customer WHERE AccountNumber = ?", (account_number,))
-            if self.cur.fetchone() is None:
-                break
-        
-        try:
-            self.cur.execute("""
-                INSERT INTO customer (AccountNumber, CustomerName, Address, Type, Discount, Usage, AllTimeUsage)
-                VALUES (?, ?, ?, ?, ?, 0, 0)
-            """, (account_number, name, address, type, discount))
-            self.con.commit()
+        try:
+            with self.pool.writer() as cur:
+                account_number = self._allocate_accounts(cur, 1)
+                cur.execute("""
+                    INSERT INTO customer (AccountNumber, CustomerName, Address, Type, Discount, Usage, AllTimeUsage)
+                    VALUES (?, ?, ?, ?, ?, 0, 0)
+                """, (account_number, name, address, type, discount))
             print(f"✓ Account created successfully! Account Number: {account_number}")
             return account_number
         except sqlite3.Error as e:
             print(f"✗ Error creating account: {e}")
             return None
     
+    def import_customers(self, customers, chunk_size=10000):
+        """Create many accounts in one transaction, returning their account numbers
+        
+        customers is any iterable of dicts with name, address, type and discount
+        keys (type and discount are optional) or of (name, address, type, discount)
+        tuples. Either every customer is imported or none is.
+        """
+        account_numbers = []
+        try:
+            with self.pool.writer() as cur:
+                chunk = []
+                for customer in customers:
+                    if isinstance(customer, dict):
+                        customer = (customer['name'], customer.get('address', ''),
+                                    customer.get('type') or 'Residential', customer.get('discount') or 'None')
+                    chunk.append(customer)
+                    if len(chunk) >= chunk_size:
+                        account_numbers.extend(self._insert_customers(cur, chunk))
+                        chunk = []
+                if chunk:
+                    account_numbers.extend(self._insert_customers(cur, chunk))
+            print(f"✓ Imported {len(account_numbers)} accounts")
+            return account_numbers
+        except (sqlite3.Error, KeyError, ValueError) as e:
+            print(f"✗ Error importing customers: {e}")
+            return None
+    
+    def _insert_customers(self, cur, chunk):
+        """Insert one chunk of (name, address, type, discount) tuples under fresh account numbers"""
+        first = self._allocate_accounts(cur, len(chunk))
+        account_numbers = range(first, first + len(chunk))
+        cur.executemany("""
+            INSERT INTO customer (AccountNumber, CustomerName, Address, Type, Discount, Usage, AllTimeUsage)
+            VALUES (?, ?, ?, ?, ?, 0, 0)
+        """, [(account_number, *customer) for account_number, customer in zip(account_numbers, chunk)])
+        return account_numbers
+    
+    def import_customers_csv(self, csv_path, chunk_size=10000):
+        """Import customers from a CSV with name,address,type,discount columns"""
+        with open(csv_path, newline='') as f:
+            return self.import_customers(csv.DictReader(f), chunk_size)
+    
     def get_customer(self, account_number):
         """Get customer information by account number"""
-        self.cur.execute("SELECT * FROM customer WHERE AccountNumber = ?", (account_number,))
-        customer = self.cur.fetchone()
+        if not self.cache_size:
+            return self._fetch_customer(account_number)
         
+        if self.check_data_version:
+            data_version = self.pool.data_version()
+            if data_version != self._data_version:
+                self.clear_cache()
+                self._data_version = data_version
+        
+        with self._cache_lock:
+            customer = self._cache.get(account_number)
+            if customer is not None:
+                self._cache.move_to_end(account_number)
+                self.cache_hits += 1
+                return customer
+            self.cache_misses += 1
+            generation = self._cache_generation
+        
+        customer = self._fetch_customer(account_number)
         if customer:
-            return {
-                'account_number': customer[0],
-                'name': customer[1],
-                'address': customer[2],
-                'type': customer[3],
-                'discount': customer[4],
-                'usage': customer[5],
-                'all_time_usage': customer[6]
-            }
+            with self._cache_lock:
+                # Skip the insert if a write invalidated the cache while we were reading
+                if generation == self._cache_generation:
+                    self._cache[account_number] = customer
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+        return customer
+    
+    def _fetch_customer(self, account_number):
+        """Read one customer straight from the database, bypassing the cache"""
+        cur = self.pool.reader().execute(
+            f"SELECT {CUSTOMER_COLUMNS} FROM customer WHERE AccountNumber = ?", (account_number,))
+        customer = cur.fetchone()
+        
+        if customer:
+            return Customer._make(customer)
         else:
             return None
     
+    def invalidate(self, account_numbers=None):
+        """Drop the given accounts from the customer cache, or every account if none are given"""
+        with self._cache_lock:
+            self._cache_generation += 1
+            if account_numbers is None:
+                self._cache.clear()
+            else:
+                for account_number in account_numbers:
+                    self._cache.pop(account_number, None)
+    
+    def clear_cache(self):
+        """Empty the customer cache"""
+        self.invalidate()
+    
+    def cache_stats(self):
+        """Customer cache hits, misses, hit rate and current size"""
+        with self._cache_lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'hit_rate': self.cache_hits / lookups if lookups else 0.0,
+                'size': len(self._cache),
+                'capacity': self.cache_size
+            }
+    
     def update_usage(self, account_number, kwh_used):
         """Update customer usage"""
-        customer = self.get_customer(account_number)
-        if not customer:
+        try:
+            with self.pool.writer() as cur:
+                # Incremented in SQL so a concurrent writer's update is never lost
+                cur.execute("""
+                    UPDATE customer 
+                    SET Usage = ?, AllTimeUsage = AllTimeUsage + ?
+                    WHERE AccountNumber = ?
+                """, (kwh_used, kwh_used, account_number))
+            self.invalidate([account_number])
+            return cur.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Error updating usage: {e}")
             return False
+    
+    def reconcile_usage(self, repair=False):
+        """Find customers whose Usage and AllTimeUsage disagree with their posted bills
         
-        new_usage = kwh_used
-        new_all_time_usage = customer['all_time_usage'] + kwh_used
+        The columns are a copy of the ledger: the kWh of the account's last
+        posted bill and the sum over all of them. Returns a list of dicts with
+        the stored and billed figures, or None on error. With repair set, the
+        columns are rewritten from the ledger in the same transaction; only do
+        that once the ledger holds every bill ever charged to the accounts
+        (usage added with update_usage or before the ledger existed is not).
+        """
+        try:
+            with self.pool.writer() as cur:
+                cur.execute("""
+                    SELECT c.AccountNumber, c.Usage, c.AllTimeUsage, 
+                           COALESCE(b.Usage, 0), COALESCE(b.AllTimeUsage, 0)
+                    FROM customer c 
+                    LEFT JOIN (
+                        SELECT AccountNumber, SUM(KwhUsed) AS AllTimeUsage, 
+                               (SELECT KwhUsed FROM posted_bill last 
+                                WHERE last.AccountNumber = p.AccountNumber 
+                                ORDER BY PostedBillId DESC LIMIT 1) AS Usage
+                        FROM posted_bill p 
+                        GROUP BY AccountNumber
+                    ) b ON b.AccountNumber = c.AccountNumber 
+                    WHERE ABS(COALESCE(c.Usage, 0) - COALESCE(b.Usage, 0)) > 0.0005 
+                       OR ABS(COALESCE(c.AllTimeUsage, 0) - COALESCE(b.AllTimeUsage, 0)) > 0.0005
+                    ORDER BY c.AccountNumber
+                """)
+                mismatches = [{'account_number': account_number, 'usage': usage, 'all_time_usage': all_time_usage,
+                               'billed_usage': billed_usage, 'billed_all_time_usage': billed_all_time_usage}
+                              for account_number, usage, all_time_usage, billed_usage, billed_all_time_usage
+                              in cur.fetchall()]
+                if repair and mismatches:
+                    cur.executemany("UPDATE customer SET Usage = ?, AllTimeUsage = ? WHERE AccountNumber = ?",
+                                    [(row['billed_usage'], row['billed_all_time_usage'], row['account_number'])
+                                     for row in mismatches])
+            if repair:
+                self.invalidate([row['account_number'] for row in mismatches])
+            return mismatches
+        except sqlite3.Error as e:
+            print(f"Error reconciling usage: {e}")
+            return None
+    
+    def get_customers(self, account_numbers):
+        """Get several customers at once, keyed by account number"""
+        account_numbers = list(account_numbers)
+        result = {}
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(account_numbers), 900):
+            chunk = account_numbers[start:start + 900]
+            placeholders = ", ".join("?" * len(chunk))
+            cur = self.pool.reader().execute(
+                f"SELECT {CUSTOMER_COLUMNS} FROM customer WHERE AccountNumber IN ({placeholders})", chunk)
+            for customer in map(Customer._make, cur.fetchall()):
+                result[customer.account_number] = customer
+        return result
+    
+    def get_run_position(self, run_id):
+        """Get how many readings a billing run has already committed"""
+        cur = self.pool.reader().execute("SELECT Position FROM billing_run WHERE RunId = ?", (run_id,))
+        row = cur.fetchone()
+        return row[0] if row else 0
+    
+    def get_run_positions(self, prefix):
+        """Get the committed position of every billing run checkpoint whose id starts with prefix"""
+        cur = self.pool.reader().execute(
+            "SELECT RunId, Position FROM billing_run WHERE substr(RunId, 1, length(?1)) = ?1", (prefix,))
+        return dict(cur.fetchall())
+    
+    def record_billing_batch(self, run_id, position, bills, period=None):
+        """Post a batch of (account_number, bill_info) bills and checkpoint the run
         
+        The bills and the new run position are committed together, so after a
+        crash the run resumes exactly after the last committed batch. Returns
+        the number of bills posted (bills already posted for the period are
+        skipped), or None if the batch could not be committed.
+        """
         try:
-            self.cur.execute("""
-                UPDATE customer 
-                SET Usage = ?, AllTimeUsage = ?
-                WHERE AccountNumber = ?
-            """, (new_usage, new_all_time_usage, account_number))
-            self.con.commit()
-            return True
+            with self.pool.writer() as cur:
+                posted = self._post_bills(cur, bills, period)
+                cur.execute("""
+                    INSERT INTO billing_run (RunId, Position, Billed, UpdatedAt)
+                    VALUES (?, ?, ?, datetime('now'))
+                    ON CONFLICT(RunId) DO UPDATE SET 
+                        Position = excluded.Position, 
+                        Billed = Billed + excluded.Billed, 
+                        UpdatedAt = excluded.UpdatedAt
+                """, (run_id, position, posted))
+            self.invalidate([account_number for account_number, bill_info in bills])
+            return posted
         except sqlite3.Error as e:
-            print(f"Error updating usage: {e}")
-            return False
+            print(f"Error recording billing batch: {e}")
+            return None
+    
+    def post_bill(self, account_number, bill_info, period=None):
+        """Post a computed bill: record it and add its usage to the account in one transaction
+        
+        period (default: the current month, YYYY-MM) makes posting idempotent;
+        a second bill for the same account and period is ignored. Returns True
+        if the bill was posted, False if the account does not exist, the period
+        was already billed, or the write failed.
+        """
+        return bool(self.post_bills([(account_number, bill_info)], period))
+    
+    def post_bills(self, bills, period=None):
+        """Post many (account_number, bill_info) bills in a single transaction
+        
+        Returns how many were posted; bills for unknown accounts or for a
+        period that is already billed are skipped. Returns None on error, in
+        which case nothing is posted.
+        """
+        try:
+            with self.pool.writer() as cur:
+                posted = self._post_bills(cur, bills, period)
+            self.invalidate([account_number for account_number, bill_info in bills])
+            return posted
+        except sqlite3.Error as e:
+            print(f"Error posting bills: {e}")
+            return None
+    
+    def _post_bills(self, cur, bills, period=None):
+        """Insert posted bills inside the caller's transaction and return how many were new"""
+        posted_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        period = period or posted_at[:7]
+        # The posted_bill_usage and posted_bill_summary triggers charge the usage
+        # and update the revenue summary for every row actually inserted
+        cur.executemany("""
+            INSERT INTO posted_bill (AccountNumber, Period, PostedAt, KwhUsed, Rate, BaseCharge, 
+                                     EnvironmentalFee, Subtotal, DiscountType, DiscountRate, 
+                                     DiscountAmount, Vat, TotalAmountDue, CustomerType)
+            SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, Type
+            FROM customer WHERE AccountNumber = ?1
+            ON CONFLICT (AccountNumber, Period) DO NOTHING
+        """, [(account_number, period, posted_at, bill_info['kwh_used'], bill_info.get('rate'),
+               bill_info.get('base_charge'), bill_info.get('environmental_fee'), bill_info.get('subtotal'),
+               bill_info.get('discount_type'), bill_info.get('discount_rate'),
+               bill_info.get('discount_amount'), bill_info.get('vat'), bill_info.get('total_amount_due'))
+              for account_number, bill_info in bills])
+        return max(cur.rowcount, 0)
+    
+    def get_posted_bill(self, account_number, period=None):
+        """Get the bill posted for an account and period (default: current month), or None"""
+        period = period or datetime.now().strftime("%Y-%m")
+        cur = self.pool.reader().execute(f"""
+            SELECT {POSTED_BILL_COLUMNS}
+            FROM posted_bill WHERE AccountNumber = ? AND Period = ?
+        """, (account_number, period))
+        row = cur.fetchone()
+        return self._posted_bill_dict(row) if row else None
+    
+    def _posted_bill_dict(self, row):
+        """Turn a row of POSTED_BILL_COLUMNS into a compute_bill style dict"""
+        bill_info = dict(zip(('kwh_used', 'rate', 'base_charge', 'environmental_fee', 'subtotal',
+                              'discount_type', 'discount_rate', 'discount_amount', 'vat',
+                              'total_amount_due', 'period', 'posted_at'), row))
+        bill_info['subtotal_after_discount'] = bill_info['subtotal'] - bill_info['discount_amount']
+        return bill_info
+    
+    def iter_posted_bills(self, period=None, chunk_size=1000):
+        """Iterate over (customer, bill_info) for every bill posted in a period, by account number"""
+        period = period or datetime.now().strftime("%Y-%m")
+        columns = ", ".join(f"c.{column}" for column in CUSTOMER_COLUMNS.split(", "))
+        posted = ", ".join(f"b.{column}" for column in POSTED_BILL_COLUMNS.split(", "))
+        cur = self.pool.reader().execute(f"""
+            SELECT {columns}, {posted}
+            FROM posted_bill b JOIN customer c ON c.AccountNumber = b.AccountNumber
+            WHERE b.Period = ?
+            ORDER BY b.AccountNumber
+        """, (period,))
+        width = len(Customer._fields)
+        try:
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield Customer._make(row[:width]), self._posted_bill_dict(row[width:])
+        finally:
+            cur.close()
+    
+    def _iter_rows(self, query, values=(), chunk_size=1000):
+        """Stream a customer query as Customer records, fetching chunk_size rows at a time"""
+        cur = self.pool.reader().execute(query, values)
+        try:
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from map(Customer._make, rows)
+        finally:
+            cur.close()
+    
+    def iter_customers(self, chunk_size=1000, type=None, discount=None):
+        """Iterate over customers in account number order without loading them all"""
+        conditions, values = self._customer_filter(type, discount)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._iter_rows(f"SELECT {CUSTOMER_COLUMNS} FROM customer {where} ORDER BY AccountNumber",
+                               values, chunk_size)
+    
+    def iter_search(self, name, chunk_size=1000):
+        """Iterate over customers whose name contains name"""
+        return self._iter_rows(f"SELECT {CUSTOMER_COLUMNS} FROM customer WHERE CustomerName LIKE ?",
+                               (f"%{name}%",), chunk_size)
     
     def get_all_customers(self):
         """Get all customers"""
-        self.cur.execute("SELECT * FROM customer")
-        customers = self.cur.fetchall()
-        
-        result = []
-        for customer in customers:
-            result.append({
-                'account_number': customer[0],
-                'name': customer[1],
-                'address': customer[2],
-                'type': customer[3],
-                'discount': customer[4],
-                'usage': customer[5],
-                'all_time_usage': customer[6]
-            })
-        return result
+        return list(self.iter_customers())
+    
+    def _customer_filter(self, type=None, discount=None):
+        """Build the WHERE conditions for the customer list filters"""
+        conditions = []
+        values = []
+        if type:
+            conditions.append("Type = ?")
+            values.append(type)
+        if discount:
+            conditions.append("Discount = ?")
+            values.append(discount)
+        return conditions, values
+    
+    def get_customers_page(self, sort='AccountNumber', descending=False, after=None, limit=200,
+                           type=None, discount=None):
+        """Get one page of customers, sorted and filtered in SQL
+        
+        after is the (sort value, account number) of the last customer on the
+        previous page; passing it back continues the listing from there.
+        """
+        query, values = self._customers_page_query(sort, descending, after, limit, type, discount)
+        cur = self.pool.reader().execute(query, values)
+        return list(map(Customer._make, cur.fetchall()))
+    
+    def _customers_page_query(self, sort, descending, after, limit, type, discount):
+        """The SQL and parameters for one page of get_customers_page"""
+        if sort not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort customers by {sort}")
+        if (sort == 'Type' and type) or (sort == 'Discount' and discount):
+            # Every row has the same value there, so the list is in account order
+            sort = 'AccountNumber'
+        
+        conditions, values = self._customer_filter(type, discount)
+        op = "<" if descending else ">"
+        direction = "DESC" if descending else "ASC"
+        if after is not None:
+            if sort == 'AccountNumber':
+                conditions.append(f"AccountNumber {op} ?")
+                values.append(after[1])
+            else:
+                conditions.append(f"({sort}, AccountNumber) {op} (?, ?)")
+                values.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = f"AccountNumber {direction}" if sort == 'AccountNumber' else f"{sort} {direction}, AccountNumber {direction}"
+        return f"SELECT {CUSTOMER_COLUMNS} FROM customer {where} ORDER BY {order} LIMIT ?", values + [limit]
+    
+    def count_customers(self, type=None, discount=None):
+        """Count customers matching the customer list filters"""
+        conditions, values = self._customer_filter(type, discount)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cur = self.pool.reader().execute(f"SELECT COUNT(*) FROM customer {where}", values)
+        return cur.fetchone()[0]
+    
+    def split_account_numbers(self, parts):
+        """Account numbers splitting the customers into parts ranges of about equal size, lowest first
+        
+        Each range starts at its account number and ends before the next one.
+        Fewer are returned when there are fewer customers than parts.
+        """
+        count = self.count_customers()
+        reader = self.pool.reader()
+        bounds = []
+        for part in range(parts):
+            row = reader.execute("SELECT AccountNumber FROM customer ORDER BY AccountNumber LIMIT 1 OFFSET ?",
+                                 (count * part // parts,)).fetchone()
+            if row and (not bounds or row[0] > bounds[-1]):
+                bounds.append(row[0])
+        return bounds
     
     def update_customer(self, account_number, **kwargs):
         """Update customer information"""
@@ -124,8 +837,9 @@ class data_handler:
         query = f"UPDATE customer SET {', '.join(updates)} WHERE AccountNumber = ?"
         
         try:
-            self.cur.execute(query, values)
-            self.con.commit()
+            with self.pool.writer() as cur:
+                cur.execute(query, values)
+            self.invalidate([account_number])
             return True
         except sqlite3.Error as e:
             print(f"Error updating account: {e}")
@@ -134,31 +848,546 @@ class data_handler:
     def delete_account(self, account_number):
         """Delete a customer account"""
         try:
-            self.cur.execute("DELETE FROM customer WHERE AccountNumber = ?", (account_number,))
-            self.con.commit()
-            return self.cur.rowcount > 0
+            with self.pool.writer() as cur:
+                cur.execute("DELETE FROM customer WHERE AccountNumber = ?", (account_number,))
+            self.invalidate([account_number])
+            return cur.rowcount > 0
         except sqlite3.Error as e:
             print(f"Error deleting account: {e}")
             return False
     
     def search_customers(self, name):
         """Search customers by name"""
-        self.cur.execute("SELECT * FROM customer WHERE CustomerName LIKE ?", (f"%{name}%",))
-        customers = self.cur.fetchall()
-        
-        result = []
-        for customer in customers:
-            result.append({
-                'account_number': customer[0],
-                'name': customer[1],
-                'address': customer[2],
-                'type': customer[3],
-                'discount': customer[4],
-                'usage': customer[5],
-                'all_time_usage': customer[6]
-            })
-        return result
+        return list(self.iter_search(name))
+    
+    def find_customers(self, text, limit=200, type=None, discount=None):
+        """Search customers by name or address, best matches first
+        
+        Every word must match, and each word also matches as a prefix, so
+        "mar san" finds "Maria Santos". Falls back to a LIKE scan when SQLite
+        was built without FTS5.
+        """
+        words = re.findall(r"\w+", text)
+        if not words:
+            return []
+        conditions, values = self._customer_filter(type, discount)
+        
+        if self.fts_enabled:
+            query = " ".join(f'"{word}"*' for word in words)
+            where = " AND ".join(["customer_fts MATCH ?"] + [f"c.{condition}" for condition in conditions])
+            # Name matches weigh more than address matches
+            cur = self.pool.reader().execute(f"""
+                SELECT c.AccountNumber, c.CustomerName, c.Address, c.Type, c.Discount, c.Usage, c.AllTimeUsage
+                FROM customer_fts JOIN customer c ON c.AccountNumber = customer_fts.rowid
+                WHERE {where}
+                ORDER BY bm25(customer_fts, 10.0, 1.0)
+                LIMIT ?
+            """, [query] + values + [limit])
+        else:
+            for word in words:
+                conditions.append("(CustomerName LIKE ? OR Address LIKE ?)")
+                values.extend([f"%{word}%", f"%{word}%"])
+            cur = self.pool.reader().execute(
+                f"SELECT {CUSTOMER_COLUMNS} FROM customer WHERE {' AND '.join(conditions)} LIMIT ?", values + [limit])
+        return list(map(Customer._make, cur.fetchall()))
+    
+    def record_bill(self, account_number, bill_info, format, path, file_size=None, generated_at=None,
+                    location=None):
+        """Record a saved bill in the bill history
+        
+        location is the (segment, offset, length) of a bill stored in the
+        archive; without it path is the bill's own file.
+        """
+        generated_at = generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            with self.pool.writer() as cur:
+                cur.execute("""
+                    INSERT INTO bill (AccountNumber, GeneratedAt, KwhUsed, Subtotal, DiscountAmount, 
+                                      Vat, TotalAmountDue, Format, Path, FileSize, Segment, Offset, Length)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, self._bill_row(account_number, generated_at, bill_info, format, path, file_size, location))
+            return cur.lastrowid
+        except sqlite3.Error as e:
+            print(f"Error recording bill: {e}")
+            return None
+    
+    def record_bills(self, bills, generated_at=None):
+        """Record many saved bills in one transaction
+        
+        bills is a list of (account_number, bill_info, format, path, file_size),
+        with the archive (segment, offset, length) as a sixth item for
+        archived bills.
+        """
+        generated_at = generated_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            with self.pool.writer() as cur:
+                cur.executemany("""
+                    INSERT INTO bill (AccountNumber, GeneratedAt, KwhUsed, Subtotal, DiscountAmount, 
+                                      Vat, TotalAmountDue, Format, Path, FileSize, Segment, Offset, Length)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, [self._bill_row(account_number, generated_at, bill_info, format, path, file_size,
+                                     location[0] if location else None)
+                      for account_number, bill_info, format, path, file_size, *location in bills])
+            return True
+        except sqlite3.Error as e:
+            print(f"Error recording bills: {e}")
+            return False
+    
+    def _bill_row(self, account_number, generated_at, bill_info, format, path, file_size, location=None):
+        """Flatten a bill into the column order used by the bill table"""
+        bill_info = bill_info or {}
+        segment, offset, length = location or (None, None, None)
+        return (account_number, generated_at, bill_info.get('kwh_used'), bill_info.get('subtotal'),
+                bill_info.get('discount_amount'), bill_info.get('vat'), bill_info.get('total_amount_due'),
+                format, path, file_size, segment, offset, length)
+    
+    def get_bills(self, limit=200, after=None, account_number=None):
+        """Get saved bills newest first, one page at a time
+        
+        after is the (generated_at, bill_id) of the last bill on the previous
+        page; passing it back continues the listing from there (keyset paging).
+        """
+        conditions = []
+        values = []
+        if account_number is not None:
+            conditions.append("AccountNumber = ?")
+            values.append(account_number)
+        if after is not None:
+            conditions.append("(GeneratedAt, BillId) < (?, ?)")
+            values.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        cur = self.pool.reader().execute(f"""
+            SELECT BillId, AccountNumber, GeneratedAt, KwhUsed, TotalAmountDue, Format, Path, FileSize, 
+                   Segment, Offset, Length
+            FROM bill {where}
+            ORDER BY GeneratedAt DESC, BillId DESC
+            LIMIT ?
+        """, values + [limit])
+        return [self._bill_dict(bill) for bill in cur.fetchall()]
+    
+    def _bill_dict(self, bill):
+        """Turn a bill history row into a dict"""
+        return {
+            'bill_id': bill[0],
+            'account_number': bill[1],
+            'generated_at': bill[2],
+            'kwh_used': bill[3],
+            'total_amount_due': bill[4],
+            'format': bill[5],
+            'path': bill[6],
+            'file_size': bill[7],
+            'location': (bill[8], bill[9], bill[10]) if bill[8] is not None else None
+        }
+    
+    def get_month_bills(self, month):
+        """Get every bill generated in a month (YYYY-MM) or archived in its segments, for compaction"""
+        cur = self.pool.reader().execute("""
+            SELECT BillId, AccountNumber, GeneratedAt, KwhUsed, TotalAmountDue, Format, Path, FileSize, 
+                   Segment, Offset, Length
+            FROM bill 
+            WHERE (GeneratedAt >= ?1 AND GeneratedAt < ?2) OR (Segment >= ?1 AND Segment < ?2)
+            ORDER BY GeneratedAt, BillId
+        """, (month, month + "~"))
+        return [self._bill_dict(bill) for bill in cur.fetchall()]
+    
+    def get_bill_months(self):
+        """Get every month (YYYY-MM) that has saved bills"""
+        cur = self.pool.reader().execute("SELECT DISTINCT substr(GeneratedAt, 1, 7) FROM bill ORDER BY 1")
+        return [month for month, in cur.fetchall()]
+    
+    def relocate_bills(self, moves):
+        """Point bills at new archive locations: moves is a list of (bill_id, path, (segment, offset, length))"""
+        try:
+            with self.pool.writer() as cur:
+                cur.executemany("""
+                    UPDATE bill SET Path = ?, Segment = ?, Offset = ?, Length = ? WHERE BillId = ?
+                """, [(path, segment, offset, length, bill_id)
+                      for bill_id, path, (segment, offset, length) in moves])
+            return True
+        except sqlite3.Error as e:
+            print(f"Error relocating bills: {e}")
+            return False
+    
+    def count_bills(self, account_number=None):
+        """Count saved bills, optionally for one account"""
+        if account_number is None:
+            cur = self.pool.reader().execute("SELECT COUNT(*) FROM bill")
+        else:
+            cur = self.pool.reader().execute("SELECT COUNT(*) FROM bill WHERE AccountNumber = ?", (account_number,))
+        return cur.fetchone()[0]
+    
+    def _scan_bill_files(self, bills_dir):
+        """(account, generated_at, format, path, size) rows for the bill files in bills_dir"""
+        rows = []
+        with os.scandir(bills_dir) as entries:
+            for entry in entries:
+                # Filenames look like bill_<account>_<YYYYmmdd>_<HHMMSS>.<ext>
+                parts = entry.name.split('.')[0].split('_')
+                if not entry.is_file() or len(parts) < 2 or parts[0] != 'bill' or not parts[1].isdigit():
+                    continue
+                stat = entry.stat()
+                generated_at = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+                rows.append((int(parts[1]), generated_at, entry.name.split('.')[-1].upper(),
+                             entry.path, stat.st_size))
+        return rows
+    
+    def import_bill_files(self, bills_dir):
+        """Backfill the bill history from bill files saved before it existed"""
+        rows = self._scan_bill_files(bills_dir)
+        try:
+            with self.pool.writer() as cur:
+                cur.executemany("""
+                    INSERT INTO bill (AccountNumber, GeneratedAt, Format, Path, FileSize)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Error importing bill files: {e}")
+            return 0
+    
+    def import_legacy_bills(self, bills_dir):
+        """Import the bill files in bills_dir into the bill history, once per database
+        
+        Files already in the history (saved after it existed) are skipped.
+        Returns how many were imported; 0 once the import has been done.
+        """
+        cur = self.pool.reader().execute("SELECT 1 FROM app_state WHERE Key = 'legacy_bills_imported'")
+        if cur.fetchone():
+            return 0
+        rows = self._scan_bill_files(bills_dir) if os.path.isdir(bills_dir) else []
+        try:
+            with self.pool.writer() as cur:
+                cur.execute("SELECT 1 FROM app_state WHERE Key = 'legacy_bills_imported'")
+                if cur.fetchone():
+                    return 0
+                cur.execute("SELECT Path FROM bill")
+                recorded = {os.path.basename(path) for path, in cur.fetchall()}
+                rows = [row for row in rows if os.path.basename(row[3]) not in recorded]
+                cur.executemany("""
+                    INSERT INTO bill (AccountNumber, GeneratedAt, Format, Path, FileSize)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
+                cur.execute("INSERT INTO app_state (Key, Value) VALUES ('legacy_bills_imported', datetime('now'))")
+            return len(rows)
+        except sqlite3.Error as e:
+            print(f"Error importing bill files: {e}")
+            return 0
+    
+    def _rebuild_revenue_summary(self, cur):
+        """Recompute the revenue summary from the ledger inside the caller's transaction"""
+        cur.execute("DELETE FROM revenue_summary")
+        cur.execute("""
+            INSERT INTO revenue_summary (Period, CustomerType, DiscountType, Bills, KwhUsed, 
+                                         Subtotal, DiscountAmount, Vat, TotalAmountDue)
+            SELECT Period, COALESCE(CustomerType, ''), COALESCE(DiscountType, 'None'), COUNT(*), 
+                   SUM(KwhUsed), TOTAL(Subtotal), TOTAL(DiscountAmount), TOTAL(Vat), TOTAL(TotalAmountDue)
+            FROM posted_bill 
+            GROUP BY 1, 2, 3
+        """)
+    
+    def rebuild_revenue_summary(self):
+        """Recompute the revenue summary from every posted bill"""
+        try:
+            with self.pool.writer() as cur:
+                self._rebuild_revenue_summary(cur)
+            return True
+        except sqlite3.Error as e:
+            print(f"Error rebuilding revenue summary: {e}")
+            return False
+    
+    def get_revenue_summary(self, group_by=('month',), period_from=None, period_to=None):
+        """Get bill counts, kWh and revenue totals grouped by month, quarter, year, type or discount
+        
+        group_by is a sequence of REPORT_GROUPS keys; period_from and
+        period_to (YYYY-MM, inclusive) limit the months covered. Reads only
+        the summary table, so the cost does not grow with the number of bills.
+        """
+        for key in group_by:
+            if key not in REPORT_GROUPS:
+                raise ValueError(f"Cannot group revenue by {key!r}")
+        conditions = []
+        values = []
+        if period_from:
+            conditions.append("Period >= ?")
+            values.append(period_from)
+        if period_to:
+            conditions.append("Period <= ?")
+            values.append(period_to)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        columns = "".join(f"{REPORT_GROUPS[key]} AS {key}, " for key in group_by)
+        positions = ", ".join(str(i + 1) for i in range(len(group_by)))
+        grouping = f"GROUP BY {positions} ORDER BY {positions}" if group_by else ""
+        cur = self.pool.reader().execute(f"""
+            SELECT {columns}SUM(Bills), SUM(KwhUsed), SUM(Subtotal), SUM(DiscountAmount), 
+                   SUM(Vat), SUM(TotalAmountDue)
+            FROM revenue_summary {where} {grouping}
+        """, values)
+        fields = list(group_by) + ['bills', 'kwh_used', 'subtotal', 'discount_amount', 'vat', 'total_amount_due']
+        # An ungrouped query over no bills still returns one row of NULLs
+        return [dict(zip(fields, row)) for row in cur.fetchall() if row[len(group_by)]]
+    
+    def get_tariffs(self):
+        """Get every stored tariff definition, oldest version first"""
+        cur = self.pool.reader().execute(
+            "SELECT Definition FROM tariff ORDER BY CustomerType, EffectiveFrom")
+        return [json.loads(definition) for definition, in cur.fetchall()]
+    
+    def get_tariff_book(self, default=None):
+        """Every stored tariff version compiled into a TariffBook, built once and then reused"""
+        if self.check_data_version:
+            data_version = self.pool.data_version()
+            if data_version != self._tariff_data_version:
+                self._tariff_book = None
+                self._tariff_data_version = data_version
+        book = self._tariff_book
+        if book is None or book.default is not default:
+            book = self._tariff_book = TariffBook(self.get_tariffs(), default)
+        return book
+    
+    def save_tariffs(self, definitions):
+        """Add tariff definitions, replacing any with the same customer type and effective date"""
+        try:
+            with self.pool.writer() as cur:
+                cur.executemany("""
+                    INSERT OR REPLACE INTO tariff (CustomerType, EffectiveFrom, Definition)
+                    VALUES (?, ?, ?)
+                """, [(definition.get('customer_type', '*'), definition.get('effective_from', '0000-01-01'),
+                       json.dumps(definition)) for definition in definitions])
+            self._tariff_book = None
+            return True
+        except sqlite3.Error as e:
+            print(f"Error saving tariffs: {e}")
+            return False
+    
+    def ingest_readings(self, readings, batch_size=100000):
+        """Store (account_number, reading_date, reading) register readings, batch_size per transaction
+        
+        readings is any iterable, read as it goes. A reading for an account and
+        date already stored replaces it, and readings for unknown accounts are
+        skipped. Before each transaction commits, consumption is re-derived
+        from the earliest reading it adds for an account onwards. Returns
+        (stored, skipped), or None if a transaction failed (earlier ones stay
+        committed).
+        """
+        stored = 0
+        skipped = 0
+        batch = []
+        try:
+            for reading in readings:
+                batch.append(reading)
+                if len(batch) >= batch_size:
+                    added = self._ingest_batch(batch)
+                    stored += added
+                    skipped += len(batch) - added
+                    batch = []
+            if batch:
+                added = self._ingest_batch(batch)
+                stored += added
+                skipped += len(batch) - added
+            return stored, skipped
+        except sqlite3.Error as e:
+            print(f"Error ingesting meter readings: {e}")
+            return None
+    
+    def _ingest_batch(self, batch):
+        """Store one batch of readings and re-derive consumption in the same transaction"""
+        with self.pool.writer() as cur:
+            cur.executemany("""
+                INSERT INTO meter_reading (AccountNumber, ReadingDate, Reading)
+                SELECT ?1, ?2, ?3 WHERE EXISTS (SELECT 1 FROM customer WHERE AccountNumber = ?1)
+                ON CONFLICT (AccountNumber, ReadingDate) DO UPDATE SET Reading = excluded.Reading
+            """, batch)
+            added = cur.rowcount
+            # The earliest reading date of each account in the batch; readings before it keep their values
+            cur.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS reading_from(AccountNumber INTEGER PRIMARY KEY, FromDate TEXT)
+            """)
+            cur.execute("DELETE FROM temp.reading_from")
+            cur.executemany("""
+                INSERT INTO temp.reading_from VALUES (?, ?) 
+                ON CONFLICT (AccountNumber) DO UPDATE SET FromDate = MIN(FromDate, excluded.FromDate)
+            """, ((account_number, reading_date) for account_number, reading_date, _ in batch))
+            self._derive_consumption(cur)
+        return added
+    
+    def _derive_consumption(self, cur):
+        """Recompute Kwh and Total for the readings of each account in temp.reading_from from its FromDate on
+        
+        The first reading of an account is its baseline (0 kWh). A reading
+        lower than the one before means the meter was replaced or rolled
+        over, so the new register value is all consumption since then. The
+        window starts from the stored reading just before FromDate, so a batch
+        of new readings rewrites only those and any it was back-dated among.
+        """
+        cur.execute("""
+            UPDATE meter_reading SET Kwh = derived.Kwh, Total = derived.Total 
+            FROM (
+                SELECT AccountNumber, ReadingDate, Kwh, 
+                       ROUND(COALESCE(BaseTotal, 0.0) 
+                             + SUM(Kwh) OVER (PARTITION BY AccountNumber ORDER BY ReadingDate), 3) AS Total
+                FROM (
+                    SELECT AccountNumber, ReadingDate, BaseTotal, 
+                           CASE WHEN Previous IS NULL THEN 0.0 
+                                WHEN Reading >= Previous THEN ROUND(Reading - Previous, 3) 
+                                ELSE Reading END AS Kwh
+                    FROM (
+                        SELECT m.AccountNumber, m.ReadingDate, m.Reading, base.Total AS BaseTotal, 
+                               COALESCE(LAG(m.Reading) OVER (PARTITION BY m.AccountNumber ORDER BY m.ReadingDate), 
+                                        base.Reading) AS Previous
+                        FROM temp.reading_from r 
+                        JOIN meter_reading m 
+                          ON m.AccountNumber = r.AccountNumber AND m.ReadingDate >= r.FromDate 
+                        LEFT JOIN meter_reading base 
+                          ON base.AccountNumber = r.AccountNumber 
+                         AND base.ReadingDate = (SELECT MAX(ReadingDate) FROM meter_reading 
+                                                 WHERE AccountNumber = r.AccountNumber AND ReadingDate < r.FromDate)
+                    )
+                )
+            ) AS derived
+            WHERE meter_reading.AccountNumber = derived.AccountNumber 
+              AND meter_reading.ReadingDate = derived.ReadingDate
+        """)
+    
+    def get_readings(self, account_number, limit=200):
+        """Get an account's latest meter readings, newest first, with the kWh used since the one before"""
+        cur = self.pool.reader().execute("""
+            SELECT ReadingDate, Reading, Kwh, Total FROM meter_reading 
+            WHERE AccountNumber = ? ORDER BY ReadingDate DESC LIMIT ?
+        """, (account_number, limit))
+        return [{'reading_date': reading_date, 'reading': reading, 'kwh': kwh, 'total': total}
+                for reading_date, reading, kwh, total in cur.fetchall()]
+    
+    def get_metered_usage(self, account_number, period=None):
+        """Get an account's metered usage in a period (YYYY-MM) and all-time through its end
+        
+        Returns {'usage': ..., 'all_time_usage': ...}, or None when the account
+        has no reading before the end of the period.
+        """
+        start, end = _period_bounds(period)
+        reader = self.pool.reader()
+        row = reader.execute(_TOTAL_BEFORE, (account_number, end)).fetchone()
+        if row is None:
+            return None
+        before = reader.execute(_TOTAL_BEFORE, (account_number, start)).fetchone()
+        return {'usage': row[0] - (before[0] if before else 0.0), 'all_time_usage': row[0]}
+    
+    def iter_metered_usage(self, period=None, chunk_size=1000):
+        """Iterate over (account_number, usage, all_time_usage) for every metered account, by account number"""
+        start, end = _period_bounds(period)
+        # Two primary-key seeks per account, however long its reading history
+        cur = self.pool.reader().execute("""
+            SELECT AccountNumber, EndTotal - COALESCE(StartTotal, 0.0), EndTotal 
+            FROM (
+                SELECT c.AccountNumber, 
+                       (SELECT Total FROM meter_reading m 
+                        WHERE m.AccountNumber = c.AccountNumber AND m.ReadingDate < :end 
+                        ORDER BY m.ReadingDate DESC LIMIT 1) AS EndTotal, 
+                       (SELECT Total FROM meter_reading m 
+                        WHERE m.AccountNumber = c.AccountNumber AND m.ReadingDate < :start 
+                        ORDER BY m.ReadingDate DESC LIMIT 1) AS StartTotal
+                FROM customer c
+            )
+            WHERE EndTotal IS NOT NULL 
+            ORDER BY AccountNumber
+        """, {'start': start, 'end': end})
+        try:
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cur.close()
+    
+    def get_export_watermark(self, name):
+        """Get (customer change seq, posted bill id) an export target last completed at, or None"""
+        cur = self.pool.reader().execute(
+            "SELECT CustomerSeq, PostedBillId FROM export_watermark WHERE Name = ?", (name,))
+        row = cur.fetchone()
+        return tuple(row) if row and row[0] is not None else None
+    
+    def open_export_watermark(self, name):
+        """Register an export target so customer changes are logged for it from now on"""
+        try:
+            with self.pool.writer() as cur:
+                cur.execute("INSERT OR IGNORE INTO export_watermark (Name) VALUES (?)", (name,))
+            return True
+        except sqlite3.Error as e:
+            print(f"Error registering export: {e}")
+            return False
+    
+    def set_export_watermark(self, name, customer_seq, posted_bill_id):
+        """Record that an export target now holds every change up to these marks"""
+        try:
+            with self.pool.writer() as cur:
+                cur.execute("""
+                    INSERT INTO export_watermark (Name, CustomerSeq, PostedBillId, ExportedAt)
+                    VALUES (?, ?, ?, datetime('now'))
+                    ON CONFLICT(Name) DO UPDATE SET 
+                        CustomerSeq = excluded.CustomerSeq, 
+                        PostedBillId = excluded.PostedBillId, 
+                        ExportedAt = excluded.ExportedAt
+                """, (name, customer_seq, posted_bill_id))
+            return True
+        except sqlite3.Error as e:
+            print(f"Error saving export watermark: {e}")
+            return False
+    
+    def get_export_marks(self):
+        """Get the current (customer change seq, posted bill id), the marks an export runs up to"""
+        cur = self.pool.reader().execute("""
+            SELECT (SELECT COALESCE(MAX(Seq), 0) FROM customer_change), 
+                   (SELECT COALESCE(MAX(PostedBillId), 0) FROM posted_bill)
+        """)
+        return tuple(cur.fetchone())
+    
+    def _iter_chunks(self, query, values=(), chunk_size=10000):
+        """Stream a query as lists of up to chunk_size plain row tuples"""
+        cur = self.pool.reader().execute(query, values)
+        try:
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+    
+    def iter_customer_chunks(self, since=None, until=None, chunk_size=10000):
+        """Stream customer rows in chunks: all of them, or those changed after change seq since up to until"""
+        if since is None:
+            return self._iter_chunks(f"SELECT {CUSTOMER_COLUMNS} FROM customer ORDER BY AccountNumber",
+                                     chunk_size=chunk_size)
+        columns = ", ".join(f"c.{column}" for column in CUSTOMER_COLUMNS.split(", "))
+        return self._iter_chunks(f"""
+            SELECT {columns} 
+            FROM customer_change ch JOIN customer c ON c.AccountNumber = ch.AccountNumber
+            WHERE ch.Seq > ? AND ch.Seq <= ? AND ch.Deleted = 0
+            ORDER BY ch.Seq
+        """, (since, until), chunk_size)
+    
+    def iter_deleted_customer_chunks(self, since, until, chunk_size=10000):
+        """Stream (AccountNumber,) rows of customers deleted after change seq since up to until"""
+        return self._iter_chunks("""
+            SELECT AccountNumber FROM customer_change 
+            WHERE Seq > ? AND Seq <= ? AND Deleted = 1
+            ORDER BY Seq
+        """, (since, until), chunk_size)
+    
+    def iter_ledger_chunks(self, after=0, through=None, chunk_size=10000):
+        """Stream posted_bill rows with PostedBillId after after, up to through, in chunks"""
+        return self._iter_chunks(f"""
+            SELECT {LEDGER_COLUMNS} FROM posted_bill 
+            WHERE PostedBillId > ? AND PostedBillId <= ? 
+            ORDER BY PostedBillId
+        """, (after, through if through is not None else self.get_export_marks()[1]), chunk_size)
+    
+    def interrupt(self):
+        """Abort the queries currently running on this handler's connections (safe from any thread)"""
+        self.pool.interrupt()
     
     def close(self):
-        """Close database connection"""
-        self.con.close()
+        """Close database connections"""
+        self.pool.close()
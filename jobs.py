@@ -0,0 +1,164 @@
+import queue
+import threading
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled"""
+
+class Job:
+    """A unit of background work plus the callbacks that receive its outcome"""
+    def __init__(self, runner, fn, args, on_done, on_error, on_progress, description, on_finish=None):
+        self.runner = runner
+        self.fn = fn
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.description = description
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stop the job; after this only its on_finish callback is called"""
+        if not self._cancelled.is_set():
+            self._cancelled.set()
+            self.runner._interrupt(self)
+
+    def check(self):
+        """Raise JobCancelled if the job was cancelled (call between steps of long jobs)"""
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def progress(self, done, total=None, message=""):
+        """Report progress to the UI thread; also a cancellation point"""
+        self.check()
+        self.runner._results.put((self, 'progress', (done, total, message)))
+
+class JobRunner:
+    """Run blocking work on one background thread and hand results back to Tk
+
+    Jobs run one at a time, in submission order, as fn(job, context, *args),
+    where context is whatever setup() returned on the worker thread (for the
+    app, a database connection owned by that thread). Results, errors and
+    progress are queued and delivered on the Tk thread by polling with
+    root.after, so callbacks may touch widgets freely. on_finish(job) is
+    called last however the job ends, cancelled included, so UI state set
+    up for the job can always be reset there.
+    """
+    def __init__(self, root, setup=None, teardown=None, poll_ms=50, on_busy=None, on_progress=None):
+        self.root = root
+        self.setup = setup
+        self.teardown = teardown
+        self.poll_ms = poll_ms
+        # on_busy(job_or_None) is called on the Tk thread when the running job changes
+        self.on_busy = on_busy
+        # Default progress callback for jobs submitted without one
+        self.on_progress = on_progress
+        self.context = None
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._pending = set()
+        self._current = None
+        self._polling = False
+        self._thread = threading.Thread(target=self._work, name="job-runner", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, on_done=None, on_error=None, on_progress=None, on_finish=None, description=""):
+        """Queue fn to run in the background and return its Job"""
+        job = Job(self, fn, args, on_done, on_error, on_progress or self.on_progress, description, on_finish)
+        self._pending.add(job)
+        self._jobs.put(job)
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return job
+
+    def cancel_all(self):
+        """Cancel every queued and running job"""
+        for job in list(self._pending):
+            job.cancel()
+
+    def busy(self):
+        return bool(self._pending)
+
+    def shutdown(self):
+        """Cancel outstanding work and stop the worker thread"""
+        self.cancel_all()
+        self._jobs.put(None)
+        self._thread.join(timeout=2)
+
+    def _interrupt(self, job):
+        # Abort a long SQLite statement if the cancelled job is the one running
+        if job is self._current and hasattr(self.context, 'interrupt'):
+            self.context.interrupt()
+
+    def _work(self):
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                if job.cancelled:
+                    self._results.put((job, 'cancelled', None))
+                    continue
+                if self.setup and self.context is None:
+                    # Deferred until the first job so startup does not pay for it
+                    try:
+                        self.context = self.setup()
+                    except Exception as e:
+                        self._results.put((job, 'error', e))
+                        continue
+                self._current = job
+                self._results.put((job, 'started', None))
+                try:
+                    result = job.fn(job, self.context, *job.args)
+                    self._results.put((job, 'done', result))
+                except JobCancelled:
+                    self._results.put((job, 'cancelled', None))
+                except Exception as e:
+                    self._results.put((job, 'cancelled' if job.cancelled else 'error', e))
+                finally:
+                    self._current = None
+        finally:
+            if self.teardown and self.context is not None:
+                self.teardown(self.context)
+
+    def _poll(self):
+        while True:
+            try:
+                job, kind, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'started':
+                if self.on_busy and not job.cancelled:
+                    self.on_busy(job)
+                continue
+            if kind == 'progress':
+                if job.on_progress and not job.cancelled:
+                    job.on_progress(*value)
+                continue
+
+            self._pending.discard(job)
+            if self.on_busy:
+                self.on_busy(None)
+            try:
+                if job.cancelled or kind == 'cancelled':
+                    continue
+                if kind == 'done' and job.on_done:
+                    job.on_done(value)
+                elif kind == 'error':
+                    if job.on_error:
+                        job.on_error(value)
+                    else:
+                        print(f"Error in background job {job.description or job.fn.__name__}: {value}")
+            finally:
+                if job.on_finish:
+                    job.on_finish(job)
+
+        if self._pending:
+            self.root.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
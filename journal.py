@@ -0,0 +1,117 @@
+"""Operation journal: every clerk action with its inputs and timing
+
+When BILLING_JOURNAL names a file, each workflow in workflows.py appends one
+JSON line per call:
+
+    {"at": "2026-10-18T09:15:02.417", "offset": 12.503, "action": "generate_bill",
+     "inputs": {"account_number": "100123", "kwh_used": "150"}, "ms": 4.21, "ok": true}
+
+offset is seconds since the journal was opened, so a session can be replayed
+with its original pacing (see benchmarks/replay.py). Inputs are recorded as
+typed, including ones that fail validation. Without BILLING_JOURNAL the
+workflows are not wrapped at all.
+
+    BILLING_JOURNAL=session.jsonl python main.py
+"""
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+JOURNAL_FILE = os.environ.get("BILLING_JOURNAL")
+
+# Workflow arguments that are plumbing rather than user input
+NOT_RECORDED = ('db', 'check')
+
+class Journal:
+    """Append-only JSONL file of actions, safe to share between threads"""
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def record(self, action, inputs, seconds, error=None):
+        entry = {
+            'at': datetime.now().isoformat(timespec='milliseconds'),
+            'offset': round(time.perf_counter() - self._started - seconds, 3),
+            'action': action,
+            'inputs': inputs,
+            'ms': round(seconds * 1000, 3),
+            'ok': error is None
+        }
+        if error is not None:
+            entry['error'] = str(error)
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            # One line per action reaches the disk even if the app is killed
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+_journal = None
+_stopped = False
+_open_lock = threading.Lock()
+
+def open_journal(path=JOURNAL_FILE):
+    """The process-wide journal, opened on first use; None when journaling is off"""
+    global _journal
+    with _open_lock:
+        if _journal is None and path and not _stopped:
+            try:
+                _journal = Journal(path)
+            except OSError as e:
+                print(f"✗ Could not open operation journal: {e}")
+        return _journal
+
+def stop():
+    """Stop journaling in this process (the replayer must not journal its own replay)"""
+    global _journal, _stopped
+    with _open_lock:
+        if _journal is not None:
+            _journal.close()
+        _journal = None
+        _stopped = True
+
+def recorded(action):
+    """Decorator journaling each call of a workflow as action (the function itself when off)"""
+    def decorate(fn):
+        if not JOURNAL_FILE:
+            return fn
+        import inspect
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def journaled(*args, **kwargs):
+            journal = open_journal()
+            if journal is None:
+                return fn(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            inputs = {name: value for name, value in bound.arguments.items() if name not in NOT_RECORDED}
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                journal.record(action, inputs, time.perf_counter() - started, e)
+                raise
+            journal.record(action, inputs, time.perf_counter() - started)
+            return result
+        return journaled
+    return decorate
+
+def read_journal(path):
+    """Yield the entries of a journal file, skipping lines that are not valid JSON"""
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"✗ Skipping unreadable journal line {number}")
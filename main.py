@@ -3,56 +3,19 @@ from tkinter import ttk, messagebox, scrolledtext, filedialog
 import database_handler
 import os
 from datetime import datetime
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.units import inch
 import sys
+from billing import compute_bill  # noqa: F401 (still importable from main, as before billing.py)
+from bill_renderer import render_bill, render_saved_bill
+from jobs import JobRunner
+import metrics
+import workflows
+from workflows import WorkflowError
 
-def compute_bill(kwh_used, discount_type="None"):
-    """Compute bill with discount"""
-    if kwh_used <= 50:
-        rate = 5.00
-    elif kwh_used <= 100:
-        rate = 6.50
-    elif kwh_used <= 200:
-        rate = 8.00
-    else:
-        rate = 10.00
-    
-    base_charge = kwh_used * rate
-    environmental_fee = 50.00
-    subtotal = base_charge + environmental_fee
-    
-    discount_rates = {
-        "None": 0.0,
-        "Senior Citizen": 0.05,
-        "PWD": 0.05,
-        "Low-income": 0.10
-    }
-    
-    discount_rate = discount_rates.get(discount_type, 0.0)
-    discount_amount = subtotal * discount_rate
-    subtotal_after_discount = subtotal - discount_amount
-    
-    vat = subtotal_after_discount * 0.12
-    total_amount_due = subtotal_after_discount + vat
-    
-    return {
-        'kwh_used': kwh_used,
-        'rate': rate,
-        'base_charge': base_charge,
-        'environmental_fee': environmental_fee,
-        'subtotal': subtotal,
-        'discount_type': discount_type,
-        'discount_rate': discount_rate,
-        'discount_amount': discount_amount,
-        'subtotal_after_discount': subtotal_after_discount,
-        'vat': vat,
-        'total_amount_due': total_amount_due
-    }
+# Screen-building methods, timed when metrics are on (see metrics.py)
+SCREENS = ("create_main_menu", "show_create_account", "show_get_customer_info", "show_bill_customer",
+           "show_previous_bills", "show_all_customers", "show_reports")
 
+@metrics.instrumented("screen", include=SCREENS)
 class ElectricityBillingApp:
     def __init__(self, root):
         self.root = root
@@ -61,8 +24,9 @@ class ElectricityBillingApp:
         self.root.minsize(900, 600)
         self.root.resizable(True, True)
         
-        # Initialize database
-        self.db = database_handler.data_handler("customer.db")
+        # The database is opened on first use so the window draws immediately
+        self._db = None
+        self._archive = None
         
         # Create bills directory if it doesn't exist
         self.bills_dir = "bills"
@@ -79,8 +43,26 @@ class ElectricityBillingApp:
         
         # Create main container
         self.create_header()
+        
+        # Database and PDF work runs on a background thread with its own connection.
+        # Both handlers cache customers, so each drops its cache when the other writes.
+        self.jobs = JobRunner(
+            self.root,
+            setup=lambda: database_handler.data_handler("customer.db", check_data_version=True),
+            teardown=lambda db: db.close(),
+            on_busy=self.show_busy,
+            on_progress=self.show_progress
+        )
+        
         self.create_main_menu()
         
+    @property
+    def db(self):
+        """Database handle for the Tk thread, opened on first use"""
+        if self._db is None:
+            self._db = database_handler.data_handler("customer.db", check_data_version=True)
+        return self._db
+    
     def create_header(self):
         """Create header section"""
         header_frame = tk.Frame(self.root, bg=self.primary_color, height=80)
@@ -96,6 +78,58 @@ class ElectricityBillingApp:
         )
         title_label.pack(pady=20)
         
+        # Activity indicator for background jobs, hidden while idle
+        self.status_frame = tk.Frame(header_frame, bg=self.primary_color)
+        self.status_label = tk.Label(
+            self.status_frame,
+            font=("Arial", 9),
+            bg=self.primary_color,
+            fg="white"
+        )
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        self.progress_bar = ttk.Progressbar(self.status_frame, length=120, mode="indeterminate")
+        self.progress_bar.pack(side=tk.LEFT, padx=5)
+        tk.Button(
+            self.status_frame,
+            text="Cancel",
+            font=("Arial", 9),
+            bg="#e74c3c",
+            fg="white",
+            cursor="hand2",
+            command=self.cancel_jobs,
+            relief=tk.FLAT,
+            padx=8
+        ).pack(side=tk.LEFT, padx=5)
+    
+    def show_busy(self, job):
+        """Show or hide the activity indicator for the running background job"""
+        if job is None:
+            self.progress_bar.stop()
+            self.status_frame.place_forget()
+            return
+        self.status_label.config(text=job.description or "Working...")
+        self.progress_bar.config(mode="indeterminate", value=0)
+        self.progress_bar.start(15)
+        self.status_frame.place(relx=1.0, rely=1.0, anchor=tk.SE, x=-10, y=-5)
+    
+    def show_progress(self, done, total, message=""):
+        """Switch the activity indicator to a determinate bar"""
+        self.progress_bar.stop()
+        self.progress_bar.config(mode="determinate", maximum=total or 1, value=done)
+        if message:
+            self.status_label.config(text=message)
+    
+    def cancel_jobs(self):
+        """Cancel all background work"""
+        self.jobs.cancel_all()
+        self.show_busy(None)
+    
+    def show_job_error(self, title):
+        """Build an on_error callback that reports a failed background job"""
+        def on_error(error):
+            messagebox.showerror("Error", f"{title}:\n{error}")
+        return on_error
+        
     def create_main_menu(self):
         """Create main menu with buttons"""
         # Clear previous content
@@ -103,7 +137,7 @@ class ElectricityBillingApp:
             widget.destroy()
             
         menu_frame = tk.Frame(self.root, bg=self.bg_color)
-        menu_frame.pack(expand=True, fill=tk.BOTH, padx=50, pady=50)
+        menu_frame.pack(expand=True, fill=tk.BOTH, padx=50, pady=30)
         
         buttons_info = [
             ("➕ Create New Account", self.show_create_account, self.accent_color),
@@ -111,6 +145,7 @@ class ElectricityBillingApp:
             ("💰 Bill Customer", self.show_bill_customer, self.secondary_color),
             ("📋 List All Customers", self.show_all_customers, self.secondary_color),
             ("📄 Load Previous Bills", self.show_previous_bills, self.secondary_color),
+            ("📊 Reports", self.show_reports, self.secondary_color),
             ("❌ Exit", self.exit_app, "#e74c3c")
         ]
         
@@ -127,7 +162,7 @@ class ElectricityBillingApp:
                 command=command,
                 relief=tk.FLAT
             )
-            btn.pack(pady=10)
+            btn.pack(pady=8)
     
     def create_back_button(self, parent):
         """Create back button"""
@@ -198,15 +233,13 @@ class ElectricityBillingApp:
         # Submit button
         def submit_account():
             name = name_entry.get().strip()
-            address = address_entry.get().strip()
-            cust_type = type_var.get()
-            discount = discount_var.get()
-            
-            if not name or not address:
-                messagebox.showerror("Error", "Please fill in all fields!")
+            try:
+                account_number = workflows.create_account(
+                    self.db, name, address_entry.get(), type_var.get(), discount_var.get())
+            except WorkflowError as e:
+                messagebox.showerror("Error", str(e))
                 return
             
-            account_number = self.db.create_account(name, address, cust_type, discount)
             if account_number:
                 messagebox.showinfo(
                     "Success",
@@ -265,13 +298,12 @@ class ElectricityBillingApp:
         
         def search_customer():
             account_num = account_entry.get().strip()
-            
-            if not account_num.isdigit():
-                messagebox.showerror("Error", "Invalid account number!")
+            try:
+                customer = workflows.lookup_customer(self.db, account_num)
+            except WorkflowError as e:
+                messagebox.showerror("Error", str(e))
                 return
             
-            customer = self.db.get_customer(int(account_num))
-            
             result_text.config(state=tk.NORMAL)
             result_text.delete(1.0, tk.END)
             
@@ -310,6 +342,27 @@ All-Time Usage:    {customer['all_time_usage']} kWh
             pady=5
         )
         search_btn.pack(side=tk.LEFT, padx=10)
+        
+        def show_history():
+            account_num = account_entry.get().strip()
+            if not account_num.isdigit():
+                messagebox.showerror("Error", "Invalid account number!")
+                return
+            self.show_previous_bills(int(account_num))
+        
+        history_btn = tk.Button(
+            input_frame,
+            text="📄 Bill History",
+            font=("Arial", 12, "bold"),
+            bg=self.primary_color,
+            fg="white",
+            cursor="hand2",
+            command=show_history,
+            relief=tk.FLAT,
+            padx=20,
+            pady=5
+        )
+        history_btn.pack(side=tk.LEFT, padx=10)
     
     def show_bill_customer(self):
         """Show billing form"""
@@ -354,74 +407,44 @@ All-Time Usage:    {customer['all_time_usage']} kWh
             account_num = account_entry.get().strip()
             kwh_str = kwh_entry.get().strip()
             
-            if not account_num.isdigit():
-                messagebox.showerror("Error", "Invalid account number!")
-                return
-            
-            try:
-                kwh_used = float(kwh_str)
-                if kwh_used < 0:
-                    messagebox.showerror("Error", "Usage cannot be negative!")
-                    return
-            except ValueError:
-                messagebox.showerror("Error", "Invalid kWh value!")
-                return
-            
-            customer = self.db.get_customer(int(account_num))
+            # Prevent billing the same reading twice while the job runs. The input
+            # is validated by the workflow itself (see bill_failed), so invalid
+            # attempts are journaled like any other
+            submit_btn.config(state=tk.DISABLED)
+            self.jobs.submit(
+                bill_account,
+                account_num,
+                kwh_str,
+                on_done=show_generated_bill,
+                on_error=bill_failed,
+                on_finish=enable_submit,
+                description=f"Billing account {account_num}..."
+            )
+        
+        def enable_submit(job):
+            # Also after a cancelled job, whose other callbacks never run
+            if submit_btn.winfo_exists():
+                submit_btn.config(state=tk.NORMAL)
+        
+        def bill_account(job, db, account_num, kwh_str):
+            # Runs on the job thread; prices with the tariff for the customer's type and month
+            return workflows.generate_bill(db, account_num, kwh_str, check=job.check)
+        
+        def bill_failed(error):
+            if isinstance(error, WorkflowError):
+                messagebox.showerror("Error", str(error))
+            else:
+                messagebox.showerror("Error", f"Failed to generate bill:\n{error}")
+        
+        def show_generated_bill(result):
+            account_num, customer, bill_info = result
             
             if not customer:
                 messagebox.showerror("Error", f"Account number {account_num} not found!")
                 return
             
-            # Compute bill
-            bill_info = compute_bill(kwh_used, customer['discount'])
-            
-            # Update database
-            self.db.update_usage(int(account_num), kwh_used)
-            
-            # Display bill
-            bill_text.config(state=tk.NORMAL)
-            bill_text.delete(1.0, tk.END)
-            
-            bill_display = f"""
-{'='*60}
-{'ELECTRICITY BILL'.center(60)}
-{'='*60}
-
-Account Number: {customer['account_number']}
-Customer Name:  {customer['name']}
-Address:        {customer['address']}
-Customer Type:  {customer['type']}
-Discount Type:  {customer['discount']}
-
-{'-'*60}
-CONSUMPTION DETAILS
-{'-'*60}
-kWh Used:       {bill_info['kwh_used']:.2f} kWh
-Rate:           ₱{bill_info['rate']:.2f} per kWh
-
-{'-'*60}
-CHARGES BREAKDOWN
-{'-'*60}
-Base Charge:             ₱{bill_info['base_charge']:>10.2f}
-Environmental Fee:       ₱{bill_info['environmental_fee']:>10.2f}
-Subtotal:                ₱{bill_info['subtotal']:>10.2f}"""
-
-            if bill_info['discount_amount'] > 0:
-                discount_percent = int(bill_info['discount_rate'] * 100)
-                bill_display += f"""
-Discount ({bill_info['discount_type']} {discount_percent}%): -₱{bill_info['discount_amount']:>10.2f}
-Subtotal after discount: ₱{bill_info['subtotal_after_discount']:>10.2f}"""
-            
-            bill_display += f"""
-VAT (12%):               ₱{bill_info['vat']:>10.2f}
-{'-'*60}
-TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
-{'='*60}
-"""
-            
-            bill_text.insert(1.0, bill_display)
-            bill_text.config(state=tk.DISABLED)
+            already_posted = 'posted_at' in bill_info
+            bill_display = render_bill(customer, bill_info)
             
             # Store the current bill info for saving
             self.current_bill_info = {
@@ -431,7 +454,22 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
                 'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
             
-            messagebox.showinfo("Success", "Bill generated successfully!")
+            # The user may have left the screen while the bill was being generated
+            if not bill_text.winfo_exists():
+                return
+            
+            # Display bill
+            bill_text.config(state=tk.NORMAL)
+            bill_text.delete(1.0, tk.END)
+            bill_text.insert(1.0, bill_display)
+            bill_text.config(state=tk.DISABLED)
+            
+            if already_posted:
+                messagebox.showinfo("Already Billed", 
+                                   f"Account {account_num} was already billed for {bill_info['period']} "
+                                   f"(posted {bill_info['posted_at']}).\nShowing the posted bill.")
+            else:
+                messagebox.showinfo("Success", "Bill generated successfully!")
         
         # Buttons frame
         buttons_frame = tk.Frame(input_frame, bg="white")
@@ -479,150 +517,105 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
         )
         save_pdf_btn.pack(side=tk.LEFT, padx=5)
      
+    @property
+    def archive(self):
+        """The bill archive, opened on first use"""
+        if self._archive is None:
+            from bill_archive import BillArchive
+            self._archive = BillArchive(os.path.join(self.bills_dir, "archive"))
+        return self._archive
+    
     def save_bill_as_txt(self):
-        """Save the current bill as a text file"""
+        """Save the current bill as text in the bill archive"""
         if not hasattr(self, 'current_bill_info'):
             messagebox.showerror("Error", "No bill to save! Please generate a bill first.")
             return
         
         customer = self.current_bill_info['customer']
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"bill_{customer['account_number']}_{timestamp}.txt"
-        filepath = os.path.join(self.bills_dir, filename)
-        
-        try:
-            with open(filepath, 'w') as f:
-                f.write(f"Generated: {self.current_bill_info['timestamp']}\n")
-                f.write(self.current_bill_info['bill_display'])
-            
-            messagebox.showinfo("Success", f"Bill saved to:\n{filepath}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save bill:\n{str(e)}")
+        now = datetime.now()
+        filename = f"bill_{customer['account_number']}_{now.strftime('%Y%m%d_%H%M%S')}.txt"
+        generated_at = now.strftime("%Y-%m-%d %H:%M:%S")
+        
+        bill_info = self.current_bill_info['bill_info']
+        generated = self.current_bill_info['timestamp']
+        archive = self.archive
+        
+        def save_txt(job, db):
+            # Runs on the job thread, so the archive write never blocks the window
+            data = render_saved_bill(customer, bill_info, generated).encode('utf-8')
+            location = archive.append(data, generated_at)
+            db.record_bill(customer['account_number'], bill_info, 'TXT', filename, len(data),
+                           generated_at, location)
+        
+        self.jobs.submit(
+            save_txt,
+            on_done=lambda result: messagebox.showinfo(
+                "Success", f"Bill saved as {filename}\n(open it from Previous Bills)"),
+            on_error=self.show_job_error("Failed to save bill"),
+            description="Saving bill..."
+        )
     
     def save_bill_as_pdf(self):
-        """Generate and save bill as PDF"""
+        """Generate a PDF bill and save it in the bill archive"""
         if not hasattr(self, 'current_bill_info'):
             messagebox.showerror("Error", "No bill to save! Please generate a bill first.")
             return
         
         customer = self.current_bill_info['customer']
         bill_info = self.current_bill_info['bill_info']
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"bill_{customer['account_number']}_{timestamp}.pdf"
-        filepath = os.path.join(self.bills_dir, filename)
-        
-        try:
-            doc = SimpleDocTemplate(filepath, pagesize=letter)
-            story = []
-            styles = getSampleStyleSheet()
-            
-            # Title
-            title = Paragraph("<b>ELECTRICITY BILL</b>", styles['Title'])
-            story.append(title)
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Customer Information
-            customer_data = [
-                ['Account Number:', customer['account_number']],
-                ['Customer Name:', customer['name']],
-                ['Address:', customer['address']],
-                ['Customer Type:', customer['type']],
-                ['Discount Type:', customer['discount']],
-                ['Generated:', self.current_bill_info['timestamp']]
-            ]
-            
-            customer_table = Table(customer_data, colWidths=[2*inch, 4*inch])
-            customer_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#04a5e5')),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ]))
-            story.append(customer_table)
-            story.append(Spacer(1, 0.3*inch))
-            
-            # Consumption Details
-            consumption_header = Paragraph("<b>CONSUMPTION DETAILS</b>", styles['Heading2'])
-            story.append(consumption_header)
-            story.append(Spacer(1, 0.1*inch))
-            
-            consumption_data = [
-                ['kWh Used:', f"{bill_info['kwh_used']:.2f} kWh"],
-                ['Rate:', f"₱{bill_info['rate']:.2f} per kWh"]
-            ]
-            
-            consumption_table = Table(consumption_data, colWidths=[2*inch, 4*inch])
-            consumption_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            story.append(consumption_table)
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Charges Breakdown
-            charges_header = Paragraph("<b>CHARGES BREAKDOWN</b>", styles['Heading2'])
-            story.append(charges_header)
-            story.append(Spacer(1, 0.1*inch))
-            
-            charges_data = [
-                ['Base Charge:', f"₱{bill_info['base_charge']:.2f}"],
-                ['Environmental Fee:', f"₱{bill_info['environmental_fee']:.2f}"],
-                ['Subtotal:', f"₱{bill_info['subtotal']:.2f}"]
-            ]
-            
-            if bill_info['discount_amount'] > 0:
-                discount_percent = int(bill_info['discount_rate'] * 100)
-                charges_data.append([
-                    f"Discount ({bill_info['discount_type']} {discount_percent}%):",
-                    f"-₱{bill_info['discount_amount']:.2f}"
-                ])
-                charges_data.append([
-                    'Subtotal after discount:',
-                    f"₱{bill_info['subtotal_after_discount']:.2f}"
-                ])
-            
-            charges_data.append(['VAT (12%):', f"₱{bill_info['vat']:.2f}"])
-            
-            charges_table = Table(charges_data, colWidths=[3*inch, 2*inch])
-            charges_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
-            story.append(charges_table)
-            story.append(Spacer(1, 0.2*inch))
-            
-            # Total
-            total_data = [
-                ['TOTAL AMOUNT DUE:', f"₱{bill_info['total_amount_due']:.2f}"]
-            ]
-            
-            total_table = Table(total_data, colWidths=[3*inch, 2*inch])
-            total_table.setStyle(TableStyle([
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 14),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#40a02b')),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                ('LINEABOVE', (0, 0), (-1, 0), 2, colors.black),
-                ('LINEBELOW', (0, 0), (-1, 0), 2, colors.black),
-                ('TOPPADDING', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-            ]))
-            story.append(total_table)
-            
-            doc.build(story)
-            messagebox.showinfo("Success", f"PDF receipt saved to:\n{filepath}")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to generate PDF:\n{str(e)}")
+        now = datetime.now()
+        filename = f"bill_{customer['account_number']}_{now.strftime('%Y%m%d_%H%M%S')}.pdf"
+        generated_at = now.strftime("%Y-%m-%d %H:%M:%S")
+        
+        generated = self.current_bill_info['timestamp']
+        archive = self.archive
+        
+        def build_pdf(job, db):
+            # Runs on the job thread; ReportLab is only loaded the first time a PDF is made
+            import io
+            import pdf_export
+            buffer = io.BytesIO()
+            pdf_export.build_bill_pdf(buffer, customer, bill_info, generated)
+            data = buffer.getvalue()
+            location = archive.append(data, generated_at)
+            db.record_bill(customer['account_number'], bill_info, 'PDF', filename, len(data),
+                           generated_at, location)
+        
+        self.jobs.submit(
+            build_pdf,
+            on_done=lambda result: messagebox.showinfo(
+                "Success", f"PDF receipt saved as {filename}\n(open it from Previous Bills)"),
+            on_error=self.show_job_error("Failed to generate PDF"),
+            description="Generating PDF..."
+        )
+    
+    def open_bill(self, bill):
+        """Open a saved bill in the system viewer, extracting it from the archive first"""
+        filepath = bill['path']
+        if bill['location'] is not None:
+            import tempfile
+            extract_dir = os.path.join(tempfile.gettempdir(), "electricity_bills")
+            os.makedirs(extract_dir, exist_ok=True)
+            filepath = self.archive.extract(bill['location'],
+                                            os.path.join(extract_dir, os.path.basename(bill['path'])))
+        
+        if os.name == 'nt':  # Windows
+            os.startfile(filepath)
+        elif os.name == 'posix':  # macOS and Linux
+            import subprocess
+            subprocess.call(['open' if sys.platform == 'darwin' else 'xdg-open', filepath])
     
-    def show_previous_bills(self):
-        """Show previous bills"""
+    def attach_pager(self, tree, vsb, load_page):
+        """Call load_page whenever the tree is scrolled close to its last loaded row"""
+        def on_scroll(first, last):
+            vsb.set(first, last)
+            if float(last) >= 0.9:
+                # Defer so the scrollbar update finishes before new rows arrive
+                self.root.after_idle(load_page)
+        tree.configure(yscrollcommand=on_scroll)
+    
+    def show_previous_bills(self, account_number=None):
+        """Show previous bills, optionally for a single account"""
         # Clear previous content
         for widget in self.root.winfo_children()[1:]:
             widget.destroy()
@@ -638,11 +631,41 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
         
         tk.Label(
             table_frame,
-            text="Previous Bills",
+            text="Previous Bills" if account_number is None else f"Bill History - Account {account_number}",
             font=("Arial", 18, "bold"),
             bg="white"
         ).pack(pady=20)
         
+        # Account filter
+        filter_frame = tk.Frame(table_frame, bg="white")
+        filter_frame.pack(pady=5)
+        
+        tk.Label(filter_frame, text="Account Number:", font=("Arial", 12), bg="white").pack(side=tk.LEFT, padx=10)
+        account_entry = tk.Entry(filter_frame, font=("Arial", 12), width=20)
+        account_entry.pack(side=tk.LEFT, padx=10)
+        if account_number is not None:
+            account_entry.insert(0, str(account_number))
+        
+        def filter_bills():
+            account_num = account_entry.get().strip()
+            if account_num and not account_num.isdigit():
+                messagebox.showerror("Error", "Invalid account number!")
+                return
+            self.show_previous_bills(int(account_num) if account_num else None)
+        
+        tk.Button(
+            filter_frame,
+            text="Show",
+            font=("Arial", 12, "bold"),
+            bg=self.secondary_color,
+            fg="white",
+            cursor="hand2",
+            command=filter_bills,
+            relief=tk.FLAT,
+            padx=20,
+            pady=5
+        ).pack(side=tk.LEFT, padx=10)
+        
         # Create Treeview
         tree_frame = tk.Frame(table_frame, bg="white")
         tree_frame.pack(padx=20, pady=10, fill=tk.BOTH, expand=True)
@@ -654,9 +677,8 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
         # Treeview
         tree = ttk.Treeview(
             tree_frame,
-            columns=("Filename", "Type", "Date", "Size"),
+            columns=("Filename", "Account", "Type", "Date", "Total", "Size"),
             show="headings",
-            yscrollcommand=vsb.set,
             xscrollcommand=hsb.set,
             height=15
         )
@@ -666,46 +688,80 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
         
         # Configure columns
         tree.heading("Filename", text="Filename")
+        tree.heading("Account", text="Account #")
         tree.heading("Type", text="Type")
-        tree.heading("Date", text="Date Modified")
+        tree.heading("Date", text="Date Saved")
+        tree.heading("Total", text="Total Due")
         tree.heading("Size", text="Size")
         
-        tree.column("Filename", width=300)
-        tree.column("Type", width=80, anchor=tk.CENTER)
-        tree.column("Date", width=200)
-        tree.column("Size", width=100, anchor=tk.CENTER)
-        
-        # Get all bill files
-        if os.path.exists(self.bills_dir):
-            files = sorted(
-                [f for f in os.listdir(self.bills_dir) if f.startswith('bill_')],
-                key=lambda x: os.path.getmtime(os.path.join(self.bills_dir, x)),
-                reverse=True
+        tree.column("Filename", width=260)
+        tree.column("Account", width=90, anchor=tk.CENTER)
+        tree.column("Type", width=60, anchor=tk.CENTER)
+        tree.column("Date", width=160)
+        tree.column("Total", width=100, anchor=tk.E)
+        tree.column("Size", width=80, anchor=tk.CENTER)
+        
+        bills_dir = self.bills_dir
+        
+        def count_bills(job, db):
+            # Runs on the job thread; bills saved before the history table existed are imported once
+            db.import_legacy_bills(bills_dir)
+            return db.count_bills(account_number)
+        
+        def show_count(count):
+            if count_label.winfo_exists():
+                count_label.config(text=f"Total Bills: {count}")
+            load_page()
+        
+        # Load bills from the history table one page at a time as the user scrolls
+        bill_rows = {}
+        page_state = {'after': None, 'done': False, 'loading': False}
+        
+        def fetch_page(job, db, after):
+            # Runs on the job thread
+            return db.get_bills(after=after, account_number=account_number)
+        
+        def load_page():
+            if page_state['done'] or page_state['loading'] or not tree.winfo_exists():
+                return
+            page_state['loading'] = True
+            self.jobs.submit(
+                fetch_page,
+                page_state['after'],
+                on_done=show_page,
+                on_error=self.show_job_error("Failed to load bills"),
+                on_finish=lambda job: page_state.update(loading=False),
+                description="Loading bills..."
             )
-            
-            for filename in files:
-                filepath = os.path.join(self.bills_dir, filename)
-                file_ext = filename.split('.')[-1].upper()
-                file_size = os.path.getsize(filepath)
-                size_kb = f"{file_size / 1024:.1f} KB"
-                mod_time = datetime.fromtimestamp(os.path.getmtime(filepath)).strftime("%Y-%m-%d %H:%M:%S")
-                
-                tree.insert("", tk.END, values=(filename, file_ext, mod_time, size_kb))
+        
+        def show_page(bills):
+            if not tree.winfo_exists():
+                return
+            if len(bills) < 200:
+                page_state['done'] = True
+            for bill in bills:
+                size_kb = f"{bill['file_size'] / 1024:.1f} KB" if bill['file_size'] is not None else ""
+                total = f"₱{bill['total_amount_due']:,.2f}" if bill['total_amount_due'] is not None else ""
+                tree.insert("", tk.END, iid=str(bill['bill_id']), values=(
+                    os.path.basename(bill['path']),
+                    bill['account_number'],
+                    bill['format'],
+                    bill['generated_at'],
+                    total,
+                    size_kb
+                ))
+                bill_rows[str(bill['bill_id'])] = bill
+            if bills:
+                page_state['after'] = (bills[-1]['generated_at'], bills[-1]['bill_id'])
+        
+        self.attach_pager(tree, vsb, load_page)
         
         # Add double-click event to open file
         def on_bill_double_click(event):
             selection = tree.selection()
             if selection:
-                item = tree.item(selection[0])
-                filename = item['values'][0]
-                filepath = os.path.join(self.bills_dir, filename)
-                
                 try:
-                    if os.name == 'nt':  # Windows
-                        os.startfile(filepath)
-                    elif os.name == 'posix':  # macOS and Linux
-                        import subprocess
-                        subprocess.call(['open' if sys.platform == 'darwin' else 'xdg-open', filepath])
+                    self.open_bill(bill_rows[selection[0]])
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to open file:\n{str(e)}")
         
@@ -722,7 +778,7 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
         # Info label
         info_label = tk.Label(
             table_frame,
-            text="Double-click a file to open it",
+            text="Double-click a bill to open it",
             font=("Arial", 10, "italic"),
             bg="white",
             fg="gray"
@@ -730,14 +786,20 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
         info_label.pack(pady=5)
         
         # Total count
-        file_count = len(tree.get_children())
         count_label = tk.Label(
             table_frame,
-            text=f"Total Bills: {file_count}",
+            text="Total Bills: ...",
             font=("Arial", 12, "bold"),
             bg="white"
         )
         count_label.pack(pady=10)
+        
+        self.jobs.submit(
+            count_bills,
+            on_done=show_count,
+            on_error=self.show_job_error("Failed to load bills"),
+            description="Loading bills..."
+        )
     
     def show_all_customers(self):
         """Show all customers in a table"""
@@ -761,6 +823,26 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
             bg="white"
         ).pack(pady=20)
         
+        # Filter bar
+        filter_frame = tk.Frame(table_frame, bg="white")
+        filter_frame.pack(pady=5)
+        
+        tk.Label(filter_frame, text="Type:", font=("Arial", 12), bg="white").pack(side=tk.LEFT, padx=5)
+        type_var = tk.StringVar(value="All")
+        type_combo = ttk.Combobox(filter_frame, textvariable=type_var, font=("Arial", 12), width=14, state="readonly")
+        type_combo['values'] = ("All", "Residential", "Commercial", "Industrial")
+        type_combo.pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(filter_frame, text="Discount:", font=("Arial", 12), bg="white").pack(side=tk.LEFT, padx=5)
+        discount_var = tk.StringVar(value="All")
+        discount_combo = ttk.Combobox(filter_frame, textvariable=discount_var, font=("Arial", 12), width=14, state="readonly")
+        discount_combo['values'] = ("All", "None", "Senior Citizen", "PWD", "Low-income")
+        discount_combo.pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(filter_frame, text="Search:", font=("Arial", 12), bg="white").pack(side=tk.LEFT, padx=5)
+        search_entry = tk.Entry(filter_frame, font=("Arial", 12), width=20)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        
         # Create Treeview
         tree_frame = tk.Frame(table_frame, bg="white")
         tree_frame.pack(padx=20, pady=10, fill=tk.BOTH, expand=True)
@@ -774,7 +856,6 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
             tree_frame,
             columns=("Account", "Name", "Type", "Discount", "Usage", "Total Usage"),
             show="headings",
-            yscrollcommand=vsb.set,
             xscrollcommand=hsb.set,
             height=15
         )
@@ -783,12 +864,21 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
         hsb.config(command=tree.xview)
         
         # Configure columns
-        tree.heading("Account", text="Account #")
-        tree.heading("Name", text="Customer Name")
-        tree.heading("Type", text="Type")
-        tree.heading("Discount", text="Discount")
-        tree.heading("Usage", text="Usage (kWh)")
-        tree.heading("Total Usage", text="Total Usage (kWh)")
+        headings = {
+            "Account": "Account #",
+            "Name": "Customer Name",
+            "Type": "Type",
+            "Discount": "Discount",
+            "Usage": "Usage (kWh)",
+            "Total Usage": "Total Usage (kWh)"
+        }
+        # Tree column -> (database column, customer key) for the columns sorted in SQL
+        sort_columns = {
+            "Account": ('AccountNumber', 'account_number'),
+            "Name": ('CustomerName', 'name'),
+            "Type": ('Type', 'type'),
+            "Discount": ('Discount', 'discount')
+        }
         
         tree.column("Account", width=100, anchor=tk.CENTER)
         tree.column("Name", width=200)
@@ -797,21 +887,145 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
         tree.column("Usage", width=100, anchor=tk.CENTER)
         tree.column("Total Usage", width=130, anchor=tk.CENTER)
         
-        # Get all customers
-        customers = self.db.get_all_customers()
+        # Customers are loaded a page at a time, sorted and filtered by the database
+        list_state = {'sort': "Account", 'descending': False, 'after': None, 'done': False}
+        
+        count_label = tk.Label(
+            table_frame,
+            font=("Arial", 12, "bold"),
+            bg="white"
+        )
+        
+        def current_filters():
+            cust_type = type_var.get()
+            discount = discount_var.get()
+            return (None if cust_type == "All" else cust_type,
+                    None if discount == "All" else discount)
+        
+        def fetch_customers(job, db, query):
+            # Runs on the job thread
+            if query['search']:
+                # Ranked full-text matches replace the sorted listing
+                return db.find_customers(query['search'], limit=500,
+                                         type=query['type'], discount=query['discount'])
+            return db.get_customers_page(
+                sort=query['sort'],
+                descending=query['descending'],
+                after=query['after'],
+                type=query['type'],
+                discount=query['discount']
+            )
+        
+        def count_matches(job, db, query):
+            # Runs on the job thread
+            return db.count_customers(query['type'], query['discount'])
+        
+        def current_query():
+            cust_type, discount = current_filters()
+            return {
+                'sort': sort_columns[list_state['sort']][0],
+                'descending': list_state['descending'],
+                'after': list_state['after'],
+                'type': cust_type,
+                'discount': discount,
+                'search': search_entry.get().strip()
+            }
+        
+        def load_page():
+            if list_state['done'] or list_state.get('job') or not tree.winfo_exists():
+                return
+            query = current_query()
+            list_state['job'] = self.jobs.submit(
+                fetch_customers,
+                query,
+                on_done=lambda customers: show_customers(query, customers),
+                on_error=self.show_job_error("Failed to load customers"),
+                on_finish=page_finished,
+                description="Loading customers..."
+            )
+        
+        def page_finished(job):
+            # However the page load ended; a reload may already have started another
+            if list_state.get('job') is job:
+                list_state['job'] = None
+        
+        def show_customers(query, customers):
+            if not tree.winfo_exists():
+                return
+            if query['search'] or len(customers) < 200:
+                list_state['done'] = True
+            if customers and not query['search']:
+                key = sort_columns[list_state['sort']][1]
+                list_state['after'] = (customers[-1][key], customers[-1]['account_number'])
+            for customer in customers:
+                tree.insert("", tk.END, values=(
+                    customer['account_number'],
+                    customer['name'],
+                    customer['type'],
+                    customer['discount'],
+                    customer['usage'],
+                    customer['all_time_usage']
+                ))
+            if query['search']:
+                count_label.config(text=f"Matching Customers: {len(customers)}")
+        
+        def show_count(count):
+            if count_label.winfo_exists():
+                count_label.config(text=f"Total Customers: {count}")
+        
+        def count_finished(job):
+            if list_state.get('count_job') is job:
+                list_state['count_job'] = None
+        
+        def reload():
+            # Results of a query for the old sort or filters must not reach the new list
+            for job_key in ('job', 'count_job'):
+                if list_state.get(job_key):
+                    list_state[job_key].cancel()
+                    list_state[job_key] = None
+            tree.delete(*tree.get_children())
+            list_state['after'] = None
+            list_state['done'] = False
+            for column, text in headings.items():
+                if column == list_state['sort']:
+                    text += " ▼" if list_state['descending'] else " ▲"
+                tree.heading(column, text=text)
+            count_label.config(text="Total Customers: ...")
+            query = current_query()
+            load_page()
+            if not query['search']:
+                list_state['count_job'] = self.jobs.submit(
+                    count_matches,
+                    query,
+                    on_done=show_count,
+                    on_finish=count_finished,
+                    description="Counting customers..."
+                )
+        
+        def sort_by(column):
+            if list_state['sort'] == column:
+                list_state['descending'] = not list_state['descending']
+            else:
+                list_state['sort'] = column
+                list_state['descending'] = False
+            reload()
+        
+        for column, text in headings.items():
+            if column in sort_columns:
+                tree.heading(column, text=text, command=lambda c=column: sort_by(c))
+            else:
+                tree.heading(column, text=text)
+        
+        type_combo.bind("<<ComboboxSelected>>", lambda event: reload())
+        discount_combo.bind("<<ComboboxSelected>>", lambda event: reload())
+        search_entry.bind("<Return>", lambda event: reload())
         
-        for customer in customers:
-            tree.insert("", tk.END, values=(
-                customer['account_number'],
-                customer['name'],
-                customer['type'],
-                customer['discount'],
-                customer['usage'],
-                customer['all_time_usage']
-            ))
+        self.attach_pager(tree, vsb, load_page)
         
         # Add click event to copy account number
         def on_customer_click(event):
+            if tree.identify_region(event.x, event.y) != "cell":
+                return
             selection = tree.selection()
             if selection:
                 item = tree.item(selection[0])
@@ -832,18 +1046,220 @@ TOTAL AMOUNT DUE:        ₱{bill_info['total_amount_due']:>10.2f}
         tree_frame.grid_columnconfigure(0, weight=1)
         
         # Total count
-        count_label = tk.Label(
+        count_label.pack(pady=10)
+        reload()
+    
+    def show_reports(self):
+        """Show revenue and consumption totals by period, customer type and discount"""
+        import reports
+        
+        # Clear previous content
+        for widget in self.root.winfo_children()[1:]:
+            widget.destroy()
+            
+        main_frame = tk.Frame(self.root, bg=self.bg_color)
+        main_frame.pack(expand=True, fill=tk.BOTH)
+        
+        self.create_back_button(main_frame)
+        
+        # Table container
+        table_frame = tk.Frame(main_frame, bg="white", relief=tk.RAISED, borderwidth=2)
+        table_frame.pack(padx=20, pady=20, fill=tk.BOTH, expand=True)
+        
+        tk.Label(
+            table_frame,
+            text="Revenue Reports",
+            font=("Arial", 18, "bold"),
+            bg="white"
+        ).pack(pady=20)
+        
+        # Report options
+        groupings = {
+            "Month": ('month',),
+            "Quarter": ('quarter',),
+            "Year": ('year',),
+            "Customer Type": ('type',),
+            "Discount": ('discount',),
+            "Month × Customer Type": ('month', 'type'),
+            "Quarter × Customer Type": ('quarter', 'type'),
+            "Customer Type × Discount": ('type', 'discount')
+        }
+        
+        filter_frame = tk.Frame(table_frame, bg="white")
+        filter_frame.pack(pady=5)
+        
+        tk.Label(filter_frame, text="Group by:", font=("Arial", 12), bg="white").pack(side=tk.LEFT, padx=5)
+        group_var = tk.StringVar(value="Month")
+        group_combo = ttk.Combobox(filter_frame, textvariable=group_var, font=("Arial", 12), width=22, state="readonly")
+        group_combo['values'] = tuple(groupings)
+        group_combo.pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(filter_frame, text="From:", font=("Arial", 12), bg="white").pack(side=tk.LEFT, padx=5)
+        from_entry = tk.Entry(filter_frame, font=("Arial", 12), width=8)
+        from_entry.pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(filter_frame, text="To:", font=("Arial", 12), bg="white").pack(side=tk.LEFT, padx=5)
+        to_entry = tk.Entry(filter_frame, font=("Arial", 12), width=8)
+        to_entry.pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(
+            table_frame,
+            text="Months as YYYY-MM; leave blank for all posted bills",
+            font=("Arial", 10, "italic"),
+            bg="white",
+            fg="gray"
+        ).pack()
+        
+        # Create Treeview
+        tree_frame = tk.Frame(table_frame, bg="white")
+        tree_frame.pack(padx=20, pady=10, fill=tk.BOTH, expand=True)
+        
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical")
+        hsb = ttk.Scrollbar(tree_frame, orient="horizontal")
+        tree = ttk.Treeview(
+            tree_frame,
+            show="headings",
+            yscrollcommand=vsb.set,
+            xscrollcommand=hsb.set,
+            height=15
+        )
+        vsb.config(command=tree.yview)
+        hsb.config(command=tree.xview)
+        
+        tree.grid(row=0, column=0, sticky="nsew")
+        vsb.grid(row=0, column=1, sticky="ns")
+        hsb.grid(row=1, column=0, sticky="ew")
+        
+        tree_frame.grid_rowconfigure(0, weight=1)
+        tree_frame.grid_columnconfigure(0, weight=1)
+        
+        report_state = {'job': None, 'report': None}
+        show_error = self.show_job_error("Failed to build report")
+        
+        def read_options():
+            period_from = from_entry.get().strip() or None
+            period_to = to_entry.get().strip() or None
+            for period in (period_from, period_to):
+                if period is not None:
+                    try:
+                        datetime.strptime(period, "%Y-%m")
+                    except ValueError:
+                        messagebox.showerror("Error", f"Invalid month {period!r}; use YYYY-MM")
+                        return None
+            return groupings[group_var.get()], period_from, period_to
+        
+        def build_report(job, db, group_by, period_from, period_to):
+            # Runs on the job thread
+            rows, total = reports.revenue_report(db, group_by, period_from, period_to)
+            return group_by, rows, total
+        
+        def show_report(report):
+            if not tree.winfo_exists():
+                return
+            group_by, rows, total = report
+            report_state['report'] = report
+            fields = list(group_by) + list(reports.REPORT_TOTALS)
+            tree.delete(*tree.get_children())
+            tree['columns'] = fields
+            for field in fields:
+                tree.heading(field, text=reports.REPORT_HEADINGS[field])
+                tree.column(field, width=110 if field in group_by else 120,
+                            anchor=tk.W if field in group_by else tk.E)
+            for row in rows + [total]:
+                tree.insert("", tk.END, values=[reports.format_value(field, row[field]) for field in fields])
+            status_label.config(text=f"{total['bills']:,} bills, ₱{total['total_amount_due']:,.2f} total due")
+        
+        def load_report(*_):
+            options = read_options()
+            if options is None:
+                return
+            if report_state['job'] is not None:
+                report_state['job'].cancel()
+            status_label.config(text="Loading...")
+            report_state['job'] = self.jobs.submit(
+                build_report,
+                *options,
+                on_done=show_report,
+                on_error=report_failed,
+                on_finish=report_finished,
+                description="Building report..."
+            )
+        
+        def report_failed(error):
+            if status_label.winfo_exists():
+                status_label.config(text="Report failed")
+            show_error(error)
+        
+        def report_finished(job):
+            # However the report ended; a reload may already have started another
+            if report_state['job'] is not job:
+                return
+            report_state['job'] = None
+            if status_label.winfo_exists() and status_label.cget("text") == "Loading...":
+                status_label.config(text="")
+        
+        def export_report():
+            if report_state['report'] is None:
+                return
+            group_by, rows, total = report_state['report']
+            filepath = filedialog.asksaveasfilename(
+                defaultextension=".csv",
+                filetypes=[("CSV files", "*.csv"), ("JSON files", "*.json")],
+                initialfile=f"revenue_by_{'_'.join(group_by)}.csv"
+            )
+            if not filepath:
+                return
+            try:
+                reports.write_report(filepath, group_by, rows, total)
+                messagebox.showinfo("Success", f"Report saved as:\n{filepath}")
+            except OSError as e:
+                messagebox.showerror("Error", f"Failed to save report:\n{str(e)}")
+        
+        tk.Button(
+            filter_frame,
+            text="Show",
+            font=("Arial", 12, "bold"),
+            bg=self.secondary_color,
+            fg="white",
+            cursor="hand2",
+            command=load_report,
+            relief=tk.FLAT,
+            padx=20,
+            pady=5
+        ).pack(side=tk.LEFT, padx=10)
+        
+        tk.Button(
+            filter_frame,
+            text="💾 Export",
+            font=("Arial", 12, "bold"),
+            bg=self.accent_color,
+            fg="white",
+            cursor="hand2",
+            command=export_report,
+            relief=tk.FLAT,
+            padx=20,
+            pady=5
+        ).pack(side=tk.LEFT, padx=10)
+        
+        group_combo.bind("<<ComboboxSelected>>", load_report)
+        
+        status_label = tk.Label(
             table_frame,
-            text=f"Total Customers: {len(customers)}",
+            text="",
             font=("Arial", 12, "bold"),
             bg="white"
         )
-        count_label.pack(pady=10)
+        status_label.pack(pady=10)
+        load_report()
     
     def exit_app(self):
         """Exit application"""
         if messagebox.askyesno("Exit", "Are you sure you want to exit?"):
-            self.db.close()
+            self.jobs.shutdown()
+            if self._db is not None:
+                self._db.close()
+            if self._archive is not None:
+                self._archive.close()
             self.root.destroy()
 
 if __name__ == "__main__":
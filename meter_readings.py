@@ -0,0 +1,144 @@
+"""Meter-reading history: bulk ingest and metered usage
+
+Register readings (account_number,reading_date,reading, where reading is the
+meter's cumulative kWh register) are streamed from a CSV into the
+meter_reading table in large transactions. The kWh used between readings is
+derived in SQL as each transaction commits, so an account's usage for any
+month, or in total up to any month, is read straight from the table.
+
+The usage export writes account_number,kwh_used rows, the input billing_run.py
+expects, so a period can be billed, or re-billed, from the stored readings.
+Billed usage is separate: the customer Usage and AllTimeUsage columns copy
+the posted_bill ledger, and --reconcile lists accounts where they disagree
+(--repair rewrites them from the ledger).
+
+    python meter_readings.py --db customer.db --ingest readings_2026-10.csv
+    python meter_readings.py --db customer.db --usage 2026-10 --out usage_2026-10.csv
+    python meter_readings.py --db customer.db --account 100123 --usage 2026-10
+    python meter_readings.py --db customer.db --reconcile
+"""
+import argparse
+import csv
+import sys
+import time
+from datetime import datetime
+
+import database_handler
+
+def read_register_csv(csv_path):
+    """Yield (account_number, reading_date, reading) for each valid row of a register-reading CSV"""
+    with open(csv_path, newline='') as f:
+        position = 0
+        for row in csv.reader(f):
+            if not row or not row[0].strip().isdigit():
+                # Header or blank line
+                continue
+            position += 1
+            try:
+                text = row[1].strip()
+                reading_date = datetime.fromisoformat(text)
+                reading = float(row[2])
+            except (IndexError, ValueError):
+                print(f"✗ Skipping invalid reading on data row {position}: {row}")
+                continue
+            if reading < 0:
+                print(f"✗ Skipping negative reading on data row {position}: {row}")
+                continue
+            # One text format per precision so readings sort and compare as dates
+            if len(text) <= 10:
+                text = reading_date.strftime("%Y-%m-%d")
+            else:
+                text = reading_date.strftime("%Y-%m-%d %H:%M:%S")
+            yield int(row[0]), text, reading
+
+def write_usage(path, usage):
+    """Write (account_number, usage, all_time_usage) rows as a billing_run.py reading CSV"""
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["account_number", "kwh_used"])
+        for account_number, kwh_used, _ in usage:
+            writer.writerow([account_number, round(kwh_used, 3)])
+            count += 1
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest meter register readings and report metered usage")
+    parser.add_argument("--db", default="customer.db", help="customer database (default: customer.db)")
+    parser.add_argument("--ingest", metavar="CSV", help="CSV file with account_number,reading_date,reading rows")
+    parser.add_argument("--batch-size", type=int, default=100000, help="readings per transaction")
+    parser.add_argument("--usage", metavar="YYYY-MM", help="billing period to report usage for")
+    parser.add_argument("--account", type=int, help="show one account's readings and usage")
+    parser.add_argument("--out", help="write the period's usage as account_number,kwh_used rows")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="check customer Usage/AllTimeUsage against the posted bills")
+    parser.add_argument("--repair", action="store_true", help="with --reconcile, rewrite them from the posted bills")
+    args = parser.parse_args(argv)
+
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.repair and not args.reconcile:
+        parser.error("--repair needs --reconcile")
+    if not (args.ingest or args.usage or args.account or args.out or args.reconcile):
+        parser.error("nothing to do: give --ingest, --usage, --account, --out or --reconcile")
+
+    db = database_handler.data_handler(args.db)
+    try:
+        if args.ingest:
+            started = time.perf_counter()
+            try:
+                result = db.ingest_readings(read_register_csv(args.ingest), args.batch_size)
+            except OSError as e:
+                print(f"✗ Could not read {args.ingest}: {e}")
+                return 1
+            if result is None:
+                return 1
+            stored, skipped = result
+            print(f"✓ Stored {stored} readings in {time.perf_counter() - started:.2f}s")
+            if skipped:
+                print(f"✗ {skipped} readings for unknown accounts were skipped")
+
+        if args.account:
+            usage = db.get_metered_usage(args.account, args.usage)
+            if usage is None:
+                print(f"No readings for account {args.account} before the end of the period")
+                return 1
+            for reading in reversed(db.get_readings(args.account, limit=12)):
+                print(f"{reading['reading_date']:<20}{reading['reading']:>12,.1f}{reading['kwh']:>12,.1f} kWh")
+            print(f"Usage: {usage['usage']:,.1f} kWh, all-time: {usage['all_time_usage']:,.1f} kWh")
+        elif args.usage or args.out:
+            if args.out:
+                try:
+                    count = write_usage(args.out, db.iter_metered_usage(args.usage))
+                except OSError as e:
+                    print(f"✗ Could not write usage: {e}")
+                    return 1
+                print(f"✓ Wrote usage for {count} accounts to {args.out}")
+            else:
+                count = 0
+                total = 0.0
+                for _, kwh_used, _ in db.iter_metered_usage(args.usage):
+                    count += 1
+                    total += kwh_used
+                print(f"{args.usage}: {count} metered accounts used {total:,.1f} kWh")
+
+        if args.reconcile:
+            mismatches = db.reconcile_usage(args.repair)
+            if mismatches is None:
+                return 1
+            for row in mismatches[:20]:
+                print(f"{row['account_number']:<10}usage {row['usage']} (billed {row['billed_usage']}), "
+                      f"all-time {row['all_time_usage']} (billed {row['billed_all_time_usage']})")
+            if not mismatches:
+                print("✓ Customer usage matches the posted bills")
+            elif args.repair:
+                print(f"✓ Rewrote usage for {len(mismatches)} accounts from the posted bills")
+            else:
+                print(f"✗ {len(mismatches)} accounts' usage disagrees with their posted bills")
+                return 1
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""Operation metrics and slow-operation log
+
+Database queries, bill calculation, rendering and GUI screens are wrapped
+when their module is imported, and only if BILLING_METRICS is set; otherwise
+the decorators hand back the original functions and cost nothing at all.
+
+    BILLING_METRICS=1                   record metrics
+    BILLING_METRICS_FILE=metrics.prom   write them here on exit (.json for JSON, else Prometheus text)
+    BILLING_SLOW_MS=250                 log operations slower than this (default: 250)
+    BILLING_SLOW_LOG=slow.log           slow-operation log (default: slow_operations.log, empty for none)
+
+Every operation gets a latency histogram, a call count and an error count.
+The billing service also serves them at GET /metrics.
+
+    BILLING_METRICS=1 BILLING_METRICS_FILE=metrics.json python main.py
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import types
+from datetime import datetime
+
+ENABLED = os.environ.get("BILLING_METRICS", "").lower() not in ("", "0", "false", "no")
+SLOW_MS = float(os.environ.get("BILLING_SLOW_MS", "250"))
+SLOW_LOG = os.environ.get("BILLING_SLOW_LOG", "slow_operations.log")
+METRICS_FILE = os.environ.get("BILLING_METRICS_FILE")
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Latency distribution of one operation"""
+    __slots__ = ('counts', 'count', 'total', 'max', 'errors')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+class Registry:
+    """Histograms by operation name, plus the slow-operation log"""
+    def __init__(self, slow_ms=SLOW_MS, slow_log=SLOW_LOG):
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, failed=False, detail=None):
+        """Record one call of an operation that took seconds"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+            if failed:
+                histogram.errors += 1
+        if self.slow_log and seconds * 1000 >= self.slow_ms:
+            self.log_slow(name, seconds, detail)
+
+    def log_slow(self, name, seconds, detail=None):
+        line = f"{datetime.now():%Y-%m-%d %H:%M:%S} {name} {seconds * 1000:.1f} ms"
+        if detail:
+            line += f" {detail}"
+        try:
+            with self._lock, open(self.slow_log, 'a') as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"✗ Could not write slow-operation log: {e}")
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+
+    def snapshot(self):
+        """Every operation's count, errors, total, mean, max and buckets, as plain data"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            return {
+                name: {
+                    'count': histogram.count,
+                    'errors': histogram.errors,
+                    'total_seconds': histogram.total,
+                    'mean_ms': histogram.total / histogram.count * 1000 if histogram.count else 0.0,
+                    'max_ms': histogram.max * 1000,
+                    'buckets': dict(zip([str(bound) for bound in BUCKETS] + ["+Inf"], histogram.counts))
+                }
+                for name, histogram in items
+            }
+
+    def to_json(self):
+        return json.dumps({'generated': datetime.now().isoformat(timespec='seconds'),
+                           'operations': self.snapshot()}, indent=2)
+
+    def to_prometheus(self):
+        """The metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP billing_operation_seconds Time spent in an operation",
+            "# TYPE billing_operation_seconds histogram"
+        ]
+        errors = [
+            "# HELP billing_operation_errors_total Operations that raised an exception",
+            "# TYPE billing_operation_errors_total counter"
+        ]
+        for name, stats in self.snapshot().items():
+            label = f'operation="{name}"'
+            cumulative = 0
+            for bound, count in stats['buckets'].items():
+                cumulative += count
+                lines.append(f'billing_operation_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"billing_operation_seconds_sum{{{label}}} {stats['total_seconds']:.6f}")
+            lines.append(f"billing_operation_seconds_count{{{label}}} {stats['count']}")
+            errors.append(f"billing_operation_errors_total{{{label}}} {stats['errors']}")
+        return "\n".join(lines + errors) + "\n"
+
+    def write(self, path):
+        """Write the metrics to path: JSON for a .json file, Prometheus text otherwise"""
+        text = self.to_json() if path.lower().endswith(".json") else self.to_prometheus()
+        with open(path, 'w') as f:
+            f.write(text)
+
+REGISTRY = Registry()
+
+def _describe(args, kwargs):
+    """A short description of a call's arguments for the slow-operation log"""
+    parts = [repr(arg) for arg in args] + [f"{key}={value!r}" for key, value in kwargs.items()]
+    text = ", ".join(parts)
+    return f"({text[:200]}...)" if len(text) > 200 else f"({text})"
+
+def _observe(name, elapsed, failed, args, kwargs):
+    detail = _describe(args, kwargs) if elapsed * 1000 >= REGISTRY.slow_ms else None
+    REGISTRY.observe(name, elapsed, failed, detail)
+
+def _timed_iteration(generator, name, elapsed, args, kwargs):
+    """Pass generator through, adding the time spent producing each item (not consuming it) to elapsed"""
+    failed = False
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                break
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed += time.perf_counter() - started
+            yield item
+    finally:
+        generator.close()
+        _observe(name, elapsed, failed, args, kwargs)
+
+def _wrap(fn, name, skip=0):
+    """fn, timed under name; skip leading arguments (self) are left out of the slow log"""
+    @functools.wraps(fn)
+    def timed_call(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            _observe(name, time.perf_counter() - started, True, args[skip:], kwargs)
+            raise
+        elapsed = time.perf_counter() - started
+        if isinstance(result, types.GeneratorType):
+            # Streaming queries do their work as they are iterated
+            return _timed_iteration(result, name, elapsed, args[skip:], kwargs)
+        _observe(name, elapsed, False, args[skip:], kwargs)
+        return result
+    return timed_call
+
+def timed(name):
+    """Decorator recording a function's latency under name (the function itself when disabled)"""
+    def decorate(fn):
+        return _wrap(fn, name) if ENABLED else fn
+    return decorate
+
+def instrumented(prefix, include=None, exclude=()):
+    """Class decorator timing its public methods (or just those named in include) as prefix.method"""
+    def decorate(cls):
+        if not ENABLED:
+            return cls
+        for attribute, value in list(vars(cls).items()):
+            if attribute.startswith("_") or not isinstance(value, types.FunctionType):
+                continue
+            if (include is not None and attribute not in include) or attribute in exclude:
+                continue
+            setattr(cls, attribute, _wrap(value, f"{prefix}.{attribute}", skip=1))
+        return cls
+    return decorate
+
+def export(path=None):
+    """Write the metrics to path (default: BILLING_METRICS_FILE), if either is set"""
+    path = path or METRICS_FILE
+    if not path:
+        return False
+    try:
+        REGISTRY.write(path)
+        return True
+    except OSError as e:
+        print(f"✗ Could not write metrics: {e}")
+        return False
+
+if ENABLED and METRICS_FILE:
+    atexit.register(export)
@@ -0,0 +1,263 @@
+"""PDF bill rendering and parallel batch export
+
+build_bill_pdf renders one bill (used by the GUI). export_bills spreads a whole
+cycle of posted bills across a process pool; each worker builds the ReportLab styles
+once and reuses them for every bill it renders. With --archive the bills go
+into the bill archive instead of one file each.
+
+    python pdf_export.py --db customer.db --out bills --workers 4 --period 2026-10
+    python pdf_export.py --db customer.db --out bills --archive
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.units import inch
+
+import database_handler
+from bill_archive import BillArchive
+from billing import vat_label
+from metrics import timed
+
+# Styles shared by every bill rendered in this process
+_styles = None
+
+def get_styles():
+    """Build the stylesheet and table styles once per process"""
+    global _styles
+    if _styles is None:
+        _styles = {
+            'sheet': getSampleStyleSheet(),
+            'customer': TableStyle([
+                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+                ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#04a5e5')),
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ]),
+            'consumption': TableStyle([
+                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ]),
+            'charges': TableStyle([
+                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10),
+                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ]),
+            'total': TableStyle([
+                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 14),
+                ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#40a02b')),
+                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+                ('LINEABOVE', (0, 0), (-1, 0), 2, colors.black),
+                ('LINEBELOW', (0, 0), (-1, 0), 2, colors.black),
+                ('TOPPADDING', (0, 0), (-1, -1), 10),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+            ]),
+        }
+    return _styles
+
+@timed("render.pdf_bill")
+def build_bill_pdf(filepath, customer, bill_info, generated):
+    """Render one bill to a PDF file (a path or a binary file object)"""
+    styles = get_styles()
+    doc = SimpleDocTemplate(filepath, pagesize=letter)
+    story = []
+
+    # Title
+    title = Paragraph("<b>ELECTRICITY BILL</b>", styles['sheet']['Title'])
+    story.append(title)
+    story.append(Spacer(1, 0.3*inch))
+
+    # Customer Information
+    customer_data = [
+        ['Account Number:', customer['account_number']],
+        ['Customer Name:', customer['name']],
+        ['Address:', customer['address']],
+        ['Customer Type:', customer['type']],
+        ['Discount Type:', customer['discount']],
+        ['Generated:', generated]
+    ]
+
+    customer_table = Table(customer_data, colWidths=[2*inch, 4*inch])
+    customer_table.setStyle(styles['customer'])
+    story.append(customer_table)
+    story.append(Spacer(1, 0.3*inch))
+
+    # Consumption Details
+    consumption_header = Paragraph("<b>CONSUMPTION DETAILS</b>", styles['sheet']['Heading2'])
+    story.append(consumption_header)
+    story.append(Spacer(1, 0.1*inch))
+
+    consumption_data = [
+        ['kWh Used:', f"{bill_info['kwh_used']:.2f} kWh"],
+        ['Rate:', f"₱{bill_info['rate']:.2f} per kWh"]
+    ]
+
+    consumption_table = Table(consumption_data, colWidths=[2*inch, 4*inch])
+    consumption_table.setStyle(styles['consumption'])
+    story.append(consumption_table)
+    story.append(Spacer(1, 0.2*inch))
+
+    # Charges Breakdown
+    charges_header = Paragraph("<b>CHARGES BREAKDOWN</b>", styles['sheet']['Heading2'])
+    story.append(charges_header)
+    story.append(Spacer(1, 0.1*inch))
+
+    charges_data = [
+        ['Base Charge:', f"₱{bill_info['base_charge']:.2f}"],
+        ['Environmental Fee:', f"₱{bill_info['environmental_fee']:.2f}"],
+        ['Subtotal:', f"₱{bill_info['subtotal']:.2f}"]
+    ]
+
+    if bill_info['discount_amount'] > 0:
+        discount_percent = int(bill_info['discount_rate'] * 100)
+        charges_data.append([
+            f"Discount ({bill_info['discount_type']} {discount_percent}%):",
+            f"-₱{bill_info['discount_amount']:.2f}"
+        ])
+        charges_data.append([
+            'Subtotal after discount:',
+            f"₱{bill_info['subtotal_after_discount']:.2f}"
+        ])
+
+    charges_data.append([f"{vat_label(bill_info)}:", f"₱{bill_info['vat']:.2f}"])
+
+    charges_table = Table(charges_data, colWidths=[3*inch, 2*inch])
+    charges_table.setStyle(styles['charges'])
+    story.append(charges_table)
+    story.append(Spacer(1, 0.2*inch))
+
+    # Total
+    total_data = [
+        ['TOTAL AMOUNT DUE:', f"₱{bill_info['total_amount_due']:.2f}"]
+    ]
+
+    total_table = Table(total_data, colWidths=[3*inch, 2*inch])
+    total_table.setStyle(styles['total'])
+    story.append(total_table)
+
+    doc.build(story)
+
+def _render_job(job):
+    """Worker entry point: render one bill and report the outcome instead of raising
+
+    With in_memory set the PDF is returned as bytes in place of its size.
+    """
+    customer, bill_info, generated, filepath, in_memory = job
+    try:
+        if in_memory:
+            buffer = io.BytesIO()
+            build_bill_pdf(buffer, customer, bill_info, generated)
+            return customer['account_number'], bill_info, filepath, buffer.getvalue(), None
+        build_bill_pdf(filepath, customer, bill_info, generated)
+        return customer['account_number'], bill_info, filepath, os.path.getsize(filepath), None
+    except Exception as e:
+        return customer['account_number'], bill_info, filepath, None, f"{type(e).__name__}: {e}"
+
+def export_bills(jobs, out_dir, workers=None, progress=None, max_pending=None, archive=None):
+    """Render (customer, bill_info) pairs to PDFs in out_dir across a process pool
+
+    Returns (saved, failed): saved is a list of (account_number, bill_info,
+    filepath, file_size, location) and failed a list of (account_number,
+    error). Given a BillArchive, bills are appended to it instead of written
+    to out_dir; location is then their archive (segment, offset, length) and
+    filepath just a file name, otherwise location is None. A failing bill is
+    reported and skipped; the rest of the batch carries on. progress, if
+    given, is called as progress(done, account_number, error) after every bill.
+    """
+    if archive is None:
+        os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    # Bound the number of queued bills so a huge cycle is never all in memory
+    max_pending = max_pending or workers * 8
+    generated = datetime.now()
+    generated_text = generated.strftime("%Y-%m-%d %H:%M:%S")
+    in_memory = archive is not None
+    file_stamp = generated.strftime("%Y%m%d_%H%M%S")
+
+    saved = []
+    failed = []
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=get_styles) as pool:
+        pending = set()
+
+        def collect(finished):
+            nonlocal done
+            for future in finished:
+                account_number, bill_info, filepath, result, error = future.result()
+                done += 1
+                if error is None and in_memory:
+                    # Appended here, in the parent, so each segment has a single writer
+                    location = archive.append(result, generated_text)
+                    saved.append((account_number, bill_info, filepath, len(result), location))
+                elif error is None:
+                    saved.append((account_number, bill_info, filepath, result, None))
+                else:
+                    failed.append((account_number, error))
+                if progress:
+                    progress(done, account_number, error)
+
+        for customer, bill_info in jobs:
+            filename = f"bill_{customer['account_number']}_{file_stamp}.pdf"
+            filepath = filename if in_memory else os.path.join(out_dir, filename)
+            pending.add(pool.submit(_render_job, (customer, bill_info, generated_text, filepath, in_memory)))
+            if len(pending) >= max_pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        finished, pending = wait(pending)
+        collect(finished)
+    return saved, failed
+
+def cycle_jobs(db, period=None):
+    """Yield (customer, bill_info) for every bill posted in a period (default: this month), as posted"""
+    # The ledger holds what each customer was actually charged; re-pricing their
+    # usage could disagree with it and would pick up accounts billed in earlier months
+    return db.iter_posted_bills(period)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate PDF bills for every billed account in parallel")
+    parser.add_argument("--db", default="customer.db", help="customer database (default: customer.db)")
+    parser.add_argument("--out", default="bills", help="output directory (default: bills)")
+    parser.add_argument("--period", help="billing period to print, YYYY-MM (default: the current month)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--archive", action="store_true",
+                        help="store the bills in the bill archive under --out instead of one file each")
+    args = parser.parse_args(argv)
+
+    db = database_handler.data_handler(args.db)
+    archive = BillArchive(os.path.join(args.out, "archive")) if args.archive else None
+    try:
+        started = time.perf_counter()
+
+        def report(done, account_number, error):
+            if error:
+                print(f"✗ Account {account_number}: {error}")
+            elif done % 500 == 0:
+                print(f"  {done} bills rendered")
+
+        saved, failed = export_bills(cycle_jobs(db, args.period), args.out, args.workers, report, archive=archive)
+        db.record_bills([(account_number, bill_info, 'PDF', filepath, file_size, location)
+                         for account_number, bill_info, filepath, file_size, location in saved])
+        print(f"✓ Saved {len(saved)} PDF bills in {time.perf_counter() - started:.1f}s, {len(failed)} failed")
+        return 1 if failed else 0
+    finally:
+        if archive is not None:
+            archive.close()
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Consolidated print-run PDF, streamed page by page
+
+Writes every bill posted in a billing period into one PDF for mail-out, one
+bill per page, with a bookmark per account so operators can jump straight to
+a customer. ReportLab builds the whole document in memory before saving,
+which does not scale to a 100k-page run, so this module writes the PDF
+itself: each page and its bookmark are written to disk as soon as they are
+rendered, and the cross-reference offsets go to a temporary file. Peak
+memory is the same for ten pages or a million.
+
+Pages use the built-in Courier font (no embedding), so the peso sign, which
+its encoding lacks, is printed as "PHP".
+
+    python pdf_print_run.py --db customer.db --period 2026-10 --out print_run_2026-10.pdf
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+from bill_renderer import render_saved_bill
+from metrics import timed
+
+PAGE_WIDTH = 612   # US Letter, in points
+PAGE_HEIGHT = 792
+MARGIN = 54
+FONT_SIZE = 10
+LEADING = 12
+
+# Fixed object numbers; page objects are numbered from FIRST_PAGE_OBJECT on
+CATALOG, PAGES, OUTLINES, FONT = 1, 2, 3, 4
+FIRST_PAGE_OBJECT = 5
+
+def _pdf_text(line):
+    """A line of text as a PDF string literal in the font's WinAnsi encoding"""
+    data = line.replace("₱", "PHP").encode('cp1252', errors='replace')
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+def _pdf_title(title):
+    """A bookmark title as a UTF-16 PDF string, so any customer name survives"""
+    return b"<FEFF" + title.encode('utf-16-be').hex().upper().encode('ascii') + b">"
+
+class PrintRunPDF:
+    """Append-only PDF writer: one text page at a time, each with a bookmark
+
+    Every page takes three consecutive object numbers: the bookmark of the
+    page before it (bookmarks lag a page behind so each one knows whether
+    another follows), its content stream and the page itself. The bookmark
+    of page j is therefore always object FIRST_PAGE_OBJECT + 3j + 3, which
+    lets the page tree and bookmark chain be written at the end without
+    having kept a list of pages.
+    """
+    def __init__(self, fileobj):
+        self.out = fileobj
+        self.pages = 0
+        self._offset = 0
+        self._fixed_offsets = {}
+        # One 20-byte cross-reference entry per numbered object, in order
+        self._xref = tempfile.TemporaryFile()
+        self._pending_bookmark = None
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(FONT, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+
+    def _write(self, data):
+        self.out.write(data)
+        self._offset += len(data)
+
+    def _object(self, number, body):
+        if number < FIRST_PAGE_OBJECT:
+            self._fixed_offsets[number] = self._offset
+        else:
+            self._xref.write(b"%010d 00000 n \n" % self._offset)
+        self._write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def _page_object(self, page, slot):
+        return FIRST_PAGE_OBJECT + 3 * page + slot
+
+    def _bookmark_object(self, page):
+        return FIRST_PAGE_OBJECT + 3 * page + 3
+
+    def add_page(self, lines, bookmark):
+        """Write one page of monospaced text lines with a bookmark titled bookmark"""
+        page = self.pages
+        text = [b"BT /F1 %d Tf %d TL %d %d Td" % (FONT_SIZE, LEADING, MARGIN, PAGE_HEIGHT - MARGIN)]
+        for line in lines:
+            text.append(_pdf_text(line) + b" Tj T*")
+        text.append(b"ET")
+        stream = zlib.compress(b"\n".join(text))
+
+        # The previous page's bookmark now knows a next one follows
+        self._flush_bookmark(self._page_object(page, 0), has_next=True)
+        content = self._page_object(page, 1)
+        self._object(content, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream)
+                     + stream + b"\nendstream")
+        self._object(self._page_object(page, 2),
+                     b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] "
+                     b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+                     % (PAGES, PAGE_WIDTH, PAGE_HEIGHT, FONT, content))
+        self._pending_bookmark = bookmark
+        self.pages += 1
+
+    def _flush_bookmark(self, number, has_next):
+        if self._pending_bookmark is None:
+            # No page before this one; keep the object number taken
+            self._object(number, b"null")
+            return
+        page = self.pages - 1
+        links = b""
+        if page > 0:
+            links += b" /Prev %d 0 R" % self._bookmark_object(page - 1)
+        if has_next:
+            links += b" /Next %d 0 R" % self._bookmark_object(page + 1)
+        self._object(number, b"<< /Title " + _pdf_title(self._pending_bookmark)
+                     + b" /Parent %d 0 R /Dest [%d 0 R /XYZ null null null]"
+                     % (OUTLINES, self._page_object(page, 2)) + links + b" >>")
+        self._pending_bookmark = None
+
+    def close(self):
+        """Write the page tree, bookmarks, cross-reference table and trailer"""
+        if self.pages:
+            self._flush_bookmark(self._bookmark_object(self.pages - 1), has_next=False)
+            self._object(OUTLINES, b"<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>"
+                         % (self._bookmark_object(0), self._bookmark_object(self.pages - 1), self.pages))
+        else:
+            self._object(OUTLINES, b"<< /Type /Outlines /Count 0 >>")
+
+        # The kids list is written in chunks straight from the numbering scheme
+        self._fixed_offsets[PAGES] = self._offset
+        self._write(b"%d 0 obj\n<< /Type /Pages /Count %d /Kids [" % (PAGES, self.pages))
+        for start in range(0, self.pages, 1000):
+            self._write(b"".join(b"%d 0 R " % self._page_object(page, 2)
+                                 for page in range(start, min(start + 1000, self.pages))))
+        self._write(b"] >>\nendobj\n")
+        self._object(CATALOG, b"<< /Type /Catalog /Pages %d 0 R /Outlines %d 0 R /PageMode /UseOutlines >>"
+                     % (PAGES, OUTLINES))
+
+        xref_offset = self._offset
+        count = FIRST_PAGE_OBJECT + 3 * self.pages + (1 if self.pages else 0)
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % FIRST_PAGE_OBJECT)
+        for number in range(1, FIRST_PAGE_OBJECT):
+            self._write(b"%010d 00000 n \n" % self._fixed_offsets[number])
+        if count > FIRST_PAGE_OBJECT:
+            self._write(b"%d %d\n" % (FIRST_PAGE_OBJECT, count - FIRST_PAGE_OBJECT))
+            self._xref.seek(0)
+            while True:
+                chunk = self._xref.read(1 << 16)
+                if not chunk:
+                    break
+                self._write(chunk)
+        self._xref.close()
+        self._write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                    % (count, CATALOG, xref_offset))
+
+@timed("render.pdf_print_run")
+def write_print_run_pdf(out, bills, generated=None, progress=None):
+    """Write (customer, bill_info) pairs to the binary file object out as one PDF
+
+    Returns the number of pages (bills) written. progress, if given, is
+    called with the running count every 1000 pages.
+    """
+    generated = generated or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    pdf = PrintRunPDF(out)
+    for customer, bill_info in bills:
+        lines = render_saved_bill(customer, bill_info, generated).split("\n")
+        pdf.add_page(lines, f"{customer['account_number']} - {customer['name']}")
+        if progress and pdf.pages % 1000 == 0:
+            progress(pdf.pages)
+    pdf.close()
+    return pdf.pages
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write every posted bill of a billing period to one PDF")
+    parser.add_argument("--db", default="customer.db", help="customer database (default: customer.db)")
+    parser.add_argument("--period", help="billing period, YYYY-MM (default: the current month)")
+    parser.add_argument("--out", help="output file (default: print_run_<period>.pdf)")
+    args = parser.parse_args(argv)
+
+    import database_handler
+    period = args.period or datetime.now().strftime("%Y-%m")
+    out_path = args.out or f"print_run_{period}.pdf"
+    db = database_handler.data_handler(args.db)
+    try:
+        started = time.perf_counter()
+        with open(out_path, 'wb', buffering=1 << 20) as out:
+            count = write_print_run_pdf(out, db.iter_posted_bills(period),
+                                        progress=lambda done: print(f"  {done} pages written"))
+        if not count:
+            os.remove(out_path)
+            print(f"✗ No bills have been posted for {period}")
+            return 1
+        print(f"✓ Wrote {count} bills to {out_path} in {time.perf_counter() - started:.1f}s")
+        return 0
+    except OSError as e:
+        print(f"✗ Could not write print run: {e}")
+        return 1
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Revenue and consumption reports
+
+Totals of bills, kWh and revenue by month, quarter or year, customer type and
+discount category. They are read from the revenue_summary table, which is
+updated as every bill is posted, so a report costs the same however many bills
+have been posted.
+
+    python reports.py --db customer.db --by quarter type
+    python reports.py --db customer.db --by month --from 2026-01 --to 2026-03 --out q1.csv
+"""
+import argparse
+import csv
+import json
+import sys
+
+import database_handler
+from database_handler import REPORT_GROUPS
+
+# Column headings for every report field
+REPORT_HEADINGS = {
+    'month': "Month",
+    'quarter': "Quarter",
+    'year': "Year",
+    'type': "Customer Type",
+    'discount': "Discount",
+    'bills': "Bills",
+    'kwh_used': "kWh Used",
+    'subtotal': "Subtotal",
+    'discount_amount': "Discounts",
+    'vat': "VAT",
+    'total_amount_due': "Total Due"
+}
+
+REPORT_TOTALS = ('bills', 'kwh_used', 'subtotal', 'discount_amount', 'vat', 'total_amount_due')
+
+def revenue_report(db, group_by=('month',), period_from=None, period_to=None):
+    """Report rows grouped by group_by, plus a grand total row (the only row when ungrouped)"""
+    rows = db.get_revenue_summary(group_by, period_from, period_to)
+    if not group_by:
+        return [], rows[0] if rows else dict.fromkeys(REPORT_TOTALS, 0)
+    total = {key: "Total" if i == 0 else "" for i, key in enumerate(group_by)}
+    for field in REPORT_TOTALS:
+        total[field] = sum(row[field] for row in rows)
+    return rows, total
+
+def format_value(field, value):
+    """Format a report value for display"""
+    if field == 'bills':
+        return f"{value:,}"
+    if field == 'kwh_used':
+        return f"{value:,.2f}"
+    if field in REPORT_TOTALS:
+        return f"₱{value:,.2f}"
+    return str(value)
+
+def write_report(path, group_by, rows, total):
+    """Write report rows to a .csv or .json file"""
+    fields = list(group_by) + list(REPORT_TOTALS)
+    if path.lower().endswith(".json"):
+        with open(path, 'w') as f:
+            json.dump({'group_by': list(group_by), 'rows': rows, 'total': total}, f, indent=2)
+        return
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        for row in rows + [total]:
+            writer.writerow([row[field] if isinstance(row[field], str) else round(row[field], 2)
+                             for field in fields])
+
+def print_report(group_by, rows, total):
+    fields = list(group_by) + list(REPORT_TOTALS)
+    print("".join(f"{REPORT_HEADINGS[field]:>16}" for field in fields))
+    for row in rows + [total]:
+        print("".join(f"{format_value(field, row[field]):>16}" for field in fields))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report bills, kWh and revenue from posted bills")
+    parser.add_argument("--db", default="customer.db", help="customer database (default: customer.db)")
+    parser.add_argument("--by", nargs="*", default=["month"], choices=list(REPORT_GROUPS),
+                        help="grouping (default: month); several give a cross-tabulation")
+    parser.add_argument("--from", dest="period_from", metavar="YYYY-MM", help="first month to include")
+    parser.add_argument("--to", dest="period_to", metavar="YYYY-MM", help="last month to include")
+    parser.add_argument("--out", help="write the report to a .csv or .json file instead of printing it")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the summary from every posted bill first")
+    args = parser.parse_args(argv)
+
+    db = database_handler.data_handler(args.db)
+    try:
+        if args.rebuild and not db.rebuild_revenue_summary():
+            return 1
+        rows, total = revenue_report(db, args.by, args.period_from, args.period_to)
+        if not args.out:
+            print_report(args.by, rows, total)
+            return 0
+        try:
+            write_report(args.out, args.by, rows, total)
+        except OSError as e:
+            print(f"✗ Could not write report: {e}")
+            return 1
+        print(f"✓ Wrote {len(rows)} report rows to {args.out}")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
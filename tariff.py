@@ -0,0 +1,234 @@
+"""Versioned, data-driven tariffs
+
+A tariff definition is a plain dict (stored in the tariff table or a JSON
+file) giving the customer type it applies to, the date it takes effect, the
+pricing method and its tiers:
+
+    {
+        "customer_type": "Commercial",
+        "effective_from": "2026-01-01",
+        "pricing": "progressive",
+        "tiers": [[50, 5.00], [100, 6.50], [200, 8.00], [null, 10.00]],
+        "environmental_fee": 50.00,
+        "vat_rate": 0.12,
+        "discounts": {"None": 0.0, "Senior Citizen": 0.05, "PWD": 0.05, "Low-income": 0.10}
+    }
+
+Each tier is [upper bound in kWh (inclusive, null for the last), rate]. With
+"slab" pricing the whole reading is charged at the rate of the tier it falls
+in; with "progressive" pricing every block is charged at its own rate. A
+customer_type of "*" applies to every type without a tariff of its own.
+
+Definitions are compiled once into sorted bounds plus the cumulative charge
+at the start of every block, so pricing a reading is a bisect and one
+multiply-add however many tiers there are.
+
+    python tariff.py --db customer.db --load tariffs.json
+    python tariff.py --db customer.db
+"""
+import argparse
+import json
+import sys
+from bisect import bisect_left, bisect_right
+
+PRICING_METHODS = ('slab', 'progressive')
+
+ANY_TYPE = "*"
+
+class Tariff:
+    """A compiled tariff: prices single readings or whole arrays of them"""
+    def __init__(self, definition):
+        self.definition = definition
+        self.customer_type = definition.get('customer_type', ANY_TYPE)
+        self.effective_from = definition.get('effective_from', "0000-01-01")
+        self.pricing = definition.get('pricing', 'slab')
+        if self.pricing not in PRICING_METHODS:
+            raise ValueError(f"Unknown pricing method {self.pricing!r}, expected one of {PRICING_METHODS}")
+
+        tiers = definition.get('tiers') or []
+        if not tiers or tiers[-1][0] is not None:
+            raise ValueError("The last tier must have no upper bound (null)")
+        self.limits = tuple(float(upper) for upper, rate in tiers[:-1])
+        self.rates = tuple(float(rate) for upper, rate in tiers)
+        if any(a >= b for a, b in zip(self.limits, self.limits[1:])) or any(x < 0 for x in self.limits):
+            raise ValueError("Tier upper bounds must be positive and increasing")
+
+        # Start of every block and the charge for all the blocks below it
+        self.starts = (0.0,) + self.limits
+        self.charge_before = [0.0]
+        for start, upper, rate in zip(self.starts, self.limits, self.rates):
+            self.charge_before.append(self.charge_before[-1] + (upper - start) * rate)
+        self.charge_before = tuple(self.charge_before)
+
+        self.environmental_fee = float(definition.get('environmental_fee', 0.0))
+        self.vat_rate = float(definition.get('vat_rate', 0.0))
+        self.discount_rates = {name: float(rate) for name, rate in definition.get('discounts', {}).items()}
+
+    def __repr__(self):
+        return f"<Tariff {self.customer_type} from {self.effective_from} ({self.pricing})>"
+
+    def price(self, kwh_used, discount_type="None"):
+        """Price one reading, returning the bill fields compute_bill returns"""
+        # side='left': a reading equal to a bound belongs to the tier below it
+        tier = bisect_left(self.limits, kwh_used)
+        if self.pricing == 'slab':
+            rate = self.rates[tier]
+            base_charge = kwh_used * rate
+        else:
+            base_charge = self.charge_before[tier] + (kwh_used - self.starts[tier]) * self.rates[tier]
+            # The average rate, so that base charge = kWh x rate still holds on the bill
+            rate = base_charge / kwh_used if kwh_used else self.rates[0]
+
+        environmental_fee = self.environmental_fee
+        subtotal = base_charge + environmental_fee
+
+        discount_rate = self.discount_rates.get(discount_type, 0.0)
+        discount_amount = subtotal * discount_rate
+        subtotal_after_discount = subtotal - discount_amount
+
+        vat = subtotal_after_discount * self.vat_rate
+        total_amount_due = subtotal_after_discount + vat
+
+        return {
+            'kwh_used': kwh_used,
+            'rate': rate,
+            'base_charge': base_charge,
+            'environmental_fee': environmental_fee,
+            'subtotal': subtotal,
+            'discount_type': discount_type,
+            'discount_rate': discount_rate,
+            'discount_amount': discount_amount,
+            'subtotal_after_discount': subtotal_after_discount,
+            'vat_rate': self.vat_rate,
+            'vat': vat,
+            'total_amount_due': total_amount_due
+        }
+
+    def discount_rates_for(self, discount_types):
+        """Map an array of discount type names to their discount rates"""
+        import numpy as np
+        discount_types = np.asarray(discount_types, dtype=object)
+        # One vectorized comparison per known discount; unknown names stay at 0%
+        rates = np.zeros(discount_types.shape, dtype=np.float64)
+        for name, rate in self.discount_rates.items():
+            if rate:
+                rates[discount_types == name] = rate
+        return rates
+
+    def price_many(self, kwh_used, discount_types):
+        """Price arrays of readings; every column matches price() for the same reading"""
+        # Imported here so the GUI, which only prices single bills, starts without NumPy
+        import numpy as np
+        tier = np.searchsorted(np.array(self.limits, dtype=np.float64), kwh_used, side='left')
+        rates = np.array(self.rates, dtype=np.float64)
+        if self.pricing == 'slab':
+            rate = rates[tier]
+            base_charge = kwh_used * rate
+        else:
+            base_charge = (np.array(self.charge_before, dtype=np.float64)[tier]
+                           + (kwh_used - np.array(self.starts, dtype=np.float64)[tier]) * rates[tier])
+            rate = np.full(kwh_used.shape, self.rates[0])
+            np.divide(base_charge, kwh_used, out=rate, where=kwh_used != 0)
+
+        environmental_fee = np.full(kwh_used.shape, self.environmental_fee)
+        subtotal = base_charge + environmental_fee
+
+        discount_rate = self.discount_rates_for(discount_types)
+        discount_amount = subtotal * discount_rate
+        subtotal_after_discount = subtotal - discount_amount
+
+        vat = subtotal_after_discount * self.vat_rate
+        total_amount_due = subtotal_after_discount + vat
+
+        return {
+            'kwh_used': kwh_used,
+            'rate': rate,
+            'base_charge': base_charge,
+            'environmental_fee': environmental_fee,
+            'subtotal': subtotal,
+            'discount_type': discount_types,
+            'discount_rate': discount_rate,
+            'discount_amount': discount_amount,
+            'subtotal_after_discount': subtotal_after_discount,
+            'vat_rate': np.full(kwh_used.shape, self.vat_rate),
+            'vat': vat,
+            'total_amount_due': total_amount_due
+        }
+
+class TariffBook:
+    """Every version of every customer type's tariff, looked up by type and date"""
+    def __init__(self, definitions, default=None):
+        self.default = default
+        self._versions = {}
+        for definition in definitions:
+            tariff = Tariff(definition)
+            self._versions.setdefault(tariff.customer_type, []).append(tariff)
+        self._dates = {}
+        for customer_type, versions in self._versions.items():
+            versions.sort(key=lambda tariff: tariff.effective_from)
+            self._dates[customer_type] = [tariff.effective_from for tariff in versions]
+
+    @classmethod
+    def from_file(cls, path, default=None):
+        """Load tariff definitions from a JSON file (a list, or {"tariffs": [...]})"""
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['tariffs'] if isinstance(data, dict) else data, default)
+
+    @classmethod
+    def from_db(cls, db, default=None):
+        """Load every tariff version stored in the database"""
+        return cls(db.get_tariffs(), default)
+
+    def tariffs(self):
+        """Every compiled tariff version, by customer type then date"""
+        return [tariff for customer_type in sorted(self._versions) for tariff in self._versions[customer_type]]
+
+    def select(self, customer_type=ANY_TYPE, on=None):
+        """The tariff in effect for a customer type on a date (YYYY-MM-DD, default: latest)"""
+        for key in (customer_type, ANY_TYPE):
+            versions = self._versions.get(key)
+            if not versions:
+                continue
+            if on is None:
+                return versions[-1]
+            index = bisect_right(self._dates[key], on)
+            if index:
+                return versions[index - 1]
+        if self.default is None:
+            raise LookupError(f"No tariff for {customer_type!r} customers on {on}")
+        return self.default
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load tariff definitions into the database or list them")
+    parser.add_argument("--db", default="customer.db", help="customer database (default: customer.db)")
+    parser.add_argument("--load", metavar="JSON", help="tariff definitions to add or replace")
+    args = parser.parse_args(argv)
+
+    import database_handler
+    db = database_handler.data_handler(args.db)
+    try:
+        if args.load:
+            try:
+                # Compile first so a malformed file never reaches the database
+                book = TariffBook.from_file(args.load)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"✗ Invalid tariff file: {e}")
+                return 1
+            if not db.save_tariffs([tariff.definition for tariff in book.tariffs()]):
+                return 1
+            print(f"✓ Loaded {len(book.tariffs())} tariffs")
+
+        tariffs = TariffBook.from_db(db).tariffs()
+        if not tariffs:
+            print("No tariffs stored; the built-in default tariff applies to every customer")
+        for tariff in tariffs:
+            tiers = ", ".join(f"≤{upper:g}: ₱{rate:.2f}" for upper, rate in zip(tariff.limits, tariff.rates))
+            print(f"{tariff.customer_type:<12}{tariff.effective_from:<12}{tariff.pricing:<13}"
+                  f"{tiers}, above: ₱{tariff.rates[-1]:.2f}")
+        return 0
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
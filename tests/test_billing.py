@@ -0,0 +1,47 @@
+"""The vectorized bill engine must price every reading exactly like compute_bill"""
+import pytest
+
+from billing import DEFAULT_TARIFF, DISCOUNT_RATES, TIER_LIMITS, bill_at, compute_bill, compute_bills
+from tariff import Tariff
+
+# Zero, every tier boundary and a hair either side of it, and readings well inside each tier
+READINGS = [0.0, 0.01, 25.0, 75.0, 150.0, 450.0, 12345.67]
+for limit in TIER_LIMITS:
+    READINGS += [limit - 0.01, float(limit), limit + 0.01]
+
+# Every known discount, plus unknown and empty names (charged no discount)
+DISCOUNTS = list(DISCOUNT_RATES) + ["Unknown", ""]
+
+PROGRESSIVE = Tariff(dict(DEFAULT_TARIFF.definition, pricing='progressive'))
+
+@pytest.mark.parametrize("tariff", [None, PROGRESSIVE], ids=["slab", "progressive"])
+@pytest.mark.parametrize("discount", DISCOUNTS)
+def test_compute_bills_matches_compute_bill(tariff, discount):
+    bills = compute_bills(READINGS, [discount] * len(READINGS), tariff)
+    for i, kwh_used in enumerate(READINGS):
+        assert bill_at(bills, i) == compute_bill(kwh_used, discount, tariff), f"{kwh_used} kWh, {discount!r}"
+
+def test_mixed_discounts_in_one_batch():
+    kwh_used = [READINGS[i % len(READINGS)] for i in range(60)]
+    discounts = [DISCOUNTS[i % len(DISCOUNTS)] for i in range(60)]
+    bills = compute_bills(kwh_used, discounts)
+    for i in range(60):
+        assert bill_at(bills, i) == compute_bill(kwh_used[i], discounts[i])
+
+def test_single_discount_name_applies_to_every_reading():
+    bills = compute_bills(READINGS, "PWD")
+    assert [bill_at(bills, i) for i in range(len(READINGS))] == [compute_bill(kwh, "PWD") for kwh in READINGS]
+
+def test_boundaries_fall_in_the_lower_tier():
+    for limit, rate in zip(TIER_LIMITS, (5.00, 6.50, 8.00)):
+        assert compute_bill(float(limit))['rate'] == rate
+        assert compute_bill(limit + 0.01)['rate'] > rate
+
+def test_mismatched_lengths_are_rejected():
+    with pytest.raises(ValueError):
+        compute_bills([10, 20], ["None"])
+
+def test_compute_bill_is_still_importable_from_main():
+    pytest.importorskip("tkinter")
+    import main
+    assert main.compute_bill is compute_bill
@@ -0,0 +1,16 @@
+"""Reader connections of finished threads must not pile up"""
+import threading
+
+from connection_pool import ConnectionPool
+
+def test_readers_of_finished_threads_are_closed(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    try:
+        for _ in range(20):
+            thread = threading.Thread(target=lambda: pool.reader().execute("SELECT 1").fetchone())
+            thread.start()
+            thread.join()
+        assert pool.reader().execute("SELECT 1").fetchone() == (1,)
+        assert [owner for owner, _ in pool._readers] == [threading.current_thread()]
+    finally:
+        pool.close()
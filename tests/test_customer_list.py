@@ -0,0 +1,44 @@
+"""Every sort and filter the customer list offers must page in index order"""
+import itertools
+
+import pytest
+
+import database_handler
+from database_handler import SORTABLE_COLUMNS
+
+@pytest.fixture
+def db(tmp_path):
+    handler = database_handler.data_handler(str(tmp_path / "customers.db"))
+    handler.import_customers([(f"Customer {i}", f"Street {i}", ("Residential", "Commercial")[i % 2],
+                               ("None", "PWD", "Senior Citizen")[i % 3]) for i in range(300)])
+    yield handler
+    handler.close()
+
+def query_plan(db, sort, descending, type, discount):
+    """The query plan of a second page (one with a keyset position)"""
+    after = ("", 0) if sort != 'AccountNumber' else (0, 0)
+    query, values = db._customers_page_query(sort, descending, after, 200, type, discount)
+    rows = db.pool.reader().execute(f"EXPLAIN QUERY PLAN {query}", values).fetchall()
+    return " / ".join(row[-1] for row in rows)
+
+@pytest.mark.parametrize("sort,descending,type,discount", list(itertools.product(
+    SORTABLE_COLUMNS, (False, True), (None, "Commercial"), (None, "PWD"))))
+def test_pages_need_no_sort(db, sort, descending, type, discount):
+    plan = query_plan(db, sort, descending, type, discount)
+    assert "TEMP B-TREE" not in plan, plan
+
+@pytest.mark.parametrize("sort", SORTABLE_COLUMNS)
+def test_keyset_pages_cover_the_filtered_list(db, sort):
+    key = {'AccountNumber': 'account_number', 'CustomerName': 'name', 'Type': 'type', 'Discount': 'discount'}[sort]
+    seen = []
+    after = None
+    while True:
+        page = db.get_customers_page(sort=sort, after=after, limit=7, type="Commercial", discount="PWD")
+        seen.extend(customer.account_number for customer in page)
+        if len(page) < 7:
+            break
+        after = (page[-1][key], page[-1].account_number)
+    expected = [customer.account_number for customer in
+                sorted((c for c in db.iter_customers() if c.type == "Commercial" and c.discount == "PWD"),
+                       key=lambda c: (c[key], c.account_number))]
+    assert seen == expected
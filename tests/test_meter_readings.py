@@ -0,0 +1,56 @@
+"""Consumption derived batch by batch must match deriving it over each account's whole history"""
+import random
+
+import pytest
+
+import database_handler
+
+@pytest.fixture
+def db(tmp_path):
+    handler = database_handler.data_handler(str(tmp_path / "readings.db"))
+    handler.import_customers([(f"Customer {i}", f"Street {i}", "Residential", "None") for i in range(20)])
+    yield handler
+    handler.close()
+
+def derive(readings):
+    """{date: (kwh, total)} for one account's {date: reading}, computed from scratch"""
+    derived = {}
+    previous = None
+    total = 0.0
+    for reading_date in sorted(readings):
+        reading = readings[reading_date]
+        kwh = 0.0 if previous is None else round(reading - previous, 3) if reading >= previous else reading
+        total = round(total + kwh, 3)
+        derived[reading_date] = (kwh, total)
+        previous = reading
+    return derived
+
+def stored(db, account_number):
+    return {row['reading_date']: (row['kwh'], row['total']) for row in db.get_readings(account_number, 1000)}
+
+def test_batches_match_a_full_derivation(db):
+    rng = random.Random(7)
+    accounts = [customer.account_number for customer in db.iter_customers()]
+    dates = [f"2026-{month:02d}-{day:02d}" for month in range(1, 13) for day in (1, 15)]
+    expected = {account_number: {} for account_number in accounts}
+    for _ in range(8):
+        # Each batch adds readings anywhere in the history, replaces some and includes rollovers
+        batch = []
+        for account_number in rng.sample(accounts, 8):
+            for reading_date in rng.sample(dates, 3):
+                reading = round(rng.uniform(0, 5000), 1)
+                batch.append((account_number, reading_date, reading))
+                expected[account_number][reading_date] = reading
+        assert db.ingest_readings(batch, batch_size=10) is not None
+        for account_number in accounts:
+            assert stored(db, account_number) == derive(expected[account_number]), account_number
+
+def test_readings_before_the_batch_are_not_rewritten(db):
+    account_number = next(db.iter_customers()).account_number
+    db.ingest_readings([(account_number, "2026-01-01", 100.0), (account_number, "2026-02-01", 150.0)])
+    # A stale derived value before the batch stays as it is; only later readings are recomputed
+    with db.pool.writer() as cur:
+        cur.execute("UPDATE meter_reading SET Kwh = -1 WHERE ReadingDate = '2026-01-01'")
+    db.ingest_readings([(account_number, "2026-03-01", 180.0)])
+    assert stored(db, account_number) == {"2026-01-01": (-1, 0.0), "2026-02-01": (50.0, 50.0),
+                                          "2026-03-01": (30.0, 80.0)}
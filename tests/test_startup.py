@@ -0,0 +1,17 @@
+"""Starting the GUI must not import the modules benchmarks/startup.py defers"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from startup import DEFERRED_MODULES
+
+def test_import_main_defers_heavy_modules():
+    # A fresh interpreter, so nothing imported by other tests counts
+    result = subprocess.run(
+        [sys.executable, "-c", f"import sys, main; print(*(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == [], f"imported at startup: {result.stdout.strip()}"
@@ -0,0 +1,36 @@
+"""Customer Usage and AllTimeUsage must stay a copy of the posted_bill ledger"""
+import pytest
+
+import database_handler
+from billing import compute_bill
+
+@pytest.fixture
+def db(tmp_path):
+    handler = database_handler.data_handler(str(tmp_path / "usage.db"))
+    handler.import_customers([(f"Customer {i}", f"Street {i}", "Residential", "None") for i in range(5)])
+    yield handler
+    handler.close()
+
+def test_posting_keeps_usage_reconciled(db):
+    accounts = [customer.account_number for customer in db.iter_customers()]
+    for period, kwh_used in (("2026-08", 120.5), ("2026-09", 80.25), ("2026-10", 310.0)):
+        assert db.post_bills([(account_number, compute_bill(kwh_used)) for account_number in accounts],
+                             period) == len(accounts)
+    # A second bill for a billed period is skipped and must not add usage
+    assert not db.post_bill(accounts[0], compute_bill(999), "2026-10")
+    assert db.reconcile_usage() == []
+    customer = db.get_customer(accounts[0])
+    assert (customer['usage'], customer['all_time_usage']) == (310.0, 510.75)
+
+def test_drift_is_reported_and_repaired(db):
+    account_number = next(db.iter_customers()).account_number
+    db.post_bill(account_number, compute_bill(100), "2026-10")
+    # Usage charged outside the ledger
+    db.update_usage(account_number, 40)
+    mismatches = db.reconcile_usage()
+    assert mismatches == [{'account_number': account_number, 'usage': 40, 'all_time_usage': 140,
+                           'billed_usage': 100, 'billed_all_time_usage': 100}]
+    assert db.reconcile_usage(repair=True) == mismatches
+    assert db.reconcile_usage() == []
+    customer = db.get_customer(account_number)
+    assert (customer['usage'], customer['all_time_usage']) == (100, 100)
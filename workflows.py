@@ -0,0 +1,92 @@
+"""Clerk workflows, independent of any user interface
+
+The steps behind the GUI's main actions: creating an account, looking up a
+customer and generating a bill. The Tk screens, the billing service and the
+journal replayer all call these, so each runs the same validation and
+database work however it is driven. Inputs are taken as typed (text is
+fine) and validated here; invalid input raises WorkflowError with the
+message to show the user.
+
+Each workflow is journaled when BILLING_JOURNAL is set (see journal.py).
+"""
+from billing import compute_bill, period_start, tariff_book
+from journal import recorded
+
+CUSTOMER_TYPES = ("Residential", "Commercial", "Industrial")
+DISCOUNT_TYPES = ("None", "Senior Citizen", "PWD", "Low-income")
+
+class WorkflowError(Exception):
+    """Invalid input; the message is meant for the user"""
+
+def parse_account_number(account_number):
+    """An account number as typed, as an int"""
+    text = str(account_number).strip()
+    if not text.isdigit():
+        raise WorkflowError("Invalid account number!")
+    return int(text)
+
+def parse_kwh(kwh_used):
+    """A kWh reading as typed, as a float"""
+    try:
+        kwh = float(str(kwh_used).strip())
+    except ValueError:
+        raise WorkflowError("Invalid kWh value!") from None
+    if not kwh >= 0:
+        raise WorkflowError("Usage cannot be negative!")
+    return kwh
+
+@recorded("create_account")
+def create_account(db, name, address, customer_type="Residential", discount="None"):
+    """Create an account and return its number (None if the database refused it)"""
+    name = name.strip()
+    address = address.strip()
+    if not name or not address:
+        raise WorkflowError("Please fill in all fields!")
+    if customer_type not in CUSTOMER_TYPES or discount not in DISCOUNT_TYPES:
+        raise WorkflowError("Invalid customer or discount type!")
+    return db.create_account(name, address, customer_type, discount)
+
+@recorded("lookup_customer")
+def lookup_customer(db, account_number):
+    """The customer with this account number, or None"""
+    return db.get_customer(parse_account_number(account_number))
+
+def price_bill(db, account_number, kwh_used, period=None):
+    """(customer, bill) for a reading under the tariff for the customer's type; customer is None if unknown"""
+    customer = db.get_customer(account_number)
+    if not customer:
+        return None, None
+    tariff = tariff_book(db).select(customer['type'], period_start(period))
+    return customer, compute_bill(kwh_used, customer['discount'], tariff)
+
+@recorded("generate_bill")
+def generate_bill(db, account_number, kwh_used, period=None, check=None):
+    """Price and post a bill for a reading, returning (account_number, customer, bill)
+
+    customer is None for an unknown account. An account already billed for
+    the period (default: this month) gets its posted bill back, which has
+    'posted_at' and 'period' keys. check, if given, is called just before
+    posting so a cancelled job stops without billing.
+    """
+    account_number = parse_account_number(account_number)
+    kwh_used = parse_kwh(kwh_used)
+    customer, bill_info = price_bill(db, account_number, kwh_used, period)
+    if not customer:
+        return account_number, None, None
+
+    # The bill and its usage are posted together; one bill per account per period
+    if check is not None:
+        check()
+    if db.post_bill(account_number, bill_info, period):
+        return account_number, customer, bill_info
+    posted = db.get_posted_bill(account_number, period)
+    if posted is None:
+        raise RuntimeError("The bill could not be saved to the database")
+    return account_number, customer, posted
+
+# Journal action names to the workflows that replay them
+WORKFLOWS = {
+    'create_account': create_account,
+    'lookup_customer': lookup_customer,
+    'generate_bill': generate_bill
+}